@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class LogisticaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'logistica'
+
+    def ready(self):
+        # Registra os receivers de invalidação do cache de estatísticas, das identidades e do rastreamento
+        # e os da linha do tempo das entregas e dos indicadores diários
+        from . import estatisticas, eventos, identidade, indicadores, rastreamento  # noqa: F401
+        from . import telemetria
+
+        # Spans por requisição só quando a amostragem estiver ligada
+        if telemetria.configuracao()['AMOSTRAGEM'] > 0:
+            telemetria.instrumentar_templates()
+            telemetria.configurar_exportador(telemetria.exportador_configurado())
@@ -0,0 +1,146 @@
+from bisect import bisect_left, insort
+
+from django.db import transaction
+
+from .models import Entrega, Rota
+from .roteirizacao import agendar_otimizacao
+
+
+ESTRATEGIAS = ('best_fit', 'first_fit')
+
+
+def _empacotar(itens, livres, rotas_ordem, estrategia):
+    """
+    Distribui os itens (já em ordem decrescente de peso) nas rotas informadas.
+
+    livres é um dict rota_id -> capacidade livre, compartilhado entre chamadas.
+    best_fit: rota com a menor sobra que ainda comporta o item (bisect sobre a
+    lista ordenada de sobras). first_fit: primeira rota, na ordem de rotas_ordem,
+    que comporta o item.
+    """
+    alocacao = {}
+    sobras = []
+
+    if estrategia == 'best_fit':
+        ordenadas = sorted((livres[rota_id], rota_id) for rota_id in rotas_ordem)
+        for item in itens:
+            pos = bisect_left(ordenadas, (item['capacidade_necessaria'], -1))
+            if pos == len(ordenadas):
+                sobras.append(item)
+                continue
+            livre, rota_id = ordenadas.pop(pos)
+            livre -= item['capacidade_necessaria']
+            livres[rota_id] = livre
+            insort(ordenadas, (livre, rota_id))
+            alocacao.setdefault(rota_id, []).append(item)
+    else:
+        for item in itens:
+            for rota_id in rotas_ordem:
+                if livres[rota_id] >= item['capacidade_necessaria']:
+                    livres[rota_id] -= item['capacidade_necessaria']
+                    alocacao.setdefault(rota_id, []).append(item)
+                    break
+            else:
+                sobras.append(item)
+
+    return alocacao, sobras
+
+
+def planejar_carregamento(data_rota, estrategia='best_fit'):
+    """
+    Monta o plano de carregamento das entregas pendentes sem rota nas rotas
+    planejadas da data, sem gravar nada.
+
+    Entregas que já têm motorista só vão para rotas desse motorista; as demais
+    podem ir para qualquer rota. Retorna dict com 'rotas' (uma linha por rota
+    com as entregas planejadas) e 'nao_alocadas'.
+    """
+    if estrategia not in ESTRATEGIAS:
+        raise ValueError(f'Estratégia inválida: {estrategia}')
+
+    rotas = list(
+        Rota.objects.filter(data_rota=data_rota, status='planejada')
+        .order_by('id')
+        .values('id', 'nome', 'motorista_id', 'capacidade_utilizada',
+                'veiculo__placa', 'veiculo__capacidade_maxima')
+    )
+    entregas = list(
+        Entrega.objects.filter(status='pendente', rota__isnull=True)
+        .order_by('-capacidade_necessaria', 'id')
+        .values('id', 'codigo_rastreio', 'capacidade_necessaria', 'motorista_id')
+    )
+
+    livres = {r['id']: r['veiculo__capacidade_maxima'] - r['capacidade_utilizada'] for r in rotas}
+    todas = [r['id'] for r in rotas]
+    por_motorista = {}
+    for rota in rotas:
+        por_motorista.setdefault(rota['motorista_id'], []).append(rota['id'])
+
+    # Entregas vinculadas a um motorista primeiro, pois têm menos opções
+    vinculadas = {}
+    livres_de_motorista = []
+    for entrega in entregas:
+        if entrega['motorista_id']:
+            vinculadas.setdefault(entrega['motorista_id'], []).append(entrega)
+        else:
+            livres_de_motorista.append(entrega)
+
+    alocacao = {}
+    nao_alocadas = []
+    grupos = [(itens, por_motorista.get(motorista_id, [])) for motorista_id, itens in vinculadas.items()]
+    grupos.append((livres_de_motorista, todas))
+    for itens, rotas_permitidas in grupos:
+        parcial, sobras = _empacotar(itens, livres, rotas_permitidas, estrategia)
+        for rota_id, alocadas in parcial.items():
+            alocacao.setdefault(rota_id, []).extend(alocadas)
+        nao_alocadas.extend(sobras)
+
+    linhas = []
+    for rota in rotas:
+        alocadas = alocacao.get(rota['id'], [])
+        linhas.append({
+            'rota_id': rota['id'],
+            'nome': rota['nome'],
+            'placa': rota['veiculo__placa'],
+            'capacidade_maxima': rota['veiculo__capacidade_maxima'],
+            'capacidade_atual': rota['capacidade_utilizada'],
+            'capacidade_planejada': rota['veiculo__capacidade_maxima'] - livres[rota['id']],
+            'entregas': alocadas,
+        })
+
+    return {
+        'data_rota': data_rota,
+        'estrategia': estrategia,
+        'rotas': linhas,
+        'nao_alocadas': nao_alocadas,
+        'total_alocadas': sum(len(linha['entregas']) for linha in linhas),
+    }
+
+
+def executar_carregamento(data_rota, estrategia='best_fit', dry_run=False):
+    """
+    Planeja e, se dry_run for False, grava o carregamento em uma transação.
+
+    A gravação usa Rota.reservar_entregas, que revalida a capacidade com a rota
+    bloqueada; entregas que deixaram de caber (ou foram alocadas por outro
+    despachante entre o plano e a gravação) voltam em 'rejeitadas'. As rotas
+    que receberam entregas são enviadas para a roteirização após o commit.
+    """
+    plano = planejar_carregamento(data_rota, estrategia)
+    plano['dry_run'] = dry_run
+    plano['rejeitadas'] = []
+    if dry_run:
+        return plano
+
+    with transaction.atomic():
+        rotas = Rota.objects.in_bulk([linha['rota_id'] for linha in plano['rotas'] if linha['entregas']])
+        for linha in plano['rotas']:
+            if not linha['entregas']:
+                continue
+            resultados = rotas[linha['rota_id']].reservar_entregas([e['id'] for e in linha['entregas']])
+            plano['rejeitadas'].extend(r for r in resultados if not r['reservada'])
+            if any(r['reservada'] for r in resultados):
+                agendar_otimizacao(linha['rota_id'])
+
+    plano['total_alocadas'] -= len(plano['rejeitadas'])
+    return plano
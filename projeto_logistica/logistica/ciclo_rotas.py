@@ -0,0 +1,186 @@
+from datetime import date
+
+from django.db import models, transaction
+from django.db.models import Exists, F, OuterRef, Value
+from django.db.models.functions import Coalesce
+from django.db.models.query import QuerySet
+
+from .estatisticas import invalidar_estatisticas
+from .eventos import CAMPOS_EVENTO, registrar_eventos
+from .indicadores import somar_rotas_concluidas
+from .models import Motorista, Veiculo, Entrega, Rota, recalcular_totais_rotas
+from .rastreamento import invalidar_rastreios
+
+
+# Ciclo de vida das rotas em lote: cada transição é um punhado de UPDATEs
+# sobre o conjunto inteiro (rotas, entregas, veículos e motoristas), sem
+# carregar nem salvar objeto a objeto. Como update() não dispara signals, os
+# totais das rotas, as estatísticas e o cache do rastreamento são acertados ao
+# fim de cada transição, e as entregas alteradas ganham seus eventos na linha
+# do tempo.
+
+ACOES = ('iniciar', 'concluir', 'cancelar')
+
+# Status de origem aceitos e status final de cada transição
+ORIGENS = {
+    'iniciar': ('planejada',),
+    'concluir': ('planejada', 'em_andamento'),
+    'cancelar': ('planejada', 'em_andamento'),
+}
+DESTINOS = {'iniciar': 'em_andamento', 'concluir': 'concluida', 'cancelar': 'cancelada'}
+
+# Entregas ainda em aberto numa rota
+STATUS_ABERTOS = ('pendente', 'em_transito', 'remarcada')
+
+
+def _como_queryset(rotas):
+    if isinstance(rotas, QuerySet):
+        return rotas
+    return Rota.objects.filter(pk__in=list(rotas))
+
+
+def _separar(rotas, acao):
+    """(ids que podem fazer a transição, ids ignorados pelo status atual)"""
+    atuais = dict(_como_queryset(rotas).values_list('pk', 'status'))
+    aceitas = [pk for pk, status in atuais.items() if status in ORIGENS[acao]]
+    ignoradas = [pk for pk, status in atuais.items() if status not in ORIGENS[acao]]
+    return aceitas, ignoradas
+
+
+def _recursos(ids):
+    rotas = Rota.objects.filter(pk__in=ids)
+    return (Veiculo.objects.filter(pk__in=rotas.values('veiculo_id')),
+            Motorista.objects.filter(pk__in=rotas.values('motorista_id')))
+
+
+def _liberar_recursos(veiculos, motoristas):
+    """Disponibiliza veículos e motoristas que não seguem em outra rota em andamento"""
+    em_uso = Rota.objects.filter(veiculo=OuterRef('pk'), status='em_andamento')
+    em_rota = Rota.objects.filter(motorista=OuterRef('pk'), status='em_andamento')
+    return (
+        veiculos.exclude(status='manutencao').exclude(Exists(em_uso)).update(status='disponivel'),
+        motoristas.exclude(status='inativo').exclude(Exists(em_rota)).update(status='disponivel'),
+    )
+
+
+def _desvincular(entregas):
+    """
+    Devolve as entregas à fila: sem rota, sem parada e as em trânsito como
+    pendentes. Retorna o estado final de cada uma (para os eventos), lido
+    antes do update porque o filtro costuma ser a própria rota.
+    """
+    atuais = list(entregas.order_by().values_list('pk', *CAMPOS_EVENTO))
+    entregas = Entrega.objects.filter(pk__in=[pk for pk, *_ in atuais])
+    entregas.filter(status='em_transito').update(status='pendente')
+    entregas.update(rota=None, ordem_parada=None)
+    return [(pk, 'pendente' if status == 'em_transito' else status, None, motorista_id)
+            for pk, status, _, motorista_id in atuais]
+
+
+def _mudar_status(entregas, status, **campos):
+    """update() do status que retorna o estado final de cada entrega alterada"""
+    atuais = list(entregas.order_by().values_list('pk', *CAMPOS_EVENTO))
+    Entrega.objects.filter(pk__in=[pk for pk, *_ in atuais]).update(status=status, **campos)
+    return [(pk, status, rota_id, motorista_id) for pk, _, rota_id, motorista_id in atuais]
+
+
+def _resultado(rotas, ignoradas, entregas=0, desvinculadas=0, veiculos=0, motoristas=0):
+    return {
+        'rotas': rotas,
+        'ignoradas': ignoradas,
+        'entregas': entregas,
+        'desvinculadas': desvinculadas,
+        'veiculos': veiculos,
+        'motoristas': motoristas,
+    }
+
+
+def iniciar_rotas(rotas):
+    """
+    Rotas planejadas passam a em andamento: entregas pendentes ou remarcadas
+    saem para entrega (em_transito), veículos ficam em uso e motoristas em rota.
+    """
+    with transaction.atomic():
+        ids, ignoradas = _separar(rotas, 'iniciar')
+        if not ids:
+            return _resultado(0, ignoradas)
+        total = Rota.objects.filter(pk__in=ids).update(status=DESTINOS['iniciar'])
+        entregas = _mudar_status(Entrega.objects.filter(rota_id__in=ids, status__in=('pendente', 'remarcada')),
+                                 'em_transito')
+        veiculos, motoristas = _recursos(ids)
+        veiculos = veiculos.exclude(status='manutencao').update(status='em_uso')
+        motoristas = motoristas.exclude(status='inativo').update(status='em_rota')
+        registrar_eventos(entregas)
+        transaction.on_commit(invalidar_estatisticas)
+        transaction.on_commit(invalidar_rastreios)
+    return _resultado(total, ignoradas, len(entregas), 0, veiculos, motoristas)
+
+
+def concluir_rotas(rotas, data=None):
+    """
+    Conclui as rotas: entregas em trânsito viram entregues (na data informada,
+    hoje por padrão, se ainda não tinham data), as que nem saíram voltam para
+    a fila e veículos e motoristas são liberados.
+    """
+    data = data or date.today()
+    with transaction.atomic():
+        ids, ignoradas = _separar(rotas, 'concluir')
+        if not ids:
+            return _resultado(0, ignoradas)
+        total = Rota.objects.filter(pk__in=ids).update(status=DESTINOS['concluir'])
+        entregas = _mudar_status(
+            Entrega.objects.filter(rota_id__in=ids, status='em_transito'), 'entregue',
+            data_entrega_real=Coalesce(F('data_entrega_real'), Value(data, output_field=models.DateField())),
+        )
+        desvinculadas = _desvincular(Entrega.objects.filter(rota_id__in=ids, status__in=STATUS_ABERTOS))
+        if desvinculadas:
+            recalcular_totais_rotas(Rota.objects.filter(pk__in=ids))
+        veiculos, motoristas = _liberar_recursos(*_recursos(ids))
+        registrar_eventos(entregas + desvinculadas)
+        somar_rotas_concluidas(Rota.objects.filter(pk__in=ids))
+        transaction.on_commit(invalidar_estatisticas)
+        transaction.on_commit(invalidar_rastreios)
+    return _resultado(total, ignoradas, len(entregas), len(desvinculadas), veiculos, motoristas)
+
+
+def cancelar_rotas(rotas):
+    """
+    Cancela as rotas: entregas em aberto voltam para a fila (as já entregues
+    ou canceladas ficam na rota como histórico) e os recursos são liberados.
+    """
+    with transaction.atomic():
+        ids, ignoradas = _separar(rotas, 'cancelar')
+        if not ids:
+            return _resultado(0, ignoradas)
+        total = Rota.objects.filter(pk__in=ids).update(status=DESTINOS['cancelar'])
+        desvinculadas = _desvincular(Entrega.objects.filter(rota_id__in=ids, status__in=STATUS_ABERTOS))
+        if desvinculadas:
+            recalcular_totais_rotas(Rota.objects.filter(pk__in=ids))
+        veiculos, motoristas = _liberar_recursos(*_recursos(ids))
+        registrar_eventos(desvinculadas)
+        transaction.on_commit(invalidar_estatisticas)
+        transaction.on_commit(invalidar_rastreios)
+    return _resultado(total, ignoradas, 0, len(desvinculadas), veiculos, motoristas)
+
+
+def deletar_rotas(rotas):
+    """Remove as rotas (em qualquer status) liberando entregas, veículos e motoristas"""
+    with transaction.atomic():
+        ids = list(_como_queryset(rotas).values_list('pk', flat=True))
+        if not ids:
+            return _resultado(0, [])
+        desvinculadas = _desvincular(Entrega.objects.filter(rota_id__in=ids))
+        # Os recursos são lidos antes de as rotas sumirem
+        veiculos, motoristas = _recursos(ids)
+        veiculo_ids = list(veiculos.values_list('pk', flat=True))
+        motorista_ids = list(motoristas.values_list('pk', flat=True))
+        _, por_modelo = Rota.objects.filter(pk__in=ids).delete()
+        veiculos, motoristas = _liberar_recursos(Veiculo.objects.filter(pk__in=veiculo_ids),
+                                                 Motorista.objects.filter(pk__in=motorista_ids))
+        registrar_eventos(desvinculadas)
+        transaction.on_commit(invalidar_estatisticas)
+        transaction.on_commit(invalidar_rastreios)
+    return _resultado(por_modelo.get(Rota._meta.label, 0), [], 0, len(desvinculadas), veiculos, motoristas)
+
+
+TRANSICOES = {'iniciar': iniciar_rotas, 'concluir': concluir_rotas, 'cancelar': cancelar_rotas}
@@ -1,4 +1,4 @@
-from .permissions import get_motorista_from_user, is_motorista
+from .identidade import obter_identidade
 
 
 def user_permissions(request):
@@ -9,11 +9,13 @@ def user_permissions(request):
         # 1. Informações básicas
         context['is_admin'] = request.user.is_staff
 
-        # 2. Verificar se é motorista usando a função do permissions.py
-        context['is_motorista'] = is_motorista(request.user)
+        # 2. Verificar se é motorista pela identidade já resolvida na requisição
+        identidade = obter_identidade(request.user)
+        context['is_motorista'] = identidade.is_motorista
+        context['tipo_usuario'] = identidade.tipo_usuario
 
         # 3. Obter o objeto motorista se existir
-        motorista = get_motorista_from_user(request.user)
+        motorista = identidade.motorista
         if motorista:
             context['user_motorista'] = motorista
             context['motorista_nome'] = motorista.nome
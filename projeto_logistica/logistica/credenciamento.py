@@ -0,0 +1,143 @@
+import csv
+import io
+import os
+import secrets
+import string
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+
+from .estatisticas import invalidar_estatisticas
+from .identidade import invalidar_identidades
+from .lotes import TAMANHO_BATCH
+from .models import Motorista, PerfilUsuario
+
+
+# Credenciamento em lote: usuários, perfis e grupo Motoristas para vários
+# motoristas com poucas consultas. Tudo é gravado com bulk_create/bulk_update,
+# que não disparam os signals de User e Motorista (perfil automático, nome do
+# usuário, invalidações); o que eles fariam é feito uma vez ao fim do lote.
+
+# Abaixo disso o custo de subir os processos supera o do hash
+MINIMO_PARA_POOL = 8
+PROCESSOS_HASH = os.cpu_count() or 1
+
+CAMPOS_CSV = ['motorista_id', 'nome', 'cpf', 'username', 'senha']
+
+
+def gerar_senha():
+    """Senha no mesmo formato da criada em Motorista.criar_usuario"""
+    return ''.join(secrets.choice(string.digits) for _ in range(4)) + '@Motorista'
+
+
+def _iniciar_processo():
+    # Com spawn/forkserver o processo começa sem o Django configurado
+    import django
+    django.setup()
+
+
+def gerar_hashes(senhas, processos=None):
+    """
+    Hash das senhas (PBKDF2 é caro de propósito) distribuído em um pool de
+    processos; lotes pequenos são feitos no próprio processo.
+    """
+    processos = PROCESSOS_HASH if processos is None else processos
+    if processos <= 1 or len(senhas) < MINIMO_PARA_POOL:
+        return [make_password(senha) for senha in senhas]
+    blocos = max(1, len(senhas) // (processos * 4))
+    with ProcessPoolExecutor(max_workers=processos, initializer=_iniciar_processo) as executor:
+        return list(executor.map(make_password, senhas, chunksize=blocos))
+
+
+def _usernames(motoristas):
+    """
+    Username pelos dígitos do CPF, com o id do motorista quando já existe
+    (mesma regra de criar_usuario). Os nomes ocupados vêm em uma consulta.
+    """
+    bases = {m.id: ''.join(filter(str.isdigit, m.cpf)) for m in motoristas}
+    candidatos = set(bases.values()) | {f'{base}_{id_}' for id_, base in bases.items()}
+    ocupados = set(User.objects.filter(username__in=candidatos).values_list('username', flat=True))
+
+    usernames = {}
+    for motorista in motoristas:
+        base = bases[motorista.id]
+        username = base if base not in ocupados else f'{base}_{motorista.id}'
+        while username in ocupados:
+            username = f'{base}_{motorista.id}_{secrets.randbelow(9000) + 1000}'
+            if User.objects.filter(username=username).exists():
+                ocupados.add(username)
+        ocupados.add(username)
+        usernames[motorista.id] = username
+    return usernames
+
+
+def credenciar_motoristas(ids, senhas=None, processos=None):
+    """
+    Cria usuário ativo, perfil de motorista e vínculo com o grupo Motoristas
+    para os motoristas de ids que ainda não têm usuário.
+
+    senhas pode fixar a senha de alguns motoristas ({id: senha}); os demais
+    recebem uma senha gerada. Retorna (credenciais, ignorados): lista de dicts
+    com CAMPOS_CSV e ids sem credencial (inexistentes ou que já tinham usuário).
+    """
+    senhas = senhas or {}
+    ids = list(dict.fromkeys(ids))
+
+    with transaction.atomic():
+        motoristas = list(
+            Motorista.objects.select_for_update().filter(pk__in=ids, user__isnull=True).order_by('pk')
+        )
+        encontrados = {m.id for m in motoristas}
+        ignorados = [id_ for id_ in ids if id_ not in encontrados]
+        if not motoristas:
+            return [], ignorados
+
+        usernames = _usernames(motoristas)
+        abertas = [senhas.get(m.id) or gerar_senha() for m in motoristas]
+        hashes = gerar_hashes(abertas, processos)
+
+        usuarios = []
+        for motorista, senha_hash in zip(motoristas, hashes):
+            partes = motorista.nome.split()
+            username = usernames[motorista.id]
+            usuarios.append(User(
+                username=username, password=senha_hash, email=f'{username}@logitrans.com.br',
+                first_name=partes[0] if partes else '', last_name=' '.join(partes[1:]), is_active=True,
+            ))
+        User.objects.bulk_create(usuarios, batch_size=TAMANHO_BATCH)
+
+        grupo_motoristas, _ = Group.objects.get_or_create(name='Motoristas')
+        User.groups.through.objects.bulk_create([
+            User.groups.through(user_id=usuario.id, group_id=grupo_motoristas.id) for usuario in usuarios
+        ], batch_size=TAMANHO_BATCH)
+
+        # Perfil antigo ainda apontando para o motorista impediria o vínculo (OneToOne)
+        PerfilUsuario.objects.filter(motorista__in=motoristas).update(motorista=None)
+        PerfilUsuario.objects.bulk_create([
+            PerfilUsuario(user=usuario, motorista=motorista, tipo_usuario='motorista')
+            for usuario, motorista in zip(usuarios, motoristas)
+        ], batch_size=TAMANHO_BATCH)
+
+        for motorista, usuario in zip(motoristas, usuarios):
+            motorista.user = usuario
+        Motorista.objects.bulk_update(motoristas, ['user'], batch_size=TAMANHO_BATCH)
+
+        transaction.on_commit(invalidar_identidades)
+        transaction.on_commit(invalidar_estatisticas)
+
+    credenciais = [
+        {'motorista_id': m.id, 'nome': m.nome, 'cpf': m.cpf, 'username': u.username, 'senha': senha}
+        for m, u, senha in zip(motoristas, usuarios, abertas)
+    ]
+    return credenciais, ignorados
+
+
+def credenciais_csv(credenciais):
+    """CSV com as credenciais geradas, uma linha por motorista"""
+    saida = io.StringIO()
+    escritor = csv.DictWriter(saida, fieldnames=CAMPOS_CSV)
+    escritor.writeheader()
+    escritor.writerows(credenciais)
+    return saida.getvalue()
@@ -0,0 +1,124 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Cliente, Motorista, Veiculo, Entrega, Rota, entregas_removidas
+
+
+# Tempo máximo (segundos) que um snapshot fica no cache sem ser invalidado
+ESTATISTICAS_TIMEOUT = 300
+
+# Chave com a versão atual dos snapshots; incrementar invalida todos de uma vez
+CHAVE_VERSAO = 'logistica:estatisticas:versao'
+
+# Campos do usuário que nenhum contador usa
+CAMPOS_SEM_CONTADOR = frozenset({'last_login', 'first_name', 'last_name', 'email', 'password'})
+
+
+def _versao():
+    """Retorna a versão atual dos snapshots de estatísticas"""
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        versao = 1
+        cache.add(CHAVE_VERSAO, versao, None)
+    return versao
+
+
+def _chave(escopo):
+    return f'logistica:estatisticas:v{_versao()}:{escopo}'
+
+
+def invalidar_estatisticas():
+    """Invalida todos os snapshots (admin e de cada motorista)"""
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        cache.set(CHAVE_VERSAO, 2, None)
+
+
+def _contadores_entregas(entregas):
+    """Todos os contadores de entrega em uma única consulta"""
+    return entregas.aggregate(
+        total_entregas=Count('id'),
+        entregas_pendentes=Count('id', filter=Q(status='pendente')),
+        entregas_em_transito=Count('id', filter=Q(status='em_transito')),
+        entregas_entregues=Count('id', filter=Q(status='entregue')),
+        entregas_sem_rota=Count('id', filter=Q(rota__isnull=True)),
+    )
+
+
+def _contadores_veiculos(veiculos):
+    return veiculos.aggregate(
+        total_veiculos=Count('id'),
+        veiculos_disponiveis=Count('id', filter=Q(status='disponivel')),
+    )
+
+
+def _calcular_admin():
+    stats = _contadores_entregas(Entrega.objects.all())
+    stats.update(Motorista.objects.aggregate(
+        total_motoristas=Count('id'),
+        motoristas_disponiveis=Count('id', filter=Q(status='disponivel')),
+        motoristas_com_acesso=Count('id', filter=Q(user__isnull=False)),
+        motoristas_acesso_ativo=Count('id', filter=Q(user__is_active=True)),
+    ))
+    stats.update(_contadores_veiculos(Veiculo.objects.all()))
+    stats.update(Rota.objects.aggregate(
+        total_rotas=Count('id'),
+        rotas_ativas=Count('id', filter=Q(status='em_andamento')),
+    ))
+    stats['total_clientes'] = Cliente.objects.count()
+    return stats
+
+
+def _calcular_motorista(motorista):
+    stats = _contadores_entregas(Entrega.objects.filter(motorista=motorista))
+    stats.update(_contadores_veiculos(Veiculo.objects.filter(motorista=motorista)))
+    stats.update(Rota.objects.filter(motorista=motorista).aggregate(
+        total_rotas=Count('id'),
+        rotas_ativas=Count('id', filter=Q(status='em_andamento')),
+    ))
+    return stats
+
+
+def estatisticas_admin():
+    """Contadores globais do dashboard (servidos do cache quando possível)"""
+    chave = _chave('admin')
+    stats = cache.get(chave)
+    if stats is None:
+        stats = _calcular_admin()
+        cache.set(chave, stats, ESTATISTICAS_TIMEOUT)
+    return stats
+
+
+def estatisticas_motorista(motorista):
+    """Contadores do dashboard restritos a um motorista"""
+    chave = _chave(f'motorista:{motorista.pk}')
+    stats = cache.get(chave)
+    if stats is None:
+        stats = _calcular_motorista(motorista)
+        cache.set(chave, stats, ESTATISTICAS_TIMEOUT)
+
+    # Dados do próprio motorista não dependem de consulta
+    stats = dict(stats)
+    stats['total_motoristas'] = 1
+    stats['motoristas_disponiveis'] = 1 if motorista.status == 'disponivel' else 0
+    return stats
+
+
+@receiver([post_save, post_delete], sender=Cliente)
+@receiver(post_save, sender=Entrega)
+@receiver(entregas_removidas)
+@receiver([post_save, post_delete], sender=Motorista)
+@receiver([post_save, post_delete], sender=Veiculo)
+@receiver([post_save, post_delete], sender=Rota)
+@receiver([post_save, post_delete], sender=settings.AUTH_USER_MODEL)
+def invalidar_estatisticas_ao_alterar(sender, **kwargs):
+    """Qualquer alteração nos modelos do dashboard invalida os snapshots"""
+    update_fields = kwargs.get('update_fields')
+    if (sender._meta.label == settings.AUTH_USER_MODEL and update_fields is not None
+            and not update_fields - CAMPOS_SEM_CONTADOR):
+        return  # login, nome ou senha do usuário não alteram nenhum contador
+    invalidar_estatisticas()
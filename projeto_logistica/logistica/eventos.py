@@ -0,0 +1,130 @@
+from django.db.models import Q
+from django.db.models.query import QuerySet
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .indicadores import atualizar_indicadores_ao_confirmar
+from .models import Motorista, Entrega, EntregaEvento, Rota, Veiculo
+
+
+# Linha do tempo das entregas (EntregaEvento): cada mudança de status, rota ou
+# motorista grava o estado resultante. O save() de uma entrega registra pelo
+# receiver abaixo; as operações em lote (update/bulk_create não disparam
+# signals) montam o estado final do conjunto alterado com a leitura que já
+# fazem e chamam registrar_eventos, que grava tudo com bulk_create. Os dois
+# caminhos agendam a soma dos indicadores diários para depois do commit.
+
+# attnames que geram evento
+CAMPOS_EVENTO = ('status', 'rota_id', 'motorista_id')
+
+TAMANHO_BATCH = 500
+
+
+def registrar_eventos(linhas, momento=None):
+    """
+    Grava um evento por (entrega_id, status, rota_id, motorista_id), todos no
+    mesmo momento (agora, por padrão). Retorna quantos foram gravados.
+    """
+    momento = momento or timezone.now()
+    eventos = [
+        EntregaEvento(entrega_id=entrega_id, momento=momento, status=status, rota_id=rota_id,
+                      motorista_id=motorista_id)
+        for entrega_id, status, rota_id, motorista_id in linhas
+    ]
+    EntregaEvento.objects.bulk_create(eventos, batch_size=TAMANHO_BATCH)
+    if eventos:
+        atualizar_indicadores_ao_confirmar()
+    return len(eventos)
+
+
+def estado(entrega):
+    """(entrega_id, status, rota_id, motorista_id) de uma instância"""
+    return (entrega.pk, entrega.status, entrega.rota_id, entrega.motorista_id)
+
+
+def linha_do_tempo(entrega):
+    """Eventos da entrega em ordem cronológica, como dicts compactos (usa o índice entrega+momento)"""
+    return list(
+        EntregaEvento.objects.filter(entrega=entrega).order_by('momento', 'id')
+        .values('momento', 'status', 'rota_id', 'motorista_id')
+    )
+
+
+def historico_status(entrega):
+    """
+    Só as mudanças de status (eventos seguidos com o mesmo status, como uma
+    troca de rota, viram um só): [{'status', 'status_display', 'momento'}].
+    """
+    rotulos = dict(Entrega.STATUS_ENTREGA)
+    historico = []
+    for status, momento in (EntregaEvento.objects.filter(entrega=entrega).order_by('momento', 'id')
+                            .values_list('status', 'momento')):
+        if not historico or historico[-1]['status'] != status:
+            historico.append({'status': status, 'status_display': rotulos.get(status, status), 'momento': momento})
+    return historico
+
+
+def permanencia_por_status(linha, ate=None):
+    """
+    Segundos que a entrega passou em cada status, a partir da linha do tempo.
+    O último status conta até `ate` (agora, por padrão) se ainda está em aberto.
+    """
+    ate = ate or timezone.now()
+    permanencia = {}
+    for atual, seguinte in zip(linha, linha[1:] + [None]):
+        if seguinte is None and atual['status'] in ('entregue', 'cancelada'):
+            break
+        fim = seguinte['momento'] if seguinte else ate
+        permanencia[atual['status']] = permanencia.get(atual['status'], 0) + (fim - atual['momento']).total_seconds()
+    return permanencia
+
+
+@receiver(post_save, sender=Entrega)
+def registrar_evento_ao_salvar(sender, instance, created, **kwargs):
+    """
+    Roda antes de save() atualizar os valores originais, então compara com o
+    que estava no banco: sem mudança de status, rota ou motorista não há evento.
+    """
+    if created or any(getattr(instance, campo) != instance.valor_original(campo) for campo in CAMPOS_EVENTO):
+        EntregaEvento.objects.create(entrega_id=instance.pk, status=instance.status, rota_id=instance.rota_id,
+                                     motorista_id=instance.motorista_id)
+        atualizar_indicadores_ao_confirmar()
+
+
+@receiver(pre_delete, sender=Motorista)
+def registrar_saida_do_motorista(sender, instance, **kwargs):
+    """
+    O ON DELETE SET NULL das entregas não passa pelo save(); o evento é
+    gravado aqui. As rotas do motorista saem junto (CASCADE), então as
+    entregas delas também ficam sem rota: tudo numa leitura só.
+    """
+    entregas = Entrega.objects.filter(Q(motorista=instance) | Q(rota__motorista=instance))
+    registrar_eventos(
+        (pk, status, None if motorista_da_rota == instance.pk else rota_id,
+         None if motorista_id == instance.pk else motorista_id)
+        for pk, status, rota_id, motorista_id, motorista_da_rota in entregas.order_by().values_list(
+            'pk', 'status', 'rota_id', 'motorista_id', 'rota__motorista_id')
+    )
+
+
+@receiver(pre_delete, sender=Veiculo)
+def registrar_saida_do_veiculo(sender, instance, **kwargs):
+    """As rotas do veículo saem junto (CASCADE) e as entregas delas ficam sem rota"""
+    registrar_eventos(
+        (pk, status, None, motorista_id)
+        for pk, status, motorista_id in Entrega.objects.filter(rota__veiculo=instance).order_by().values_list(
+            'pk', 'status', 'motorista_id')
+    )
+
+
+@receiver(pre_delete, sender=Rota)
+def registrar_saida_da_rota(sender, instance, origin=None, **kwargs):
+    """Rota removida fora do deletar_rotas (admin, Rota.delete(), API)"""
+    modelo_origem = origin.model if isinstance(origin, QuerySet) else type(origin)
+    if modelo_origem in (Motorista, Veiculo):
+        return  # em cascata: o receiver do motorista ou do veículo já registrou
+    registrar_eventos(
+        (pk, status, None, motorista_id)
+        for pk, status, motorista_id in instance.entregas.order_by().values_list('pk', 'status', 'motorista_id')
+    )
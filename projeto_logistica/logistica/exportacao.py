@@ -0,0 +1,232 @@
+import csv
+import io
+import json
+import struct
+import sys
+import zlib
+from array import array
+from datetime import date
+from decimal import Decimal
+
+
+FORMATOS = ('csv', 'ndjson', 'colunar')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'colunar': 'application/octet-stream',
+}
+
+EXTENSOES = {'csv': 'csv', 'ndjson': 'ndjson', 'colunar': 'logc'}
+
+# Linhas lidas do banco (e gravadas em cada bloco) por vez
+TAMANHO_CHUNK = 2000
+
+# Colunas exportadas por tipo: (campo do values_list, tipo no formato colunar)
+COLUNAS = {
+    'entrega': [
+        ('id', 'int'),
+        ('codigo_rastreio', 'str'),
+        ('cliente_id', 'int'),
+        ('status', 'str'),
+        ('cep_origem', 'str'),
+        ('cep_destino', 'str'),
+        ('capacidade_necessaria', 'float'),
+        ('valor_frete', 'decimal'),
+        ('data_solicitacao', 'date'),
+        ('data_entrega_prevista', 'date'),
+        ('data_entrega_real', 'date'),
+        ('motorista_id', 'int'),
+        ('rota_id', 'int'),
+        ('ordem_parada', 'int'),
+    ],
+    'rota': [
+        ('id', 'int'),
+        ('nome', 'str'),
+        ('motorista_id', 'int'),
+        ('veiculo_id', 'int'),
+        ('data_rota', 'date'),
+        ('status', 'str'),
+        ('km_total_estimado', 'int'),
+        ('tempo_estimado', 'int'),
+        ('total_entregas', 'int'),
+        ('capacidade_utilizada', 'float'),
+        ('valor_total', 'decimal'),
+    ],
+}
+
+
+def linhas(queryset, tipo, tamanho_chunk=TAMANHO_CHUNK):
+    """Tuplas das colunas do tipo, lidas do banco em chunks pela ordem do id"""
+    campos = [nome for nome, _ in COLUNAS[tipo]]
+    return queryset.order_by('id').values_list(*campos).iterator(chunk_size=tamanho_chunk)
+
+
+def _em_chunks(iteravel, tamanho):
+    chunk = []
+    for item in iteravel:
+        chunk.append(item)
+        if len(chunk) >= tamanho:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def gerar_csv(tuplas, tipo, tamanho_chunk=TAMANHO_CHUNK):
+    """Gera o CSV (com cabeçalho) em pedaços de texto de tamanho_chunk linhas"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow([nome for nome, _ in COLUNAS[tipo]])
+    for chunk in _em_chunks(tuplas, tamanho_chunk):
+        escritor.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gerar_ndjson(tuplas, tipo, tamanho_chunk=TAMANHO_CHUNK):
+    """Gera um objeto JSON por linha (datas ISO, decimais como texto)"""
+    nomes = [nome for nome, _ in COLUNAS[tipo]]
+    for chunk in _em_chunks(tuplas, tamanho_chunk):
+        yield ''.join(
+            json.dumps(dict(zip(nomes, linha)), ensure_ascii=False, separators=(',', ':'), default=str) + '\n'
+            for linha in chunk
+        )
+
+
+# ---- Formato colunar ----
+#
+# Cabeçalho: b'LOGC', versão (1 byte), tamanho (uint32) e JSON com as colunas.
+# Depois, blocos de até tamanho_chunk linhas: quantidade de linhas (uint32),
+# tamanho comprimido (uint32) e o bloco comprimido com zlib. Dentro do bloco,
+# cada coluna vem inteira: bitmap de nulos e os valores (int64, float64,
+# decimal em centavos int64, data como ordinal int32, texto como tamanhos
+# uint32 seguidos dos bytes UTF-8). Tudo little-endian; um bloco com 0
+# linhas marca o fim.
+
+MAGICO = b'LOGC'
+VERSAO_COLUNAR = 1
+_CODIGOS_ARRAY = {'int': 'q', 'float': 'd', 'decimal': 'q', 'date': 'i'}
+
+
+def _le(valores):
+    if sys.byteorder == 'big':
+        valores.byteswap()
+    return valores.tobytes()
+
+
+def _bitmap_nulos(valores):
+    mascara = 0
+    for i, valor in enumerate(valores):
+        if valor is None:
+            mascara |= 1 << i
+    return mascara.to_bytes((len(valores) + 7) // 8, 'little')
+
+
+def _codificar_coluna(valores, tipo):
+    partes = [_bitmap_nulos(valores)]
+    if tipo == 'str':
+        textos = [(valor or '').encode() for valor in valores]
+        partes.append(_le(array('I', map(len, textos))))
+        partes.append(b''.join(textos))
+    elif tipo == 'decimal':
+        partes.append(_le(array('q', (int(valor * 100) if valor is not None else 0 for valor in valores))))
+    elif tipo == 'date':
+        partes.append(_le(array('i', (valor.toordinal() if valor is not None else 0 for valor in valores))))
+    else:
+        vazio = 0.0 if tipo == 'float' else 0
+        partes.append(_le(array(_CODIGOS_ARRAY[tipo], (vazio if valor is None else valor for valor in valores))))
+    return b''.join(partes)
+
+
+def gerar_colunar(tuplas, tipo, tamanho_chunk=TAMANHO_CHUNK):
+    """Gera o arquivo colunar binário em blocos comprimidos"""
+    colunas = COLUNAS[tipo]
+    cabecalho = json.dumps({'tipo': tipo, 'colunas': colunas}).encode()
+    yield MAGICO + bytes([VERSAO_COLUNAR]) + struct.pack('<I', len(cabecalho)) + cabecalho
+
+    for chunk in _em_chunks(tuplas, tamanho_chunk):
+        bloco = b''.join(
+            _codificar_coluna([linha[i] for linha in chunk], tipo_coluna)
+            for i, (_, tipo_coluna) in enumerate(colunas)
+        )
+        comprimido = zlib.compress(bloco, 6)
+        yield struct.pack('<II', len(chunk), len(comprimido)) + comprimido
+    yield struct.pack('<II', 0, 0)
+
+
+def _decodificar_coluna(bloco, pos, n, tipo):
+    tamanho_bitmap = (n + 7) // 8
+    mascara = int.from_bytes(bloco[pos:pos + tamanho_bitmap], 'little')
+    pos += tamanho_bitmap
+
+    if tipo == 'str':
+        tamanhos = array('I')
+        tamanhos.frombytes(bloco[pos:pos + 4 * n])
+        if sys.byteorder == 'big':
+            tamanhos.byteswap()
+        pos += 4 * n
+        valores = []
+        for tamanho in tamanhos:
+            valores.append(bloco[pos:pos + tamanho].decode())
+            pos += tamanho
+    else:
+        numeros = array(_CODIGOS_ARRAY[tipo])
+        largura = numeros.itemsize * n
+        numeros.frombytes(bloco[pos:pos + largura])
+        if sys.byteorder == 'big':
+            numeros.byteswap()
+        pos += largura
+        if tipo == 'decimal':
+            valores = [Decimal(v).scaleb(-2) for v in numeros]
+        elif tipo == 'date':
+            valores = [date.fromordinal(v) if v else None for v in numeros]
+        else:
+            valores = list(numeros)
+
+    valores = [None if mascara >> i & 1 else valor for i, valor in enumerate(valores)]
+    return valores, pos
+
+
+def ler_colunar(arquivo):
+    """Lê um arquivo colunar (binário) e gera dicts por linha"""
+    if arquivo.read(4) != MAGICO:
+        raise ValueError('Arquivo não está no formato colunar')
+    versao = arquivo.read(1)[0]
+    if versao != VERSAO_COLUNAR:
+        raise ValueError(f'Versão do formato colunar não suportada: {versao}')
+    (tamanho,) = struct.unpack('<I', arquivo.read(4))
+    colunas = json.loads(arquivo.read(tamanho))['colunas']
+
+    while True:
+        n, tamanho = struct.unpack('<II', arquivo.read(8))
+        if n == 0:
+            return
+        bloco = zlib.decompress(arquivo.read(tamanho))
+        pos = 0
+        dados = []
+        for _, tipo in colunas:
+            valores, pos = _decodificar_coluna(bloco, pos, n, tipo)
+            dados.append(valores)
+        nomes = [nome for nome, _ in colunas]
+        for linha in zip(*dados):
+            yield dict(zip(nomes, linha))
+
+
+GERADORES = {'csv': gerar_csv, 'ndjson': gerar_ndjson, 'colunar': gerar_colunar}
+
+
+def exportar(queryset, tipo, formato, tamanho_chunk=TAMANHO_CHUNK):
+    """
+    Gera o conteúdo da exportação em pedaços (str para csv/ndjson, bytes para
+    colunar). Lê com values_list + iterator, então a memória usada depende
+    só de tamanho_chunk, não do tamanho do histórico.
+    """
+    if tipo not in COLUNAS:
+        raise ValueError(f'Tipo inválido: {tipo}')
+    if formato not in GERADORES:
+        raise ValueError(f'Formato inválido: {formato}')
+    return GERADORES[formato](linhas(queryset, tipo, tamanho_chunk), tipo, tamanho_chunk)
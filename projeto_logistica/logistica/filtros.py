@@ -0,0 +1,58 @@
+import django_filters
+
+from .models import Motorista, Cliente, Veiculo, Entrega, Rota
+
+
+class ClienteFilter(django_filters.FilterSet):
+    class Meta:
+        model = Cliente
+        fields = {
+            'nome': ['exact', 'icontains'],
+            'email': ['exact'],
+        }
+
+
+class MotoristaFilter(django_filters.FilterSet):
+    class Meta:
+        model = Motorista
+        fields = {
+            'status': ['exact', 'in'],
+            'cnh': ['exact'],
+            'nome': ['icontains'],
+        }
+
+
+class VeiculoFilter(django_filters.FilterSet):
+    class Meta:
+        model = Veiculo
+        fields = {
+            'status': ['exact', 'in'],
+            'tipo': ['exact'],
+            'motorista': ['exact', 'isnull'],
+        }
+
+
+class EntregaFilter(django_filters.FilterSet):
+    """?status=pendente&rota__isnull=true&data_solicitacao__gte=2024-01-01"""
+
+    class Meta:
+        model = Entrega
+        fields = {
+            'status': ['exact', 'in'],
+            'cliente': ['exact'],
+            'motorista': ['exact', 'isnull'],
+            'rota': ['exact', 'isnull'],
+            'data_solicitacao': ['exact', 'gte', 'lte'],
+            'data_entrega_prevista': ['exact', 'gte', 'lte'],
+        }
+
+
+class RotaFilter(django_filters.FilterSet):
+    class Meta:
+        model = Rota
+        fields = {
+            'status': ['exact', 'in'],
+            'motorista': ['exact'],
+            'veiculo': ['exact'],
+            'data_rota': ['exact', 'gte', 'lte'],
+        }
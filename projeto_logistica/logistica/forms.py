@@ -1,4 +1,6 @@
 # core/forms.py
+import logging
+
 from django import forms
 from django.contrib import messages
 from django.contrib.auth.models import User, Group
@@ -6,6 +8,8 @@ from django.core.exceptions import ValidationError
 from .models import Motorista, Cliente, Veiculo, Entrega, Rota
 
 
+logger = logging.getLogger(__name__)
+
 
 # FORM MOTORISTA ---------------------------------------------
 
@@ -121,13 +125,14 @@ class MotoristaForm(forms.ModelForm):
 
                     # Adicionar senha gerada ao contexto
                     self.senha_gerada = senha_gerada
-                    print(f"✅ Usuário criado: {user.username}, Senha: {senha_gerada}")
+                    logger.info("Usuário criado para o motorista: %s", user.username)
 
                 except Exception as e:
-                    print(f"⚠️ Erro ao criar usuário: {str(e)}")
-                    # Ainda assim salvar o motorista
-                    messages.add_message(self.request, messages.WARNING,
-                                         f"Motorista salvo, mas usuário não pôde ser criado: {str(e)}")
+                    logger.warning("Erro ao criar usuário: %s", e)
+                    # Ainda assim salvar o motorista; a mensagem só se a view passou o request
+                    if getattr(self, 'request', None) is not None:
+                        messages.add_message(self.request, messages.WARNING,
+                                             f"Motorista salvo, mas usuário não pôde ser criado: {str(e)}")
 
         return motorista
 
@@ -413,8 +418,7 @@ class EntregaForm(forms.ModelForm):
         if rota and capacidade_necessaria:
             # Se for uma nova entrega ou mudando de rota
             if not self.instance.pk or self.instance.rota != rota:
-                capacidade_atual = rota.capacidade_total_utilizada()
-                capacidade_disponivel = rota.veiculo.capacidade_maxima - capacidade_atual
+                capacidade_disponivel = rota.capacidade_disponivel()
 
                 if capacidade_necessaria > capacidade_disponivel:
                     raise ValidationError(
@@ -0,0 +1,202 @@
+import csv
+import gzip
+import threading
+from array import array
+from bisect import bisect_left
+from functools import lru_cache
+
+from django.db import transaction
+from django.db.models import Q
+
+from .models import CepCoordenada, Entrega
+
+
+TAMANHO_LOTE = 5000
+
+
+def normalizar_cep(valor):
+    """Retorna o CEP só com dígitos ('01310-100' -> '01310100') ou None se inválido"""
+    if valor is None:
+        return None
+    # isdigit() aceitaria dígitos Unicode ('²', '٣') que int() não converte
+    digitos = ''.join(c for c in str(valor) if c in '0123456789')
+    if not digitos or len(digitos) > 8:
+        return None
+    # Planilhas costumam perder o zero à esquerda
+    return digitos.zfill(8)
+
+
+def formatar_cep(valor):
+    """Formata o CEP como 00000-000 (retorna o valor original se inválido)"""
+    cep = normalizar_cep(valor)
+    if cep is None:
+        return valor
+    return f'{cep[:5]}-{cep[5:]}'
+
+
+class IndiceCep:
+    """
+    Índice em memória dos CEPs: arrays paralelos ordenados (≈20 bytes por CEP)
+    consultados com busca binária.
+
+    Quando o CEP exato não existe, usa o CEP mais próximo do mesmo prefixo de
+    5 dígitos (mesmo setor/subsetor), já que a numeração é geográfica.
+    """
+
+    def __init__(self, linhas=()):
+        self.ceps = array('I')
+        self.latitudes = array('d')
+        self.longitudes = array('d')
+        for cep, latitude, longitude in linhas:
+            self.ceps.append(cep)
+            self.latitudes.append(latitude)
+            self.longitudes.append(longitude)
+
+    def __len__(self):
+        return len(self.ceps)
+
+    def consultar(self, cep):
+        """Recebe o CEP como inteiro e retorna (latitude, longitude) ou None"""
+        ceps = self.ceps
+        pos = bisect_left(ceps, cep)
+        if pos < len(ceps) and ceps[pos] == cep:
+            return self.latitudes[pos], self.longitudes[pos]
+
+        prefixo = cep // 1000
+        candidatos = [p for p in (pos - 1, pos) if 0 <= p < len(ceps) and ceps[p] // 1000 == prefixo]
+        if not candidatos:
+            return None
+        melhor = min(candidatos, key=lambda p: abs(ceps[p] - cep))
+        return self.latitudes[melhor], self.longitudes[melhor]
+
+
+_indice = None
+_indice_lock = threading.Lock()
+
+
+def obter_indice():
+    """Carrega (uma vez por processo) o índice a partir da tabela CepCoordenada"""
+    global _indice
+    if _indice is None:
+        with _indice_lock:
+            if _indice is None:
+                linhas = CepCoordenada.objects.order_by('cep').values_list(
+                    'cep', 'latitude', 'longitude').iterator(chunk_size=TAMANHO_LOTE)
+                _indice = IndiceCep(linhas)
+    return _indice
+
+
+def recarregar_indice():
+    """Descarta o índice e o cache LRU (usar após carregar novos CEPs)"""
+    global _indice
+    with _indice_lock:
+        _indice = None
+    coordenadas_cep.cache_clear()
+
+
+@lru_cache(maxsize=65536)
+def coordenadas_cep(valor):
+    """Retorna (latitude, longitude) do CEP em qualquer formato, ou None"""
+    cep = normalizar_cep(valor)
+    if cep is None:
+        return None
+    return obter_indice().consultar(int(cep))
+
+
+def _abrir(caminho):
+    if str(caminho).endswith('.gz'):
+        return gzip.open(caminho, 'rt', encoding='utf-8', newline='')
+    return open(caminho, encoding='utf-8', newline='')
+
+
+def ler_arquivo_ceps(caminho):
+    """
+    Lê um CSV (opcionalmente .gz) com colunas cep, latitude, longitude.
+
+    O cabeçalho é opcional e o separador pode ser vírgula ou ponto e vírgula.
+    Gera tuplas (cep_int, latitude, longitude); linhas inválidas são ignoradas.
+    """
+    with _abrir(caminho) as arquivo:
+        amostra = arquivo.read(4096)
+        arquivo.seek(0)
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=',;\t') if amostra else csv.excel
+        for linha in csv.reader(arquivo, dialeto):
+            if len(linha) < 3:
+                continue
+            cep = normalizar_cep(linha[0])
+            try:
+                latitude = float(linha[1].replace(',', '.'))
+                longitude = float(linha[2].replace(',', '.'))
+            except ValueError:
+                continue  # cabeçalho ou linha malformada
+            if cep is not None:
+                yield int(cep), latitude, longitude
+
+
+def carregar_ceps(linhas, substituir=False):
+    """Grava as coordenadas em lotes com bulk_create e retorna a quantidade lida"""
+    total = 0
+    lote = []
+    with transaction.atomic():
+        if substituir:
+            CepCoordenada.objects.all().delete()
+        for cep, latitude, longitude in linhas:
+            lote.append(CepCoordenada(cep=cep, latitude=latitude, longitude=longitude))
+            if len(lote) >= TAMANHO_LOTE:
+                _gravar_lote(lote)
+                total += len(lote)
+                lote = []
+        if lote:
+            _gravar_lote(lote)
+            total += len(lote)
+    recarregar_indice()
+    return total
+
+
+def _gravar_lote(lote):
+    CepCoordenada.objects.bulk_create(
+        lote,
+        update_conflicts=True,
+        unique_fields=['cep'],
+        update_fields=['latitude', 'longitude'],
+    )
+
+
+def geocodificar_entregas(entregas=None, sobrescrever=False):
+    """
+    Preenche as coordenadas de origem/destino das entregas a partir do índice.
+
+    Por padrão só processa entregas sem alguma das coordenadas: nunca
+    geocodificadas, com CEP corrigido (o save zera as do CEP alterado) ou com
+    um dos CEPs fora do índice. Lê em lotes com values_list e grava com
+    bulk_update. Retorna (processadas, sem_cep).
+    """
+    if entregas is None:
+        entregas = Entrega.objects.all()
+    if not sobrescrever:
+        entregas = entregas.filter(Q(latitude_origem__isnull=True) | Q(latitude_destino__isnull=True))
+
+    campos = ['latitude_origem', 'longitude_origem', 'latitude_destino', 'longitude_destino']
+    processadas = 0
+    sem_cep = 0
+    ultimo_pk = 0
+    # Lotes por chave (pk > último) para não ler e escrever a tabela no mesmo cursor
+    while True:
+        linhas = list(
+            entregas.filter(pk__gt=ultimo_pk).order_by('pk')
+            .values_list('pk', 'cep_origem', 'cep_destino')[:TAMANHO_LOTE]
+        )
+        if not linhas:
+            break
+        lote = []
+        for pk, cep_origem, cep_destino in linhas:
+            origem = coordenadas_cep(cep_origem) or (None, None)
+            destino = coordenadas_cep(cep_destino) or (None, None)
+            if destino[0] is None:
+                sem_cep += 1
+            lote.append(Entrega(pk=pk, latitude_origem=origem[0], longitude_origem=origem[1],
+                                latitude_destino=destino[0], longitude_destino=destino[1]))
+        Entrega.objects.bulk_update(lote, campos)
+        processadas += len(lote)
+        ultimo_pk = linhas[-1][0]
+    return processadas, sem_cep
@@ -0,0 +1,189 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Motorista, PerfilUsuario
+
+
+# Versão global das identidades guardadas na sessão; incrementar faz todas
+# serem resolvidas de novo no próximo request
+CHAVE_VERSAO = 'logistica:identidade:versao'
+CHAVE_SESSAO = '_logistica_identidade'
+
+# Segundos que uma identidade guardada na sessão vale mesmo sem mudança de
+# versão. A versão fica no cache default, que sem CACHES compartilhado é por
+# processo: uma invalidação só chega aos outros workers quando isto vence.
+IDENTIDADE_TTL = 60
+
+
+class Identidade:
+    """
+    Quem é o usuário da requisição: admin, motorista vinculado, perfil e
+    grupos. Resolvida uma vez por requisição (ou lida da sessão) e usada por
+    todos os helpers de permissão, middlewares e context processor.
+    """
+
+    def __init__(self, user, motorista_id=None, perfil_id=None, grupos=(), motorista=None,
+                 perfil_motorista_id=None, tipo_usuario=None):
+        self.user = user
+        self.autenticado = bool(user and user.is_authenticated)
+        self.motorista_id = motorista_id
+        self.perfil_id = perfil_id
+        self.perfil_motorista_id = perfil_motorista_id
+        self.tipo_usuario = tipo_usuario
+        self.grupos = frozenset(grupos)
+        self._motorista = motorista
+
+    @property
+    def is_admin(self):
+        return self.autenticado and self.user.is_staff
+
+    @property
+    def is_motorista(self):
+        return self.autenticado and self.motorista_id is not None
+
+    @property
+    def is_admin_or_motorista(self):
+        return self.is_admin or self.is_motorista
+
+    @property
+    def motorista(self):
+        """Objeto Motorista (carregado só se a identidade veio da sessão)"""
+        if self._motorista is None and self.motorista_id is not None:
+            self._motorista = Motorista.objects.filter(pk=self.motorista_id).first()
+        return self._motorista
+
+    def tem_grupo(self, nome):
+        return nome in self.grupos
+
+    def para_sessao(self):
+        return {
+            'user_id': self.user.pk,
+            'motorista_id': self.motorista_id,
+            'perfil_id': self.perfil_id,
+            'perfil_motorista_id': self.perfil_motorista_id,
+            'tipo_usuario': self.tipo_usuario,
+            'grupos': sorted(self.grupos),
+        }
+
+
+def _relacionado(obj, nome):
+    try:
+        return getattr(obj, nome)
+    except (AttributeError, Motorista.DoesNotExist, PerfilUsuario.DoesNotExist):
+        return None
+
+
+def resolver_identidade(user):
+    """
+    Monta a identidade com uma única consulta: o usuário com motorista e
+    perfil (select_related) e uma linha por grupo (LEFT JOIN em groups).
+    """
+    if not user or not user.is_authenticated:
+        return Identidade(user)
+
+    linhas = list(
+        get_user_model().objects.filter(pk=user.pk)
+        .select_related('motorista_profile', 'perfil', 'perfil__motorista')
+        .annotate(nome_grupo=F('groups__name'))
+    )
+    if not linhas:
+        return Identidade(user)
+
+    primeira = linhas[0]
+    perfil = _relacionado(primeira, 'perfil')
+    # Mesma ordem de antes: motorista do usuário, depois o vinculado ao perfil
+    motorista = _relacionado(primeira, 'motorista_profile') or (perfil.motorista if perfil else None)
+    return Identidade(
+        user,
+        motorista_id=motorista.pk if motorista else None,
+        perfil_id=perfil.pk if perfil else None,
+        perfil_motorista_id=perfil.motorista_id if perfil else None,
+        tipo_usuario=perfil.tipo_usuario if perfil else None,
+        grupos={linha.nome_grupo for linha in linhas if linha.nome_grupo},
+        motorista=motorista,
+    )
+
+
+def versao_atual():
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        versao = 1
+        cache.add(CHAVE_VERSAO, versao, None)
+    return versao
+
+
+def invalidar_identidades():
+    """Faz as identidades guardadas nas sessões serem resolvidas de novo"""
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        cache.set(CHAVE_VERSAO, 2, None)
+
+
+def marca_sessao(user):
+    """Usuário, versão e validade gravados junto com o que foi guardado na sessão"""
+    return {'user_id': user.pk, 'versao': versao_atual(), 'validade': time.time() + IDENTIDADE_TTL}
+
+
+def vigente(marca, user):
+    """A marca da sessão é deste usuário, da versão atual e ainda não venceu"""
+    return (bool(marca) and marca.get('user_id') == user.pk and marca.get('versao') == versao_atual()
+            and time.time() < marca.get('validade', 0))
+
+
+def obter_identidade(user, sessao=None):
+    """
+    Identidade do usuário, guardada no próprio objeto user (que vive só
+    durante a requisição). Se a sessão for informada, reaproveita a
+    identidade guardada nela enquanto a versão global não mudar e por no
+    máximo IDENTIDADE_TTL segundos.
+    """
+    identidade = getattr(user, '_identidade', None)
+    if identidade is not None:
+        return identidade
+
+    identidade = None
+    if sessao is not None and user.is_authenticated:
+        dados = sessao.get(CHAVE_SESSAO)
+        if vigente(dados, user):
+            identidade = Identidade(
+                user, dados['motorista_id'], dados['perfil_id'], dados['grupos'],
+                perfil_motorista_id=dados.get('perfil_motorista_id'), tipo_usuario=dados.get('tipo_usuario'),
+            )
+
+    if identidade is None:
+        identidade = resolver_identidade(user)
+        if sessao is not None and user.is_authenticated:
+            sessao[CHAVE_SESSAO] = dict(identidade.para_sessao(), **marca_sessao(user))
+
+    if user is not None:
+        user._identidade = identidade
+    return identidade
+
+
+def descartar_identidade(request):
+    """Esquece a identidade da requisição e da sessão (após corrigir perfil/grupos)"""
+    if getattr(request.user, '_identidade', None) is not None:
+        del request.user._identidade
+    if hasattr(request, 'session'):
+        request.session.pop(CHAVE_SESSAO, None)
+
+
+@receiver([post_save, post_delete], sender=Motorista)
+@receiver([post_save, post_delete], sender=PerfilUsuario)
+def invalidar_identidades_ao_alterar(sender, update_fields=None, **kwargs):
+    """Vínculo motorista/usuário ou perfil mudou"""
+    if sender is Motorista and update_fields is not None and not update_fields & {'user', 'user_id'}:
+        return  # status, nome etc. do motorista não fazem parte da identidade
+    invalidar_identidades()
+
+
+@receiver(m2m_changed, sender=get_user_model().groups.through)
+def invalidar_identidades_ao_mudar_grupos(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidar_identidades()
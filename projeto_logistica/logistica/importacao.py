@@ -0,0 +1,212 @@
+import csv
+import json
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+
+from .estatisticas import invalidar_estatisticas
+from .eventos import estado, registrar_eventos
+from .rastreamento import invalidar_rastreios
+from .geocodificacao import formatar_cep
+from .lotes import TAMANHO_BATCH, validar_clientes, validar_entregas
+from .models import Cliente
+
+
+TIPOS = ('entrega', 'cliente')
+FORMATOS = ('csv', 'ndjson')
+
+# Registros validados e gravados por vez; a memória usada depende só disto
+TAMANHO_CHUNK = 1000
+
+# O pipeline trabalha com tuplas (linha, registro, erros); erros é None
+# enquanto o registro estiver válido.
+
+
+def detectar_formato(nome):
+    """Formato pelo nome do arquivo (.ndjson/.jsonl, senão CSV)"""
+    nome = str(nome).lower().removesuffix('.gz')
+    return 'ndjson' if nome.endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def ler_registros(arquivo, formato):
+    """Gera os registros de um arquivo de texto CSV (com cabeçalho) ou NDJSON"""
+    if formato == 'ndjson':
+        for numero, linha in enumerate(arquivo, start=1):
+            if not linha.strip():
+                continue
+            try:
+                registro = json.loads(linha)
+            except ValueError as e:
+                yield numero, {'conteudo': linha.strip()}, {'registro': [f'JSON inválido: {e}']}
+                continue
+            if isinstance(registro, dict):
+                yield numero, registro, None
+            else:
+                yield numero, {'conteudo': registro}, {'registro': ['Esperado um objeto JSON por linha.']}
+    else:
+        leitor = csv.DictReader(arquivo)
+        while True:
+            try:
+                registro = next(leitor)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                # Linha malformada (byte nulo, campo grande demais...): recusa e segue
+                yield leitor.line_num, {}, {'registro': [f'CSV inválido: {e}']}
+                continue
+            registro.pop(None, None)  # colunas sobrando na linha
+            yield leitor.line_num, registro, None
+
+
+def _normalizar(registro, tipo):
+    # Valores vazios viram ausentes para os campos opcionais usarem o padrão
+    normalizado = {}
+    for campo, valor in registro.items():
+        if isinstance(valor, str):
+            valor = valor.strip()
+        if campo and valor not in ('', None):
+            normalizado[campo] = valor
+    registro = normalizado
+
+    if tipo == 'entrega':
+        if 'codigo_rastreio' in registro:
+            registro['codigo_rastreio'] = str(registro['codigo_rastreio']).upper()
+        for campo in ('cep_origem', 'cep_destino'):
+            if campo in registro:
+                registro[campo] = formatar_cep(registro[campo])
+    return registro
+
+
+def normalizar(registros, tipo):
+    """Remove espaços e vazios, padroniza código de rastreio e CEPs"""
+    for linha, registro, erros in registros:
+        if erros is None:
+            registro = _normalizar(registro, tipo)
+        yield linha, registro, erros
+
+
+def _resolver_clientes(registros):
+    """Troca cliente_email pelo id do cliente, com uma consulta para o chunk"""
+    emails = {r['cliente_email'] for _, r, erros in registros if erros is None and 'cliente_email' in r}
+    ids = dict(Cliente.objects.filter(email__in=emails).values_list('email', 'id')) if emails else {}
+
+    resolvidos = []
+    for linha, registro, erros in registros:
+        if erros is None and 'cliente' not in registro and 'cliente_email' in registro:
+            if registro['cliente_email'] in ids:
+                registro = dict(registro, cliente=ids[registro['cliente_email']])
+            else:
+                erros = {'cliente_email': ['Cliente não encontrado.']}
+        resolvidos.append((linha, registro, erros))
+    return resolvidos
+
+
+def validar(registros, tipo, tamanho_chunk=TAMANHO_CHUNK):
+    """
+    Agrupa os registros em chunks e valida cada um com as regras dos lotes
+    da API. Gera por chunk (válidos, rejeitados): válidos são tuplas
+    (linha, registro, objeto) prontas para gravar.
+
+    O chunk seguinte só é lido depois que o anterior foi gravado, então
+    duplicidades entre chunks aparecem como "já existe".
+    """
+    registros = iter(registros)
+    while True:
+        chunk = list(islice(registros, tamanho_chunk))
+        if not chunk:
+            return
+        if tipo == 'entrega':
+            chunk = _resolver_clientes(chunk)
+
+        rejeitados = [(linha, registro, erros) for linha, registro, erros in chunk if erros is not None]
+        candidatos = [(linha, registro) for linha, registro, erros in chunk if erros is None]
+        validador = validar_entregas if tipo == 'entrega' else validar_clientes
+        objetos, erros = validador([registro for _, registro in candidatos])
+        for erro in erros:
+            linha, registro = candidatos[erro['indice']]
+            rejeitados.append((linha, registro, erro['erros']))
+
+        rejeitados.sort(key=lambda r: r[0])
+        yield [(*candidatos[indice], objeto) for indice, objeto in objetos], rejeitados
+
+
+def _gravar(validos):
+    """
+    Grava o chunk com bulk_create; exige uma transação. Se outro processo
+    gravou o mesmo código ou e-mail entre a validação e o insert, grava um a
+    um em savepoints e recusa só os que colidiram. Retorna (gravados, recusados).
+    """
+    modelo = type(validos[0][2])
+    try:
+        with transaction.atomic():
+            modelo.objects.bulk_create([objeto for _, _, objeto in validos], batch_size=TAMANHO_BATCH)
+        return validos, []
+    except IntegrityError:
+        pass
+
+    gravados, recusados = [], []
+    for linha, registro, objeto in validos:
+        try:
+            with transaction.atomic():
+                modelo.objects.bulk_create([objeto])
+        except IntegrityError as e:
+            recusados.append((linha, registro, {'registro': [f'Não foi possível gravar: {e}']}))
+        else:
+            gravados.append((linha, registro, objeto))
+    return gravados, recusados
+
+
+def importar(arquivo, tipo, formato, rejeitar=None, progresso=None, tamanho_chunk=TAMANHO_CHUNK):
+    """
+    Importa um arquivo de entregas ou clientes: lê, normaliza, valida e grava
+    com bulk_create, um chunk por transação.
+
+    rejeitar(linha, registro, erros) recebe cada registro recusado e
+    progresso(resumo) é chamado após cada chunk. Retorna o resumo com as
+    quantidades lidas, importadas e rejeitadas.
+    """
+    if tipo not in TIPOS:
+        raise ValueError(f'Tipo inválido: {tipo}')
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato inválido: {formato}')
+
+    resumo = {'lidas': 0, 'importadas': 0, 'rejeitadas': 0}
+    registros = normalizar(ler_registros(arquivo, formato), tipo)
+
+    for validos, rejeitados in validar(registros, tipo, tamanho_chunk):
+        objetos = []
+        if validos:
+            with transaction.atomic():
+                validos, recusados = _gravar(validos)
+                objetos = [objeto for _, _, objeto in validos]
+                if tipo == 'entrega' and objetos:
+                    registrar_eventos(estado(entrega) for entrega in objetos)
+            if recusados:
+                rejeitados = sorted(rejeitados + recusados, key=lambda r: r[0])
+        if rejeitar:
+            for linha, registro, erros in rejeitados:
+                rejeitar(linha, registro, erros)
+
+        resumo['lidas'] += len(objetos) + len(rejeitados)
+        resumo['importadas'] += len(objetos)
+        resumo['rejeitadas'] += len(rejeitados)
+        if progresso:
+            progresso(dict(resumo))
+
+    if resumo['importadas']:
+        invalidar_estatisticas()
+        invalidar_rastreios()
+    return resumo
+
+
+class ArquivoRejeitados:
+    """Grava os registros recusados em NDJSON: {"linha", "erros", "registro"}"""
+
+    def __init__(self, arquivo):
+        self.arquivo = arquivo
+
+    def __call__(self, linha, registro, erros):
+        self.arquivo.write(json.dumps(
+            {'linha': linha, 'erros': erros, 'registro': registro},
+            ensure_ascii=False, default=str,
+        ) + '\n')
@@ -0,0 +1,214 @@
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import EntregaEvento, IndicadorDiario, MarcoIndicadores, Rota
+
+
+# Indicadores diários por motorista, veículo e cliente (IndicadorDiario).
+#
+# As entregas entram pela linha do tempo: cada evento que muda o status conta
+# uma entrega naquele status no dia do evento, e a chegada em 'entregue' soma
+# peso e frete. Os eventos são só de inserção, então basta somar os que vieram
+# depois do marco (MarcoIndicadores.ultimo_evento). Quem grava eventos
+# (eventos.py) agenda atualizar_indicadores para depois do commit, então a
+# soma acompanha as escritas; a leitura não soma nada, porque uma escrita em
+# cada GET disputaria o banco entre leitores e, no SQLite, terminaria em
+# "database is locked". O comando recalcular_indicadores --incremental faz o
+# mesmo e serve de repescagem se um commit terminar sem a soma. Rotas
+# concluídas somam km e contagem na data da rota, na própria transação que as
+# conclui. Remover uma entrega ou rota não desconta o que já foi somado; o
+# comando recalcular_indicadores refaz tudo a partir do banco.
+#
+# Quem grava nos indicadores trava antes a linha do marco, então as somas
+# (leitura + escrita) nunca se cruzam.
+
+CAMPO_POR_STATUS = {
+    'pendente': 'pendentes',
+    'em_transito': 'em_transito',
+    'entregue': 'entregues',
+    'cancelada': 'canceladas',
+    'remarcada': 'remarcadas',
+}
+CAMPOS_SOMA = (*CAMPO_POR_STATUS.values(), 'kg_entregues', 'valor_entregue', 'rotas_concluidas', 'km')
+
+TAMANHO_BATCH = 500
+
+# Dias mostrados na página de detalhes
+DIAS_DETALHE = 30
+
+
+def _zerado():
+    return dict.fromkeys(CAMPOS_SOMA, 0)
+
+
+def _travar_marco():
+    """Trava (e cria na primeira vez) a linha do marco; exige uma transação"""
+    if connection.features.has_select_for_update:
+        return MarcoIndicadores.objects.select_for_update().get_or_create(pk=1)[0]
+    # SQLite: sem FOR UPDATE, a escrita inicial obtém o lock de escrita do banco
+    # antes das leituras, então dois processos não tentam promover o lock juntos
+    MarcoIndicadores.objects.filter(pk=1).update(ultimo_evento=F('ultimo_evento'))
+    return MarcoIndicadores.objects.get_or_create(pk=1)[0]
+
+
+def _somar_eventos(eventos, deltas):
+    """Acumula em deltas as mudanças de status dos eventos. Retorna quantos eventos leu"""
+    anterior = (EntregaEvento.objects.filter(entrega=OuterRef('entrega_id'), pk__lt=OuterRef('pk'))
+                .order_by('-pk').values('status')[:1])
+    linhas = eventos.order_by().annotate(
+        status_anterior=Subquery(anterior),
+        dia=TruncDate('momento'),
+        motorista_da_entrega=Coalesce('motorista_id', 'rota__motorista_id'),
+    ).values_list('entrega__cliente_id', 'motorista_da_entrega', 'rota__veiculo_id', 'dia', 'status',
+                  'status_anterior', 'entrega__capacidade_necessaria', 'entrega__valor_frete')
+
+    lidos = 0
+    for cliente_id, motorista_id, veiculo_id, dia, status, anterior, kg, valor in linhas.iterator(chunk_size=2000):
+        lidos += 1
+        if status == anterior:
+            continue  # troca de rota ou de motorista, sem mudança de status
+        for dimensao, referencia in (('cliente', cliente_id), ('motorista', motorista_id), ('veiculo', veiculo_id)):
+            if referencia is None:
+                continue
+            soma = deltas[(dimensao, referencia, dia)]
+            soma[CAMPO_POR_STATUS[status]] += 1
+            if status == 'entregue':
+                soma['kg_entregues'] += kg
+                soma['valor_entregue'] += valor
+    return lidos
+
+
+def _somar_rotas(rotas, deltas):
+    for motorista_id, veiculo_id, dia, km in rotas.order_by().values_list(
+            'motorista_id', 'veiculo_id', 'data_rota', 'km_total_estimado'):
+        for dimensao, referencia in (('motorista', motorista_id), ('veiculo', veiculo_id)):
+            if referencia is None:
+                continue
+            soma = deltas[(dimensao, referencia, dia)]
+            soma['rotas_concluidas'] += 1
+            soma['km'] += km or 0
+
+
+def _aplicar(deltas, vazio=False):
+    """
+    Soma os deltas nas linhas existentes (uma leitura por dimensão) e cria as
+    que faltam. Com vazio=True as linhas acabaram de ser apagadas e só há inserts.
+    """
+    existentes = {}
+    if not vazio:
+        for dimensao in {d for d, _, _ in deltas}:
+            chaves = [chave for chave in deltas if chave[0] == dimensao]
+            linhas = IndicadorDiario.objects.filter(
+                dimensao=dimensao, referencia_id__in={r for _, r, _ in chaves}, dia__in={d for _, _, d in chaves})
+            existentes.update({(i.dimensao, i.referencia_id, i.dia): i for i in linhas})
+
+    novos = []
+    alterados = []
+    for (dimensao, referencia, dia), soma in deltas.items():
+        indicador = existentes.get((dimensao, referencia, dia))
+        if indicador is None:
+            novos.append(IndicadorDiario(dimensao=dimensao, referencia_id=referencia, dia=dia, **soma))
+            continue
+        for campo, valor in soma.items():
+            setattr(indicador, campo, getattr(indicador, campo) + valor)
+        alterados.append(indicador)
+
+    IndicadorDiario.objects.bulk_create(novos, batch_size=TAMANHO_BATCH)
+    IndicadorDiario.objects.bulk_update(alterados, CAMPOS_SOMA, batch_size=TAMANHO_BATCH)
+
+
+def _ultimo_evento():
+    return EntregaEvento.objects.aggregate(ultimo=Max('pk'))['ultimo'] or 0
+
+
+def atualizar_indicadores():
+    """
+    Soma os eventos gravados depois do marco. Sem eventos novos custa uma
+    consulta. Retorna quantos eventos foram lidos.
+    """
+    marco = MarcoIndicadores.objects.filter(pk=1).values('ultimo_evento')
+    if not EntregaEvento.objects.filter(pk__gt=Coalesce(Subquery(marco), Value(0))).exists():
+        return 0
+
+    with transaction.atomic():
+        marco = _travar_marco()
+        ultimo = _ultimo_evento()
+        if ultimo <= marco.ultimo_evento:
+            return 0  # outro processo somou enquanto esperávamos a trava
+        deltas = defaultdict(_zerado)
+        lidos = _somar_eventos(EntregaEvento.objects.filter(pk__gt=marco.ultimo_evento, pk__lte=ultimo), deltas)
+        _aplicar(deltas)
+        marco.ultimo_evento = ultimo
+        marco.save(update_fields=['ultimo_evento'])
+    return lidos
+
+
+def atualizar_indicadores_ao_confirmar():
+    """Soma os eventos novos depois do commit da transação atual (falha só vai para o log)"""
+    transaction.on_commit(atualizar_indicadores, robust=True)
+
+
+def somar_rotas_concluidas(rotas):
+    """Soma km e rotas concluídas de um queryset de rotas que acabaram de ser concluídas"""
+    deltas = defaultdict(_zerado)
+    with transaction.atomic():
+        _somar_rotas(rotas, deltas)
+        if deltas:
+            _travar_marco()
+            _aplicar(deltas)
+
+
+def recalcular_indicadores(desde=None):
+    """
+    Refaz os indicadores a partir da linha do tempo e das rotas concluídas
+    (todos os dias, ou de `desde` em diante) e adianta o marco.
+    """
+    with transaction.atomic():
+        marco = _travar_marco()
+        ultimo = _ultimo_evento()
+        linhas = IndicadorDiario.objects.all()
+        eventos = EntregaEvento.objects.filter(pk__lte=ultimo)
+        rotas = Rota.objects.filter(status='concluida')
+        if desde:
+            linhas = linhas.filter(dia__gte=desde)
+            eventos = eventos.filter(momento__date__gte=desde)
+            rotas = rotas.filter(data_rota__gte=desde)
+
+        linhas.delete()
+        deltas = defaultdict(_zerado)
+        lidos = _somar_eventos(eventos, deltas)
+        _somar_rotas(rotas, deltas)
+        _aplicar(deltas, vazio=True)
+        marco.ultimo_evento = ultimo
+        marco.save(update_fields=['ultimo_evento'])
+    return {'eventos': lidos, 'linhas': len(deltas)}
+
+
+def indicadores(dimensao, referencia_id, desde=None, ate=None):
+    """
+    Linhas diárias ({'dia', campos...}), totais do motorista, veículo ou
+    cliente no período e 'atualizado_ate' (momento do último evento somado).
+    O custo depende do número de dias, não de entregas.
+    """
+    linhas = IndicadorDiario.objects.filter(dimensao=dimensao, referencia_id=referencia_id)
+    if desde:
+        linhas = linhas.filter(dia__gte=desde)
+    if ate:
+        linhas = linhas.filter(dia__lte=ate)
+    dias = list(linhas.order_by('dia').values('dia', *CAMPOS_SOMA))
+    totais = {campo: sum(dia[campo] for dia in dias) for campo in CAMPOS_SOMA}
+    atualizado_ate = EntregaEvento.objects.filter(
+        pk=Subquery(MarcoIndicadores.objects.filter(pk=1).values('ultimo_evento'))).values_list('momento', flat=True)
+    return {'dias': dias, 'totais': totais, 'atualizado_ate': atualizado_ate.first()}
+
+
+@receiver(post_save, sender=Rota)
+def somar_rota_concluida_ao_salvar(sender, instance, created, **kwargs):
+    """Rota gravada já concluída pelo save() (o ciclo_rotas soma as suas por conta própria)"""
+    if instance.status == 'concluida' and (created or instance.valor_original('status') != 'concluida'):
+        somar_rotas_concluidas(Rota.objects.filter(pk=instance.pk))
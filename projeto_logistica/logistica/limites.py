@@ -0,0 +1,171 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+
+logger = logging.getLogger(__name__)
+
+# Configuração padrão; settings.LIMITES_REQUISICOES sobrescreve as chaves informadas.
+# Cada regra: prefixos de caminho, taxa (requisições por segundo) e capacidade
+# (rajada máxima). O rastreamento conta só as buscas (com ?pesquisa= ou código).
+PADRAO = {
+    'ATIVO': True,
+    'CACHE': None,                      # alias de um cache compartilhado; None usa o default se for compartilhado
+    'CONFIAR_X_FORWARDED_FOR': False,   # só atrás de um proxy que sobrescreve o cabeçalho
+    'MAX_CHAVES_LOCAIS': 50000,
+    'REGRAS': {
+        'rastreio': {'caminhos': ('/buscar_entrega/', '/rastreio/'), 'taxa': 2.0, 'capacidade': 30},
+        'api': {'caminhos': ('/api/',), 'taxa': 20.0, 'capacidade': 100},
+    },
+}
+
+# Backends cujo conteúdo é visto por todos os processos
+CACHES_COMPARTILHADOS = (
+    'django.core.cache.backends.redis.RedisCache',
+    'django.core.cache.backends.memcached.PyMemcacheCache',
+    'django.core.cache.backends.memcached.PyLibMCCache',
+)
+
+
+def configuracao():
+    config = {**PADRAO, **getattr(settings, 'LIMITES_REQUISICOES', {})}
+    config['REGRAS'] = {**PADRAO['REGRAS'], **config['REGRAS']}
+    return config
+
+
+class BaldesLocais:
+    """
+    Token bucket em memória do processo (o substituto quando não há cache
+    compartilhado). As chaves menos usadas saem quando passam de max_chaves,
+    então uma varredura de IPs não faz a memória crescer sem limite.
+    """
+
+    def __init__(self, max_chaves):
+        self.max_chaves = max_chaves
+        self.baldes = OrderedDict()
+        self.lock = threading.Lock()
+
+    def consumir(self, chave, taxa, capacidade):
+        """Retorna (permitido, segundos até haver uma ficha)"""
+        agora = time.monotonic()
+        with self.lock:
+            fichas, ultimo = self.baldes.pop(chave, (capacidade, agora))
+            fichas = min(capacidade, fichas + (agora - ultimo) * taxa)
+            permitido = fichas >= 1
+            if permitido:
+                fichas -= 1
+            self.baldes[chave] = (fichas, agora)
+            if len(self.baldes) > self.max_chaves:
+                self.baldes.popitem(last=False)
+        return permitido, 0 if permitido else (1 - fichas) / taxa
+
+
+class BaldesCache:
+    """
+    Token bucket em um cache compartilhado entre processos, na forma GCRA:
+    cada chave guarda só o instante teórico da próxima chegada, um get e um
+    set por requisição. Sem transação entre os dois, concorrentes na mesma
+    chave podem passar uma ficha a mais, o que é aceitável aqui.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def consumir(self, chave, taxa, capacidade):
+        agora = time.time()
+        intervalo = 1 / taxa
+        chegada = max(self.cache.get(chave) or agora, agora)
+        excesso = chegada + intervalo - agora - intervalo * capacidade
+        if excesso > 0:
+            return False, excesso
+        self.cache.set(chave, chegada + intervalo, math.ceil(intervalo * capacidade) + 1)
+        return True, 0
+
+
+def criar_baldes(config):
+    alias = config['CACHE']
+    if alias is None and settings.CACHES.get('default', {}).get('BACKEND') in CACHES_COMPARTILHADOS:
+        alias = 'default'
+    if alias is not None:
+        return BaldesCache(caches[alias])
+    return BaldesLocais(config['MAX_CHAVES_LOCAIS'])
+
+
+def _ip(request, confiar_proxy):
+    if confiar_proxy and request.META.get('HTTP_X_FORWARDED_FOR'):
+        return request.META['HTTP_X_FORWARDED_FOR'].split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _token(request):
+    """
+    Token da API no cabeçalho Authorization (só o hash vai para a chave). Não
+    é verificado aqui, então só serve para restringir mais, nunca para liberar.
+    """
+    tipo, _, valor = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if tipo.lower() in ('token', 'bearer') and valor:
+        return hashlib.sha1(valor.strip().encode()).hexdigest()[:20]
+    return None
+
+
+class LimiteRequisicoesMiddleware:
+    """
+    Limita as buscas públicas de rastreamento (por IP) e a API (por IP e,
+    havendo token, também por token) com token buckets. O excesso recebe um 429 montado
+    aqui mesmo, antes de sessão, autenticação ou qualquer consulta ao banco.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        config = configuracao()
+        self.ativo = config['ATIVO']
+        self.confiar_proxy = config['CONFIAR_X_FORWARDED_FOR']
+        self.regras = [
+            (nome, tuple(regra['caminhos']), float(regra['taxa']), float(regra['capacidade']))
+            for nome, regra in config['REGRAS'].items()
+        ]
+        self.baldes = criar_baldes(config)
+
+    def __call__(self, request):
+        if self.ativo:
+            for nome, caminhos, taxa, capacidade in self.regras:
+                if request.path.startswith(caminhos):
+                    resposta = self.verificar(request, nome, taxa, capacidade)
+                    if resposta is not None:
+                        return resposta
+                    break
+        return self.get_response(request)
+
+    def verificar(self, request, nome, taxa, capacidade):
+        if nome == 'rastreio' and request.path.startswith('/buscar_entrega/') and 'pesquisa' not in request.GET:
+            return None  # o formulário vazio não busca nada
+
+        # O balde do IP é sempre cobrado: trocar de token a cada requisição não dá fichas novas
+        chaves = [f'logistica:limite:{nome}:ip:{_ip(request, self.confiar_proxy)}']
+        token = _token(request) if nome == 'api' else None
+        if token:
+            chaves.append(f'logistica:limite:{nome}:token:{token}')
+        for chave in chaves:
+            permitido, espera = self.baldes.consumir(chave, taxa, capacidade)
+            if not permitido:
+                break
+        else:
+            return None
+
+        # debug: numa enxurrada, um registro por requisição recusada custaria mais que a recusa
+        logger.debug('Limite %s excedido: %s', nome, chave)
+        if nome == 'api':
+            resposta = HttpResponse(b'{"erro": "Muitas requisicoes; tente novamente em instantes."}',
+                                    status=429, content_type='application/json')
+        else:
+            resposta = HttpResponse('Muitas buscas seguidas; tente novamente em instantes.',
+                                    status=429, content_type='text/plain; charset=utf-8')
+        resposta['Retry-After'] = str(max(1, math.ceil(espera)))
+        return resposta
@@ -0,0 +1,235 @@
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .estatisticas import invalidar_estatisticas
+from .eventos import CAMPOS_EVENTO, estado, registrar_eventos
+from .rastreamento import invalidar_rastreio, invalidar_rastreios
+from .models import Cliente, Motorista, Entrega
+from .serializers import ClienteLoteSerializer, EntregaLoteSerializer, EntregaLoteAtualizacaoSerializer
+
+
+# Máximo de itens por requisição nos endpoints de lote
+LIMITE_LOTE = 1000
+TAMANHO_BATCH = 500
+
+
+def _erro(indice, item, erros):
+    return {
+        'indice': indice,
+        'codigo_rastreio': item.get('codigo_rastreio') if isinstance(item, dict) else None,
+        'id': item.get('id') if isinstance(item, dict) else None,
+        'erros': erros,
+    }
+
+
+def _validar_itens(serializer_class, itens):
+    """
+    Valida cada item com uma única instância do serializer (montar os campos
+    a cada item custa mais que a validação em si). Retorna (validos, erros).
+    """
+    serializer = serializer_class()
+    validos = []
+    erros = []
+    for indice, item in enumerate(itens):
+        try:
+            validos.append((indice, serializer.run_validation(item)))
+        except ValidationError as e:
+            detalhe = e.detail if isinstance(e.detail, dict) else {'non_field_errors': e.detail}
+            erros.append(_erro(indice, item, detalhe))
+    return validos, erros
+
+
+def _existentes(model, ids):
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return set()
+    return set(model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+
+
+def validar_entregas(itens):
+    """
+    Valida um lote de entregas em uma passada.
+
+    Os campos de cada item são validados em memória (mesmas regras do
+    EntregaForm); código já existente ou repetido no lote, cliente e motorista
+    inexistentes são conferidos com uma consulta por tipo para o lote todo.
+    Retorna (entregas, erros): lista de (indice, Entrega) prontas para o
+    bulk_create e lista de erros por item.
+    """
+    validos, erros = _validar_itens(EntregaLoteSerializer, itens)
+
+    codigos_existentes = set(
+        Entrega.objects.filter(codigo_rastreio__in=[dados['codigo_rastreio'] for _, dados in validos])
+        .values_list('codigo_rastreio', flat=True)
+    )
+    clientes = _existentes(Cliente, (dados['cliente_id'] for _, dados in validos))
+    motoristas = _existentes(Motorista, (dados.get('motorista_id') for _, dados in validos))
+
+    entregas = []
+    vistos = set()
+    for indice, dados in validos:
+        problemas = {}
+        codigo = dados['codigo_rastreio']
+        if codigo in codigos_existentes:
+            problemas['codigo_rastreio'] = ['Este código de rastreio já existe.']
+        elif codigo in vistos:
+            problemas['codigo_rastreio'] = ['Código de rastreio repetido no lote.']
+        vistos.add(codigo)
+        if dados['cliente_id'] not in clientes:
+            problemas['cliente'] = ['Cliente não encontrado.']
+        if dados.get('motorista_id') is not None and dados['motorista_id'] not in motoristas:
+            problemas['motorista'] = ['Motorista não encontrado.']
+
+        if problemas:
+            erros.append(_erro(indice, dados, problemas))
+        else:
+            entregas.append((indice, Entrega(**dados)))
+
+    erros.sort(key=lambda erro: erro['indice'])
+    return entregas, erros
+
+
+def validar_clientes(itens):
+    """
+    Valida um lote de clientes (mesmas regras do ClienteForm), conferindo
+    e-mails já cadastrados ou repetidos no lote com uma única consulta.
+    Retorna (clientes, erros) como validar_entregas.
+    """
+    validos, erros = _validar_itens(ClienteLoteSerializer, itens)
+
+    emails_existentes = set(
+        Cliente.objects.filter(email__in=[dados['email'] for _, dados in validos])
+        .values_list('email', flat=True)
+    )
+
+    clientes = []
+    vistos = set()
+    for indice, dados in validos:
+        email = dados['email']
+        if email in emails_existentes:
+            erros.append(_erro(indice, dados, {'email': ['Este e-mail já está cadastrado.']}))
+        elif email in vistos:
+            erros.append(_erro(indice, dados, {'email': ['E-mail repetido no lote.']}))
+        else:
+            clientes.append((indice, Cliente(**dados)))
+        vistos.add(email)
+
+    erros.sort(key=lambda erro: erro['indice'])
+    return clientes, erros
+
+
+def criar_entregas(itens):
+    """
+    Cria as entregas válidas do lote com bulk_create em uma transação.
+
+    Itens inválidos não impedem os demais e voltam em 'erros' com o índice
+    original. Como o bulk_create não dispara sinais, as estatísticas são
+    invalidadas explicitamente após o commit.
+    """
+    entregas, erros = validar_entregas(itens)
+    with transaction.atomic():
+        Entrega.objects.bulk_create([entrega for _, entrega in entregas], batch_size=TAMANHO_BATCH)
+        if entregas:
+            registrar_eventos(estado(entrega) for _, entrega in entregas)
+            transaction.on_commit(invalidar_estatisticas)
+            # Os códigos novos podem estar no cache negativo do rastreamento
+            codigos = [entrega.codigo_rastreio for _, entrega in entregas]
+            transaction.on_commit(lambda: invalidar_rastreio(*codigos))
+
+    return {
+        'criadas': [
+            {'indice': indice, 'id': entrega.pk, 'codigo_rastreio': entrega.codigo_rastreio}
+            for indice, entrega in entregas
+        ],
+        'erros': erros,
+    }
+
+
+def atualizar_entregas(itens):
+    """
+    Atualiza em lote status, motorista, datas e observações.
+
+    Cada item traz o id e só os campos que mudam. As entregas são lidas com
+    uma consulta (in_bulk) e gravadas com um único bulk_update sobre a união
+    dos campos informados.
+    """
+    validos, erros = _validar_itens(EntregaLoteAtualizacaoSerializer, itens)
+
+    entregas = Entrega.objects.in_bulk([dados['id'] for _, dados in validos])
+    motoristas = _existentes(Motorista, (dados.get('motorista_id') for _, dados in validos))
+
+    alteradas = {}
+    com_evento = []
+    campos = set()
+    for indice, dados in validos:
+        entrega = entregas.get(dados['id'])
+        problemas = {}
+        if entrega is None:
+            problemas['id'] = ['Entrega não encontrada.']
+        elif entrega.pk in alteradas:
+            problemas['id'] = ['Entrega repetida no lote.']
+        if dados.get('motorista_id') is not None and dados['motorista_id'] not in motoristas:
+            problemas['motorista'] = ['Motorista não encontrado.']
+        if problemas:
+            erros.append(_erro(indice, dados, problemas))
+            continue
+
+        for campo, valor in dados.items():
+            if campo != 'id':
+                setattr(entrega, campo, valor)
+                campos.add('motorista' if campo == 'motorista_id' else campo)
+        campos.update(entrega.descartar_coordenadas_antigas())
+        alteradas[entrega.pk] = indice
+        if entrega.campos_alterados & set(CAMPOS_EVENTO):
+            com_evento.append(estado(entrega))
+
+    with transaction.atomic():
+        if alteradas and campos:
+            Entrega.objects.bulk_update(
+                [entregas[pk] for pk in alteradas], sorted(campos), batch_size=TAMANHO_BATCH)
+            registrar_eventos(com_evento)
+            transaction.on_commit(invalidar_estatisticas)
+            transaction.on_commit(invalidar_rastreios)
+
+    erros.sort(key=lambda erro: erro['indice'])
+    return {
+        'atualizadas': [{'indice': indice, 'id': pk} for pk, indice in alteradas.items()],
+        'erros': erros,
+    }
+
+
+def alterar_status(ids, status):
+    """
+    Muda o status de várias entregas com um único UPDATE.
+
+    Ao marcar como entregue, preenche data_entrega_real com a data de hoje
+    quando ainda estiver vazia. Retorna a quantidade alterada e os IDs não
+    encontrados.
+    """
+    if status not in dict(Entrega.STATUS_ENTREGA):
+        raise ValueError(f'Status inválido: {status}')
+
+    ids = set(ids)
+    campos = {'status': status}
+    if status == 'entregue':
+        campos['data_entrega_real'] = Coalesce('data_entrega_real', Value(timezone.localdate()))
+
+    with transaction.atomic():
+        entregas = Entrega.objects.filter(pk__in=ids)
+        atuais = list(entregas.order_by().values_list('pk', *CAMPOS_EVENTO))
+        encontradas = {pk for pk, *_ in atuais}
+        atualizadas = entregas.update(**campos)
+        if atualizadas:
+            # Só quem de fato mudou de status ganha evento
+            registrar_eventos((pk, status, rota_id, motorista_id)
+                              for pk, anterior, rota_id, motorista_id in atuais if anterior != status)
+            transaction.on_commit(invalidar_estatisticas)
+            transaction.on_commit(invalidar_rastreios)
+
+    return {
+        'atualizadas': atualizadas,
+        'nao_encontradas': sorted(ids - encontradas),
+    }
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from logistica.geocodificacao import carregar_ceps, ler_arquivo_ceps
+
+
+class Command(BaseCommand):
+    help = 'Carrega a base local de CEPs (CSV ou CSV.gz com cep, latitude, longitude)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do arquivo de CEPs')
+        parser.add_argument(
+            '--substituir',
+            action='store_true',
+            help='Apaga a base atual antes de carregar',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            total = carregar_ceps(ler_arquivo_ceps(options['arquivo']), substituir=options['substituir'])
+        except OSError as e:
+            raise CommandError(f'Não foi possível ler o arquivo: {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'{total} CEP(s) carregado(s).'))
@@ -0,0 +1,56 @@
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Coletor OTLP/HTTP mínimo: recebe spans em /v1/traces (JSON) e grava um por linha'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--porta', type=int, default=4318)
+        parser.add_argument('--saida', default='spans.ndjson', help='Arquivo NDJSON com os spans recebidos')
+
+    def handle(self, *args, **options):
+        saida = open(options['saida'], 'a', encoding='utf-8')
+        stdout = self.stdout
+
+        class Receptor(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path != '/v1/traces':
+                    self.send_error(404)
+                    return
+                try:
+                    dados = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                except ValueError:
+                    self.send_error(400, 'JSON inválido')
+                    return
+
+                total = 0
+                for recurso in dados.get('resourceSpans', []):
+                    for escopo in recurso.get('scopeSpans', []):
+                        for span in escopo.get('spans', []):
+                            saida.write(json.dumps(span, ensure_ascii=False) + '\n')
+                            total += 1
+                saida.flush()
+                stdout.write(f'{total} span(s) recebido(s)')
+
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(b'{}')
+
+            def log_message(self, formato, *args):
+                pass
+
+        servidor = ThreadingHTTPServer(('', options['porta']), Receptor)
+        self.stdout.write(self.style.SUCCESS(
+            f"Coletor ouvindo em http://localhost:{options['porta']}/v1/traces, gravando em {options['saida']}"
+        ))
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.server_close()
+            saida.close()
@@ -0,0 +1,53 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from logistica.exportacao import COLUNAS, FORMATOS, TAMANHO_CHUNK, exportar
+from logistica.models import Entrega, Rota
+
+
+class Command(BaseCommand):
+    help = 'Exporta entregas ou rotas em CSV, NDJSON ou formato colunar binário'
+
+    def add_arguments(self, parser):
+        parser.add_argument('tipo', choices=sorted(COLUNAS), help='O que exportar')
+        parser.add_argument('--formato', choices=FORMATOS, default='csv')
+        parser.add_argument('--saida', help='Arquivo de saída (padrão: saída padrão)')
+        parser.add_argument('--status', help='Apenas registros com este status')
+        parser.add_argument('--data-inicio', help='Data inicial AAAA-MM-DD (solicitação ou data da rota)')
+        parser.add_argument('--data-fim', help='Data final AAAA-MM-DD')
+        parser.add_argument('--chunk', type=int, default=TAMANHO_CHUNK, help='Linhas lidas por vez')
+
+    def handle(self, *args, **options):
+        tipo = options['tipo']
+        if tipo == 'entrega':
+            queryset, campo_data = Entrega.objects.all(), 'data_solicitacao'
+        else:
+            queryset, campo_data = Rota.objects.all(), 'data_rota'
+
+        if options['status']:
+            queryset = queryset.filter(status=options['status'])
+        for opcao, lookup in (('data_inicio', 'gte'), ('data_fim', 'lte')):
+            if options[opcao]:
+                try:
+                    data = parse_date(options[opcao])
+                except ValueError:
+                    data = None
+                if data is None:
+                    raise CommandError(f'Data inválida: {options[opcao]}')
+                queryset = queryset.filter(**{f'{campo_data}__{lookup}': data})
+
+        binario = options['formato'] == 'colunar'
+        if options['saida']:
+            saida = open(options['saida'], 'wb' if binario else 'w', encoding=None if binario else 'utf-8',
+                         newline=None if binario else '')
+        else:
+            saida = sys.stdout.buffer if binario else self.stdout
+
+        try:
+            for pedaco in exportar(queryset, tipo, options['formato'], options['chunk']):
+                saida.write(pedaco)
+        finally:
+            if options['saida']:
+                saida.close()
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from logistica.geocodificacao import geocodificar_entregas
+
+
+class Command(BaseCommand):
+    help = 'Preenche as coordenadas das entregas a partir da base local de CEPs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sobrescrever',
+            action='store_true',
+            help='Recalcula também as entregas que já têm coordenadas',
+        )
+
+    def handle(self, *args, **options):
+        processadas, sem_cep = geocodificar_entregas(sobrescrever=options['sobrescrever'])
+        self.stdout.write(self.style.SUCCESS(f'{processadas} entrega(s) processada(s).'))
+        if sem_cep:
+            self.stdout.write(self.style.WARNING(f'{sem_cep} entrega(s) com CEP de destino não encontrado.'))
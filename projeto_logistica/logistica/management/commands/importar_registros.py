@@ -0,0 +1,50 @@
+import gzip
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from logistica.importacao import FORMATOS, TAMANHO_CHUNK, TIPOS, ArquivoRejeitados, detectar_formato, importar
+
+
+class Command(BaseCommand):
+    help = 'Importa entregas ou clientes de um arquivo CSV ou NDJSON (opcionalmente .gz)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do arquivo')
+        parser.add_argument('--tipo', choices=TIPOS, default='entrega', help='Tipo dos registros')
+        parser.add_argument('--formato', choices=FORMATOS, help='Padrão: pela extensão do arquivo')
+        parser.add_argument(
+            '--rejeitados',
+            help='Arquivo NDJSON para os registros recusados (padrão: <arquivo>.rejeitados.ndjson)',
+        )
+        parser.add_argument('--chunk', type=int, default=TAMANHO_CHUNK, help='Registros por transação')
+
+    def handle(self, *args, **options):
+        caminho = options['arquivo']
+        formato = options['formato'] or detectar_formato(caminho)
+        caminho_rejeitados = options['rejeitados'] or f'{caminho}.rejeitados.ndjson'
+
+        def progresso(resumo):
+            self.stdout.write(
+                f"{resumo['lidas']} lido(s), {resumo['importadas']} importado(s), "
+                f"{resumo['rejeitadas']} rejeitado(s)"
+            )
+
+        try:
+            abrir = gzip.open if caminho.endswith('.gz') else open
+            with abrir(caminho, 'rt', encoding='utf-8-sig', newline='') as arquivo, \
+                    open(caminho_rejeitados, 'w', encoding='utf-8') as rejeitados:
+                resumo = importar(arquivo, options['tipo'], formato, rejeitar=ArquivoRejeitados(rejeitados),
+                                  progresso=progresso, tamanho_chunk=options['chunk'])
+        except OSError as e:
+            raise CommandError(f'Não foi possível ler o arquivo: {e}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Importação concluída: {resumo['importadas']} de {resumo['lidas']} registro(s)."
+        ))
+        if resumo['rejeitadas']:
+            self.stdout.write(self.style.WARNING(
+                f"{resumo['rejeitadas']} registro(s) rejeitado(s), veja {caminho_rejeitados}"
+            ))
+        else:
+            os.remove(caminho_rejeitados)
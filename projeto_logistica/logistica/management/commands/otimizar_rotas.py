@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_date
+
+from logistica.models import Rota
+from logistica.roteirizacao import TEMPO_LIMITE_PADRAO, otimizar_rota
+
+
+class Command(BaseCommand):
+    help = 'Ordena as paradas das rotas e atualiza km e tempo estimados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('rotas', nargs='*', type=int, help='IDs das rotas (padrão: rotas planejadas)')
+        parser.add_argument('--data', help='Apenas rotas desta data (AAAA-MM-DD)')
+        parser.add_argument(
+            '--tempo-limite',
+            type=float,
+            default=TEMPO_LIMITE_PADRAO,
+            help='Segundos de otimização por rota',
+        )
+
+    def handle(self, *args, **options):
+        rotas = Rota.objects.all()
+        if options['rotas']:
+            rotas = rotas.filter(pk__in=options['rotas'])
+        else:
+            rotas = rotas.filter(status='planejada')
+        if options['data']:
+            rotas = rotas.filter(data_rota=parse_date(options['data']))
+
+        for rota_id in rotas.values_list('id', flat=True):
+            resultado = otimizar_rota(rota_id, options['tempo_limite'])
+            self.stdout.write(
+                f"Rota {rota_id}: {resultado['paradas']} parada(s), "
+                f"{resultado['km_total_estimado']} km, {resultado['tempo_estimado']} min "
+                f"({resultado['tempo_gasto']}s)"
+            )
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from logistica.indicadores import atualizar_indicadores, recalcular_indicadores
+
+
+class Command(BaseCommand):
+    help = ('Refaz os indicadores diários de motoristas, veículos e clientes a partir da linha do tempo '
+            'das entregas e das rotas concluídas')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Refaz só os dias a partir desta data (AAAA-MM-DD)')
+        parser.add_argument('--incremental', action='store_true',
+                            help='Só soma os eventos gravados desde a última atualização (para rodar no cron)')
+
+    def handle(self, *args, **options):
+        if options['incremental']:
+            lidos = atualizar_indicadores()
+            self.stdout.write(self.style.SUCCESS(f'{lidos} evento(s) novo(s) somado(s).'))
+            return
+
+        desde = None
+        if options['desde']:
+            desde = parse_date(options['desde'])
+            if desde is None:
+                raise CommandError('--desde deve estar no formato AAAA-MM-DD.')
+
+        resultado = recalcular_indicadores(desde)
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['eventos']} evento(s) lido(s), {resultado['linhas']} indicador(es) diário(s) gravado(s)."
+        ))
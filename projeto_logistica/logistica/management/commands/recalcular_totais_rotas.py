@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from logistica.models import Rota, recalcular_totais_rotas
+
+
+class Command(BaseCommand):
+    help = 'Recalcula capacidade utilizada, valor total e total de entregas de cada rota'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'rotas',
+            nargs='*',
+            type=int,
+            help='IDs das rotas a recalcular (padrão: todas)',
+        )
+
+    def handle(self, *args, **options):
+        rotas = Rota.objects.all()
+        if options['rotas']:
+            rotas = rotas.filter(pk__in=options['rotas'])
+
+        atualizadas = recalcular_totais_rotas(rotas)
+        self.stdout.write(self.style.SUCCESS(f'{atualizadas} rota(s) recalculada(s).'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from logistica.reconciliacao import reconciliar_grupo_motoristas
+
+
+class Command(BaseCommand):
+    help = 'Coloca no grupo Motoristas todos os usuários vinculados a motoristas e mostra quem foi adicionado'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--simular', action='store_true', help='Só mostra o que seria alterado')
+
+    def handle(self, *args, **options):
+        relatorio = reconciliar_grupo_motoristas(simular=options['simular'])
+        adicionados = relatorio['adicionados']
+
+        if relatorio['grupo_criado']:
+            self.stdout.write('Grupo Motoristas ' + ('seria criado.' if options['simular'] else 'criado.'))
+        for username in adicionados:
+            self.stdout.write(f'  + {username}')
+
+        verbo = 'seriam adicionado(s)' if options['simular'] else 'adicionado(s)'
+        self.stdout.write(self.style.SUCCESS(
+            f"{relatorio['com_usuario']} motorista(s) com usuário, {relatorio['ja_no_grupo']} já no grupo, "
+            f'{len(adicionados)} {verbo}.'
+        ))
@@ -0,0 +1,192 @@
+import json
+import math
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+
+from django.core.management.base import BaseCommand, CommandError
+
+from logistica.sinteticos import SENHA_PADRAO
+
+
+# Cenários e pesos padrão do mix de requisições
+MIX_PADRAO = {
+    'dashboard': 20,
+    'rastreamento': 30,
+    'lista_entregas': 20,
+    'lista_api': 10,
+    'carregamento_rota': 20,
+}
+
+PERCENTIS = (50, 90, 95, 99)
+
+
+def percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return None
+    indice = min(len(valores_ordenados) - 1, max(0, math.ceil(len(valores_ordenados) * p / 100) - 1))
+    return valores_ordenados[indice]
+
+
+class Sessao:
+    """Um usuário virtual: cookies próprios e login pelo formulário"""
+
+    def __init__(self, base, timeout):
+        self.base = base.rstrip('/')
+        self.timeout = timeout
+        self.cookies = CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+
+    def get(self, caminho):
+        with self.opener.open(self.base + caminho, timeout=self.timeout) as resposta:
+            return resposta.status, resposta.read()
+
+    def login(self, usuario, senha):
+        _, corpo = self.get('/login/')
+        token = re.search(rb'name="csrfmiddlewaretoken" value="([^"]+)"', corpo)
+        if not token:
+            raise CommandError('Token CSRF não encontrado em /login/')
+        dados = urllib.parse.urlencode({
+            'username': usuario, 'password': senha, 'csrfmiddlewaretoken': token.group(1).decode(),
+        }).encode()
+        requisicao = urllib.request.Request(self.base + '/login/', data=dados, headers={'Referer': self.base + '/login/'})
+        with self.opener.open(requisicao, timeout=self.timeout) as resposta:
+            resposta.read()
+        if not any(cookie.name == 'sessionid' for cookie in self.cookies):
+            raise CommandError(f'Login de {usuario} falhou')
+
+
+class Command(BaseCommand):
+    help = ('Teste de carga contra um servidor local: repete um mix de dashboard, rastreamento, listas e '
+            'carregamento de rotas e mostra vazão e percentis de latência. Todo o tráfego sai de um IP, então '
+            'suba o servidor com LIMITES_ATIVO=0 para o limite de requisições não responder 429')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://localhost:8000', help='Endereço do servidor')
+        parser.add_argument('--usuario', required=True, help='Usuário para login (admin ou motorista)')
+        parser.add_argument('--senha', default=SENHA_PADRAO)
+        parser.add_argument('--concorrencia', type=int, default=10, help='Usuários virtuais simultâneos')
+        parser.add_argument('--duracao', type=float, default=30, help='Segundos de teste')
+        parser.add_argument('--aquecimento', type=float, default=3, help='Segundos iniciais fora da medição')
+        parser.add_argument('--mix', help='Pesos dos cenários, ex.: dashboard=1,rastreamento=3 '
+                                          f'(cenários: {", ".join(MIX_PADRAO)})')
+        parser.add_argument('--semente', type=int, default=1)
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--json', help='Grava o relatório neste arquivo')
+
+    def handle(self, *args, **options):
+        mix = self.ler_mix(options['mix'])
+        base, timeout = options['url'], options['timeout']
+
+        # Amostra de códigos e rotas para os cenários, lida pela própria API
+        sessao = Sessao(base, timeout)
+        sessao.login(options['usuario'], options['senha'])
+        codigos = [e['codigo_rastreio'] for e in self.api(sessao, '/api/entregas/?page_size=500')]
+        rotas = [r['id'] for r in self.api(sessao, '/api/rotas/?page_size=500')]
+        if not codigos or not rotas:
+            raise CommandError('A base não tem entregas ou rotas; gere dados com manage.py gerar_dados')
+
+        cenarios = {
+            'dashboard': lambda rng: '/',
+            'rastreamento': lambda rng: '/buscar_entrega/?' + urllib.parse.urlencode({'pesquisa': rng.choice(codigos)}),
+            'lista_entregas': lambda rng: rng.choice(['/entregas/', '/entregas/?status=pendente', '/rotas/']),
+            'lista_api': lambda rng: rng.choice(['/api/entregas/', '/api/rotas/', '/api/entregas/?status=entregue']),
+            'carregamento_rota': lambda rng: rng.choice(
+                [f'/rotas/{rng.choice(rotas)}/entregas/', f'/api/rotas/{rng.choice(rotas)}/dashboard/']),
+        }
+        nomes = [nome for nome in mix if mix[nome] > 0]
+        pesos = [mix[nome] for nome in nomes]
+
+        amostras = []
+        lock = threading.Lock()
+        inicio_medicao = time.monotonic() + options['aquecimento']
+        fim = inicio_medicao + options['duracao']
+
+        def usuario_virtual(indice):
+            rng = random.Random(options['semente'] * 1000 + indice)
+            sessao = Sessao(base, timeout)
+            sessao.login(options['usuario'], options['senha'])
+            while time.monotonic() < fim:
+                cenario = rng.choices(nomes, weights=pesos)[0]
+                caminho = cenarios[cenario](rng)
+                inicio = time.monotonic()
+                try:
+                    status, _ = sessao.get(caminho)
+                except urllib.error.HTTPError as e:
+                    status = e.code
+                except (urllib.error.URLError, OSError):
+                    status = None
+                if inicio >= inicio_medicao:
+                    with lock:
+                        amostras.append((cenario, (time.monotonic() - inicio) * 1000, status))
+
+        self.stdout.write(f"{options['concorrencia']} usuário(s) por {options['duracao']:.0f}s contra {base}...")
+        with ThreadPoolExecutor(max_workers=options['concorrencia']) as executor:
+            for futuro in [executor.submit(usuario_virtual, i) for i in range(options['concorrencia'])]:
+                futuro.result()
+
+        relatorio = self.relatorio(amostras, options['duracao'], options['concorrencia'])
+        self.mostrar(relatorio)
+        limitadas = sum(1 for _, _, status in amostras if status == 429)
+        if limitadas:
+            self.stderr.write(f'{limitadas} resposta(s) 429: o limite de requisições está ativo no servidor; '
+                              'rode-o com LIMITES_ATIVO=0 para medir a aplicação')
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as arquivo:
+                json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+
+    def ler_mix(self, texto):
+        if not texto:
+            return dict(MIX_PADRAO)
+        mix = dict.fromkeys(MIX_PADRAO, 0)
+        for parte in texto.split(','):
+            nome, _, peso = parte.partition('=')
+            nome = nome.strip()
+            if nome not in MIX_PADRAO:
+                raise CommandError(f'Cenário desconhecido: {nome}')
+            try:
+                mix[nome] = float(peso or 1)
+            except ValueError:
+                raise CommandError(f'Peso inválido para {nome}: {peso}')
+        if not any(mix.values()):
+            raise CommandError('O mix precisa de ao menos um cenário com peso')
+        return mix
+
+    def api(self, sessao, caminho):
+        _, corpo = sessao.get(caminho)
+        dados = json.loads(corpo)
+        return dados['results'] if isinstance(dados, dict) else dados
+
+    def relatorio(self, amostras, duracao, concorrencia):
+        def resumo(itens):
+            tempos = sorted(tempo for _, tempo, _ in itens)
+            erros = sum(1 for _, _, status in itens if status is None or status >= 400)
+            return {
+                'requisicoes': len(itens),
+                'erros': erros,
+                'vazao_rps': round(len(itens) / duracao, 2),
+                **{f'p{p}_ms': round(percentil(tempos, p), 2) if tempos else None for p in PERCENTIS},
+                'max_ms': round(tempos[-1], 2) if tempos else None,
+            }
+
+        cenarios = sorted({cenario for cenario, _, _ in amostras})
+        return {
+            'duracao_s': duracao,
+            'concorrencia': concorrencia,
+            'total': resumo(amostras),
+            'cenarios': {cenario: resumo([a for a in amostras if a[0] == cenario]) for cenario in cenarios},
+        }
+
+    def mostrar(self, relatorio):
+        colunas = ['requisicoes', 'erros', 'vazao_rps'] + [f'p{p}_ms' for p in PERCENTIS] + ['max_ms']
+        self.stdout.write(f"{'cenário':<20}" + ''.join(f'{coluna:>12}' for coluna in colunas))
+        linhas = list(relatorio['cenarios'].items()) + [('total', relatorio['total'])]
+        for nome, resumo in linhas:
+            self.stdout.write(f'{nome:<20}' + ''.join(
+                f"{'-' if resumo[coluna] is None else resumo[coluna]:>12}" for coluna in colunas))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from logistica.ciclo_rotas import ACOES, TRANSICOES
+from logistica.models import Rota
+
+
+class Command(BaseCommand):
+    help = 'Inicia, conclui ou cancela rotas em lote (por ID ou todas de uma data)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('acao', choices=ACOES)
+        parser.add_argument('rotas', nargs='*', type=int, help='IDs das rotas')
+        parser.add_argument('--data', help='Todas as rotas desta data (AAAA-MM-DD)')
+
+    def handle(self, *args, **options):
+        if options['data']:
+            try:
+                data = parse_date(options['data'])
+            except ValueError:
+                data = None
+            if data is None:
+                raise CommandError('Data inválida, use AAAA-MM-DD')
+            rotas = Rota.objects.filter(data_rota=data)
+            if options['rotas']:
+                rotas = rotas.filter(pk__in=options['rotas'])
+        elif options['rotas']:
+            rotas = Rota.objects.filter(pk__in=options['rotas'])
+        else:
+            raise CommandError('Informe IDs de rotas ou --data')
+
+        resultado = TRANSICOES[options['acao']](rotas)
+        self.stdout.write(self.style.SUCCESS(
+            f"{resultado['rotas']} rota(s), {resultado['entregas']} entrega(s) atualizada(s), "
+            f"{resultado['desvinculadas']} devolvida(s) à fila, {resultado['veiculos']} veículo(s) e "
+            f"{resultado['motoristas']} motorista(s) atualizados; {len(resultado['ignoradas'])} rota(s) ignorada(s)."
+        ))
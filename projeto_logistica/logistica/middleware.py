@@ -1,114 +1,112 @@
+import logging
+
 from django.shortcuts import redirect
-from django.urls import reverse
-from django.utils.deprecation import MiddlewareMixin
 from django.contrib import messages
+from django.contrib.auth.models import Group
+from .identidade import descartar_identidade, marca_sessao, obter_identidade, vigente
 from .models import PerfilUsuario, Motorista
 
 
-class ProfileRedirectMiddleware:
+logger = logging.getLogger(__name__)
+
+# Marca na sessão de que perfil e grupos já foram conferidos nesta versão (identidade.marca_sessao)
+CHAVE_VERIFICADO = '_logistica_perfil_verificado'
+
+
+class IdentidadeMiddleware:
+    """
+    Resolve a identidade do usuário (motorista, perfil e grupos) uma vez por
+    requisição, reaproveitando a da sessão enquanto ela for válida, e a
+    deixa em request.identidade para os demais middlewares e views.
+    """
+
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
-        response = self.get_response(request)
+        request.identidade = obter_identidade(request.user, getattr(request, 'session', None))
+        return self.get_response(request)
+
+
+class ConsistenciaPerfilMiddleware:
+    """
+    Garante que o usuário tenha perfil e que motoristas estejam com o perfil
+    vinculado e no grupo Motoristas. A verificação roda uma vez por sessão
+    (ou quando a versão das identidades muda ou a marca vence) e fica
+    registrada na sessão, então as requisições seguintes não fazem nenhuma consulta.
+    """
+
+    # URLs ignoradas para evitar loops
+    ignored_paths = [
+        '/logout/',
+        '/primeiro-acesso/',
+        '/verificar-meu-grupo/',
+        '/admin/',
+    ]
 
-        # Redirecionar após login baseado no perfil
-        if request.user.is_authenticated and request.path == '/' or request.path == '/home/':
-            if hasattr(request.user, 'motorista') and not request.user.is_staff:
-                # Motorista é redirecionado para suas entregas
-                return redirect('list_entrega')
+    def __init__(self, get_response):
+        self.get_response = get_response
 
-        return response
+    def __call__(self, request):
+        resposta = self.verificar(request)
+        if resposta is not None:
+            return resposta
+        return self.get_response(request)
 
+    def verificar(self, request):
+        if not request.user.is_authenticated or not hasattr(request, 'session'):
+            return None
 
-class VerificarGruposMiddleware(MiddlewareMixin):
-    """Middleware para verificar e corrigir grupos de motoristas"""
+        if any(request.path.startswith(path) for path in self.ignored_paths):
+            return None
 
-    def process_request(self, request):
-        # Só verifica se usuário está autenticado
-        if not request.user.is_authenticated:
+        if vigente(request.session.get(CHAVE_VERIFICADO), request.user):
             return None
 
-        # Ignora URLs específicas para evitar loops
-        ignored_paths = [
-            '/logout/',
-            '/primeiro-acesso/',
-            '/verificar-meu-grupo/',
-            '/admin/',
-        ]
+        identidade = obter_identidade(request.user, request.session)
+        resposta = None
+        corrigido = False
 
-        if any(request.path.startswith(path) for path in ignored_paths):
-            return None
+        # Perfil: criar se não existir e vincular ao motorista do usuário
+        if identidade.perfil_id is None or (identidade.motorista_id and not identidade.perfil_motorista_id):
+            self.corrigir_perfil(request)
+            corrigido = True
 
-        # Verificar se é motorista
-        if hasattr(request.user, 'motorista_profile'):
-            # Verificar se tem grupos
-            if not request.user.groups.exists():
-                # Corrigir automaticamente
-                from django.contrib.auth.models import Group
-                grupo_motorista, _ = Group.objects.get_or_create(name='Motoristas')
-                request.user.groups.add(grupo_motorista)
-                request.user.save()
+        # Grupo: motorista precisa estar em Motoristas
+        if identidade.is_motorista and not identidade.tem_grupo('Motoristas'):
+            grupo_motorista, _ = Group.objects.get_or_create(name='Motoristas')
+            request.user.groups.add(grupo_motorista)
+            corrigido = True
 
+            if not identidade.grupos:
                 messages.info(
                     request,
                     'Seu usuário foi automaticamente configurado. '
                     'Por favor, faça logout e login novamente.'
                 )
-
                 # Se for primeira vez, redirecionar para primeiro acesso
                 if not request.user.last_login:
-                    return redirect('primeiro_acesso_motorista')
+                    resposta = redirect('primeiro_acesso_motorista')
+            else:
+                messages.info(request, 'Seu usuário foi adicionado ao grupo Motoristas.')
 
-            # Verificar especificamente grupo Motoristas
-            elif not request.user.groups.filter(name='Motoristas').exists():
-                # Adicionar ao grupo
-                from django.contrib.auth.models import Group
-                grupo_motorista = Group.objects.get(name='Motoristas')
-                request.user.groups.add(grupo_motorista)
-                request.user.save()
+        if corrigido:
+            # As correções mudam a versão; a identidade é resolvida de novo
+            descartar_identidade(request)
+            request.identidade = obter_identidade(request.user, request.session)
 
-                messages.info(
-                    request,
-                    'Seu usuário foi adicionado ao grupo Motoristas.'
-                )
-
-        return None
-
-
-class CriarPerfilMotoristaMiddleware(MiddlewareMixin):
-    """Middleware para criar perfil automaticamente para motoristas"""
-
-    def process_request(self, request):
-        if not request.user.is_authenticated:
-            return None
-
-        # Ignorar URLs específicas
-        ignored_paths = [
-            '/logout/',
-            '/admin/',
-            '/primeiro-acesso/',
-        ]
-
-        if any(request.path.startswith(path) for path in ignored_paths):
-            return None
-
-        # Verificar se usuário tem perfil
-        if not hasattr(request.user, 'perfil'):
-            # Criar perfil se não existir
-            PerfilUsuario.objects.create(user=request.user)
+        request.session[CHAVE_VERIFICADO] = marca_sessao(request.user)
+        return resposta
 
-        # Se é motorista, garantir que tenha perfil vinculado
-        perfil = getattr(request.user, 'perfil', None)
-        if perfil and not perfil.motorista:
+    def corrigir_perfil(self, request):
+        perfil, _ = PerfilUsuario.objects.get_or_create(user=request.user)
+        if not perfil.motorista_id:
             # Verificar se há motorista vinculado a este usuário
             try:
                 motorista = Motorista.objects.get(user=request.user)
                 perfil.motorista = motorista
                 perfil.tipo_usuario = 'motorista'
                 perfil.save()
-                print(f"✅ Perfil vinculado ao motorista {motorista.nome}")
+                logger.info("Perfil vinculado ao motorista %s", motorista.nome)
             except Motorista.DoesNotExist:
                 pass
-
-        return None
\ No newline at end of file
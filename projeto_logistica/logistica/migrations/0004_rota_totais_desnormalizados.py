@@ -0,0 +1,50 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:42
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def preencher_totais(apps, schema_editor):
+    Rota = apps.get_model('logistica', 'Rota')
+    Entrega = apps.get_model('logistica', 'Entrega')
+
+    totais = (
+        Entrega.objects.filter(rota__isnull=False)
+        .order_by()
+        .values('rota')
+        .annotate(capacidade=Sum('capacidade_necessaria'), valor=Sum('valor_frete'), qtd=Count('id'))
+    )
+    for linha in totais:
+        Rota.objects.filter(pk=linha['rota']).update(
+            capacidade_utilizada=linha['capacidade'] or 0,
+            valor_total=linha['valor'] or Decimal('0'),
+            total_entregas=linha['qtd'],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistica', '0003_motorista_token_convite_motorista_token_validade_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rota',
+            name='capacidade_utilizada',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='rota',
+            name='total_entregas',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='rota',
+            name='valor_total',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12),
+        ),
+        migrations.RunPython(preencher_totais, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistica', '0004_rota_totais_desnormalizados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='entrega',
+            name='latitude_destino',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='entrega',
+            name='latitude_origem',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='entrega',
+            name='longitude_destino',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='entrega',
+            name='longitude_origem',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='entrega',
+            name='ordem_parada',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-18 06:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistica', '0005_entrega_coordenadas_ordem_parada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CepCoordenada',
+            fields=[
+                ('cep', models.PositiveIntegerField(primary_key=True, serialize=False)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+            ],
+            options={
+                'verbose_name': 'Coordenada de CEP',
+                'verbose_name_plural': 'Coordenadas de CEP',
+            },
+        ),
+    ]
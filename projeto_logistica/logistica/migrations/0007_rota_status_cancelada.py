@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistica', '0006_cepcoordenada'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='rota',
+            name='status',
+            field=models.CharField(choices=[('planejada', 'Planejada'), ('em_andamento', 'Em andamento'), ('concluida', 'Concluída'), ('cancelada', 'Cancelada')], default='planejada', max_length=20),
+        ),
+    ]
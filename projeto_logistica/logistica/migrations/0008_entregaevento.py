@@ -0,0 +1,55 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:30
+
+from datetime import datetime, time
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def eventos_iniciais(apps, schema_editor):
+    """Um evento com o estado atual de cada entrega, na data de solicitação"""
+    Entrega = apps.get_model('logistica', 'Entrega')
+    EntregaEvento = apps.get_model('logistica', 'EntregaEvento')
+
+    fuso = django.utils.timezone.get_current_timezone()
+    lote = []
+    linhas = Entrega.objects.order_by('pk').values_list(
+        'pk', 'status', 'rota_id', 'motorista_id', 'data_solicitacao').iterator(chunk_size=2000)
+    for pk, status, rota_id, motorista_id, solicitacao in linhas:
+        lote.append(EntregaEvento(
+            entrega_id=pk, status=status, rota_id=rota_id, motorista_id=motorista_id,
+            momento=django.utils.timezone.make_aware(datetime.combine(solicitacao, time.min), fuso),
+        ))
+        if len(lote) >= 2000:
+            EntregaEvento.objects.bulk_create(lote)
+            lote = []
+    EntregaEvento.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistica', '0007_rota_status_cancelada'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntregaEvento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('momento', models.DateTimeField(default=django.utils.timezone.now)),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('em_transito', 'Em trânsito'), ('entregue', 'Entregue'), ('cancelada', 'Cancelada'), ('remarcada', 'Remarcada')], max_length=20)),
+                ('entrega', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='eventos', to='logistica.entrega')),
+                ('motorista', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='logistica.motorista')),
+                ('rota', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='logistica.rota')),
+            ],
+            options={
+                'verbose_name': 'Evento da entrega',
+                'verbose_name_plural': 'Eventos das entregas',
+                'ordering': ['momento', 'id'],
+                'indexes': [models.Index(fields=['entrega', 'momento'], name='evento_entrega_momento_idx')],
+            },
+        ),
+        migrations.RunPython(eventos_iniciais, migrations.RunPython.noop),
+    ]
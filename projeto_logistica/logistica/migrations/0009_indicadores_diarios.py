@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistica', '0008_entregaevento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MarcoIndicadores',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultimo_evento', models.PositiveBigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Marco dos indicadores',
+            },
+        ),
+        migrations.CreateModel(
+            name='IndicadorDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimensao', models.CharField(choices=[('motorista', 'Motorista'), ('veiculo', 'Veículo'), ('cliente', 'Cliente')], max_length=10)),
+                ('referencia_id', models.PositiveBigIntegerField()),
+                ('dia', models.DateField()),
+                ('pendentes', models.PositiveIntegerField(default=0)),
+                ('em_transito', models.PositiveIntegerField(default=0)),
+                ('entregues', models.PositiveIntegerField(default=0)),
+                ('canceladas', models.PositiveIntegerField(default=0)),
+                ('remarcadas', models.PositiveIntegerField(default=0)),
+                ('kg_entregues', models.FloatField(default=0)),
+                ('valor_entregue', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('rotas_concluidas', models.PositiveIntegerField(default=0)),
+                ('km', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Indicador diário',
+                'verbose_name_plural': 'Indicadores diários',
+                'ordering': ['dia'],
+                'constraints': [models.UniqueConstraint(fields=('dimensao', 'referencia_id', 'dia'), name='indicador_dimensao_dia_unico')],
+            },
+        ),
+    ]
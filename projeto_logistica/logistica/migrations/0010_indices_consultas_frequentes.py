@@ -0,0 +1,59 @@
+# Generated by Django 5.2.8 on 2026-10-18 07:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistica', '0009_indicadores_diarios'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['nome', 'id'], name='cliente_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entrega',
+            index=models.Index(fields=['data_solicitacao', 'id'], name='entrega_solicitacao_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entrega',
+            index=models.Index(fields=['status', 'data_solicitacao', 'id'], name='entrega_status_solic_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entrega',
+            index=models.Index(fields=['motorista', 'data_solicitacao', 'id'], name='entrega_motorista_solic_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entrega',
+            index=models.Index(condition=models.Q(('rota__isnull', True)), fields=['status', '-capacidade_necessaria', 'id'], name='entrega_fila_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='motorista',
+            index=models.Index(fields=['nome', 'id'], name='motorista_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='motorista',
+            index=models.Index(fields=['status', 'nome'], name='motorista_status_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rota',
+            index=models.Index(fields=['data_rota', 'id'], name='rota_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rota',
+            index=models.Index(fields=['motorista', 'data_rota', 'id'], name='rota_motorista_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rota',
+            index=models.Index(fields=['status', 'data_rota'], name='rota_status_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='veiculo',
+            index=models.Index(fields=['status', 'placa'], name='veiculo_status_placa_idx'),
+        ),
+    ]
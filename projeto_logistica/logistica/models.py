@@ -1,7 +1,81 @@
-from django.db import models
+import logging
+from decimal import Decimal
+
+from django.db import connection, models, transaction
 from django.contrib.auth.models import User, Group
-from django.db.models.signals import post_save
-from django.dispatch import receiver
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import Signal, receiver
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+# Enviado depois que entregas saem do banco (delete da entrega, do queryset ou
+# em cascata do cliente), com os ids das rotas e os códigos de rastreio delas.
+# Faz o papel de um post_delete de Entrega, que não pode existir: qualquer
+# receiver de delete na entrega impede o Django de apagar em lote as entregas
+# de um cliente e gera consultas por entrega.
+entregas_removidas = Signal()
+
+
+class RastreiaAlteracoes(models.Model):
+    """
+    Guarda os valores dos campos como vieram do banco. save() sem
+    update_fields grava só os campos alterados (e não grava nada, nem dispara
+    signals, se nenhum mudou), então os receivers recebem em update_fields
+    exatamente o que mudou e podem pular o trabalho que não lhes diz respeito.
+    """
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._guardar_valores_originais()
+        return instance
+
+    def _guardar_valores_originais(self, campos=None):
+        """Toma os valores atuais como os do banco (todos ou só os de campos)"""
+        if campos is None or not hasattr(self, '_valores_originais'):
+            nomes = [f.attname for f in self._meta.concrete_fields]
+            self._valores_originais = {}
+        else:
+            nomes = [self._meta.get_field(campo).attname for campo in campos]
+        for nome in nomes:
+            if nome in self.__dict__:
+                self._valores_originais[nome] = self.__dict__[nome]
+
+    def valor_original(self, campo):
+        """Valor do campo no banco; o atual se ele não foi carregado"""
+        originais = getattr(self, '_valores_originais', {})
+        return originais[campo] if campo in originais else self.__dict__.get(campo)
+
+    @property
+    def campos_alterados(self):
+        """attnames alterados desde a leitura; None se a instância ainda não está no banco"""
+        if self._state.adding or not hasattr(self, '_valores_originais'):
+            return None
+        return {
+            campo for campo, valor in self._valores_originais.items()
+            if campo in self.__dict__ and self.__dict__[campo] != valor
+        }
+
+    def save(self, *args, **kwargs):
+        alterados = self.campos_alterados
+        if (alterados is not None and not args and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert') and self._meta.pk.attname not in alterados):
+            if alterados:
+                alterados |= {f.attname for f in self._meta.concrete_fields if getattr(f, 'auto_now', False)}
+            kwargs['update_fields'] = alterados
+        super().save(*args, **kwargs)
+        self._guardar_valores_originais(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._guardar_valores_originais(fields)
 
 
 # CLIENTE ------------------------
@@ -18,12 +92,14 @@ class Cliente(models.Model):
         verbose_name = 'Cliente'
         verbose_name_plural = 'Clientes'
         ordering = ['nome']
+        # Listagem paginada por (nome, id)
+        indexes = [models.Index(fields=['nome', 'id'], name='cliente_nome_idx')]
 
 
 
 # MOTORISTA -----------------------------
 
-class Motorista(models.Model):
+class Motorista(RastreiaAlteracoes):
     STATUS_MOTORISTA = [
         ('ativo', 'Ativo'),
         ('inativo', 'Inativo'),
@@ -120,7 +196,7 @@ class Motorista(models.Model):
             user.groups.add(grupo_motorista)
             user.save()  # Salvar alterações no grupo
 
-            print(f"✅ Usuário {username} criado e adicionado ao grupo Motoristas")
+            logger.info("Usuário %s criado e adicionado ao grupo Motoristas", username)
 
             # Vincular ao motorista e salvar
             self.user = user
@@ -176,7 +252,7 @@ class Motorista(models.Model):
             self.user.save()
             return True
         except Exception as e:
-            print(f"Erro ao adicionar ao grupo: {str(e)}")
+            logger.exception("Erro ao adicionar ao grupo: %s", e)
             return False
 
     def remover_do_grupo_motoristas(self):
@@ -192,7 +268,7 @@ class Motorista(models.Model):
                 return True
             return False
         except Exception as e:
-            print(f"Erro ao remover do grupo: {str(e)}")
+            logger.exception("Erro ao remover do grupo: %s", e)
             return False
 
     def esta_no_grupo_motoristas(self):
@@ -216,7 +292,7 @@ class Motorista(models.Model):
         nova_senha = ''.join(random.choices(string.digits, k=4)) + '@Motorista'
 
         self.user.set_password(nova_senha)
-        self.user.save()
+        self.user.save(update_fields=['password'])
 
         return nova_senha
 
@@ -224,7 +300,7 @@ class Motorista(models.Model):
         """Bloqueia o acesso do motorista"""
         if self.user:
             self.user.is_active = False
-            self.user.save()
+            self.user.save(update_fields=['is_active'])
             return True
         return False
 
@@ -232,7 +308,7 @@ class Motorista(models.Model):
         """Libera o acesso do motorista"""
         if self.user:
             self.user.is_active = True
-            self.user.save()
+            self.user.save(update_fields=['is_active'])
             return True
         return False
 
@@ -240,29 +316,33 @@ class Motorista(models.Model):
         verbose_name = 'Motorista'
         verbose_name_plural = 'Motoristas'
         ordering = ['nome']
+        indexes = [
+            # Listagem paginada por (nome, id) e filtro por status na ordem padrão
+            models.Index(fields=['nome', 'id'], name='motorista_nome_idx'),
+            models.Index(fields=['status', 'nome'], name='motorista_status_nome_idx'),
+        ]
 
 
 # Signal para sincronizar nome quando motorista for atualizado
 @receiver(post_save, sender=Motorista)
-def atualizar_nome_usuario(sender, instance, **kwargs):
-    """Atualiza o nome do usuário quando o nome do motorista é alterado"""
-    if instance.user:
-        # Atualizar primeiro nome
-        instance.user.first_name = instance.nome.split()[0]
-
-        # Atualizar último nome (se houver mais de uma palavra)
-        if len(instance.nome.split()) > 1:
-            instance.user.last_name = ' '.join(instance.nome.split()[1:])
-
-        instance.user.save()
-
-    @receiver(post_save, sender=Motorista)
-    def atualizar_usuario_motorista(sender, instance, **kwargs):
-        if instance.user:
-            # Atualizar nome do usuário se o nome do motorista mudou
-            if instance.user.first_name != instance.nome.split()[0]:
-                instance.user.first_name = instance.nome.split()[0]
-                instance.user.save()
+def atualizar_nome_usuario(sender, instance, update_fields=None, **kwargs):
+    """Atualiza o nome do usuário quando o nome (ou o usuário) do motorista muda"""
+    if update_fields is not None and not update_fields & {'nome', 'user', 'user_id'}:
+        return  # status, telefone etc. não mexem no usuário
+    if not instance.user:
+        return
+
+    partes = instance.nome.split()
+    campos = []
+    if partes and instance.user.first_name != partes[0]:
+        instance.user.first_name = partes[0]
+        campos.append('first_name')
+    # Último nome só muda se houver mais de uma palavra
+    if len(partes) > 1 and instance.user.last_name != ' '.join(partes[1:]):
+        instance.user.last_name = ' '.join(partes[1:])
+        campos.append('last_name')
+    if campos:
+        instance.user.save(update_fields=campos)
 
 
 class PerfilUsuario(models.Model):
@@ -285,13 +365,16 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+def save_user_profile(sender, instance, update_fields=None, **kwargs):
+    # Gravações parciais (login, nome, senha, ativo) não mudam o perfil
+    if update_fields is not None:
+        return
     if hasattr(instance, 'perfil'):
         instance.perfil.save()
 
 # VEÍCULO -----------------------------
 
-class Veiculo(models.Model):
+class Veiculo(RastreiaAlteracoes):
     STATUS_VEICULO = [
         ('disponivel', 'Disponível'),
         ('em_uso', 'Em uso'),
@@ -327,18 +410,35 @@ class Veiculo(models.Model):
         verbose_name = 'Veículo'
         verbose_name_plural = 'Veículos'
         ordering = ['placa']
+        # Veículos disponíveis (e demais filtros por status) na ordem padrão
+        indexes = [models.Index(fields=['status', 'placa'], name='veiculo_status_placa_idx')]
 
 
 
 # ROTA -----------------------------------
 
-class Rota(models.Model):
+class Rota(RastreiaAlteracoes):
     STATUS_ROTA = [
         ('planejada', 'Planejada'),
         ('em_andamento', 'Em andamento'),
         ('concluida', 'Concluída'),
+        ('cancelada', 'Cancelada'),
     ]
 
+    # Motivos de rejeição devolvidos por reservar_entregas
+    MOTIVOS_RESERVA = {
+        'nao_encontrada': 'Entrega não encontrada.',
+        'rota_concluida': 'A rota já foi concluída.',
+        'rota_cancelada': 'A rota foi cancelada.',
+        'ja_nesta_rota': 'A entrega já está nesta rota.',
+        'ja_em_rota': 'A entrega já está em outra rota.',
+        'status_invalido': 'Só entregas pendentes ou remarcadas podem entrar numa rota.',
+        'capacidade_excedida': 'Capacidade do veículo excedida.',
+    }
+
+    # Status das entregas que ainda podem ser carregadas numa rota
+    STATUS_RESERVAVEIS = ('pendente', 'remarcada')
+
     nome = models.CharField(max_length=100)
     descricao = models.TextField(blank=True, null=True)
     motorista = models.ForeignKey(Motorista, on_delete=models.CASCADE, related_name='rotas')
@@ -348,22 +448,153 @@ class Rota(models.Model):
     km_total_estimado = models.IntegerField(default=0)
     tempo_estimado = models.IntegerField(default=0)  # em minutos
 
+    # Totais desnormalizados das entregas da rota (mantidos por Entrega.save e delete)
+    capacidade_utilizada = models.FloatField(default=0, editable=False)
+    valor_total = models.DecimalField(max_digits=12, decimal_places=2, default=0, editable=False)
+    total_entregas = models.PositiveIntegerField(default=0, editable=False)
+
     def capacidade_total_utilizada(self):
-        """Calcula a capacidade total utilizada pelas entregas desta rota"""
-        return sum(e.capacidade_necessaria for e in self.entregas.all())
+        """Retorna a capacidade total utilizada pelas entregas desta rota"""
+        return self.capacidade_utilizada
 
-    def total_entregas(self):
-        """Retorna o total de entregas na rota"""
-        return self.entregas.count()
+    def capacidade_disponivel(self):
+        """Retorna a capacidade ainda livre no veículo da rota"""
+        return self.veiculo.capacidade_maxima - self.capacidade_utilizada
 
     def valor_total_entregas(self):
         """Retorna o valor total das entregas"""
-        return sum(e.valor_frete for e in self.entregas.all())
+        return self.valor_total
 
     def pode_adicionar_entrega(self, entrega):
         """Verifica se é possível adicionar uma entrega sem exceder a capacidade"""
-        capacidade_atual = self.capacidade_total_utilizada()
-        return (capacidade_atual + entrega.capacidade_necessaria) <= self.veiculo.capacidade_maxima
+        return (self.capacidade_utilizada + entrega.capacidade_necessaria) <= self.veiculo.capacidade_maxima
+
+    def recalcular_totais(self):
+        """Recalcula os totais a partir das entregas (usado para reparar divergências)"""
+        recalcular_totais_rotas(Rota.objects.filter(pk=self.pk))
+        self.refresh_from_db(fields=['capacidade_utilizada', 'valor_total', 'total_entregas'])
+
+    def reservar_entrega(self, entrega, mover=False):
+        """Reserva uma única entrega na rota (ver reservar_entregas)"""
+        return self.reservar_entregas([entrega], mover=mover)[0]
+
+    def reservar_entregas(self, entregas, mover=False):
+        """
+        Verifica a capacidade e atribui as entregas à rota de forma atômica.
+
+        Aceita instâncias de Entrega ou IDs. As entregas são avaliadas na ordem
+        recebida e a rota fica bloqueada durante a operação (SELECT ... FOR UPDATE
+        no PostgreSQL; no SQLite a primeira escrita da transação serializa os
+        concorrentes), então dois despachantes nunca ultrapassam a capacidade do
+        veículo. Com mover=True, entregas que estão em outra rota são transferidas.
+
+        Retorna um dict por entrega: entrega_id, codigo_rastreio, reservada,
+        motivo e mensagem (ambos None quando reservada).
+        """
+        instancias = {}
+        ids = []
+        for entrega in entregas:
+            pk = entrega.pk if isinstance(entrega, Entrega) else int(entrega)
+            if isinstance(entrega, Entrega):
+                instancias[pk] = entrega
+            ids.append(pk)
+
+        with transaction.atomic():
+            usa_lock = connection.features.has_select_for_update
+            entregas_qs = Entrega.objects.filter(pk__in=ids).order_by('pk')
+            if usa_lock:
+                entregas_qs = entregas_qs.select_for_update()
+            else:
+                # SQLite: escrita inicial obtém o lock de escrita do banco
+                Rota.objects.filter(pk=self.pk).update(total_entregas=F('total_entregas'))
+            atuais = {
+                e['pk']: e for e in entregas_qs.values('pk', 'codigo_rastreio', 'rota_id', 'status', 'motorista_id',
+                                                        'capacidade_necessaria', 'valor_frete')
+            }
+
+            rotas_envolvidas = {self.pk} | {e['rota_id'] for e in atuais.values() if e['rota_id'] and mover}
+            rotas_qs = Rota.objects.filter(pk__in=rotas_envolvidas).order_by('pk')
+            if usa_lock:
+                rotas_qs = rotas_qs.select_for_update(of=('self',))
+            rotas = {r['pk']: r for r in rotas_qs.values('pk', 'status', 'capacidade_utilizada',
+                                                         'veiculo__capacidade_maxima')}
+            rota = rotas[self.pk]
+            capacidade_livre = rota['veiculo__capacidade_maxima'] - rota['capacidade_utilizada']
+
+            resultados = []
+            aceitas = []
+            aceitas_ids = set()
+            for pk in ids:
+                atual = atuais.get(pk)
+                resultado = {
+                    'entrega_id': pk,
+                    'codigo_rastreio': atual['codigo_rastreio'] if atual else None,
+                    'reservada': False,
+                    'motivo': None,
+                    'mensagem': None,
+                }
+                resultados.append(resultado)
+
+                if atual is None:
+                    resultado['motivo'] = 'nao_encontrada'
+                elif rota['status'] == 'concluida':
+                    resultado['motivo'] = 'rota_concluida'
+                elif rota['status'] == 'cancelada':
+                    resultado['motivo'] = 'rota_cancelada'
+                elif atual['rota_id'] == self.pk or pk in aceitas_ids:
+                    resultado['motivo'] = 'ja_nesta_rota'
+                elif atual['status'] not in self.STATUS_RESERVAVEIS:
+                    resultado['motivo'] = 'status_invalido'
+                elif atual['rota_id'] is not None and not mover:
+                    resultado['motivo'] = 'ja_em_rota'
+                elif atual['capacidade_necessaria'] > capacidade_livre:
+                    resultado['motivo'] = 'capacidade_excedida'
+                else:
+                    capacidade_livre -= atual['capacidade_necessaria']
+                    resultado['reservada'] = True
+                    aceitas.append(atual)
+                    aceitas_ids.add(pk)
+
+                if resultado['motivo']:
+                    resultado['mensagem'] = self.MOTIVOS_RESERVA[resultado['motivo']]
+
+            if aceitas:
+                self._aplicar_reservas(aceitas)
+
+        for atual in aceitas:
+            instancia = instancias.get(atual['pk'])
+            if instancia is not None:
+                instancia.rota = self
+                instancia._guardar_valores_originais()
+
+        if aceitas:
+            self.refresh_from_db(fields=['capacidade_utilizada', 'valor_total', 'total_entregas'])
+        return resultados
+
+    def _aplicar_reservas(self, aceitas):
+        """Grava as entregas aceitas e ajusta os totais das rotas de origem e destino"""
+        from .estatisticas import invalidar_estatisticas
+        from .eventos import registrar_eventos
+
+        Entrega.objects.filter(pk__in=[a['pk'] for a in aceitas]).update(rota=self)
+        registrar_eventos((a['pk'], a['status'], self.pk, a['motorista_id']) for a in aceitas)
+
+        por_rota = {}
+        for atual in aceitas:
+            if atual['rota_id'] is not None:
+                por_rota.setdefault(atual['rota_id'], []).append(atual)
+        por_rota[self.pk] = aceitas
+
+        for rota_id, grupo in sorted(por_rota.items()):
+            sinal = 1 if rota_id == self.pk else -1
+            Rota.objects.filter(pk=rota_id).update(
+                capacidade_utilizada=F('capacidade_utilizada') + sinal * sum(
+                    a['capacidade_necessaria'] for a in grupo),
+                valor_total=F('valor_total') + sinal * sum(a['valor_frete'] for a in grupo),
+                total_entregas=F('total_entregas') + sinal * len(grupo),
+            )
+
+        transaction.on_commit(invalidar_estatisticas)
 
     def __str__(self):
         return self.nome
@@ -372,12 +603,57 @@ class Rota(models.Model):
         verbose_name = 'Rota'
         verbose_name_plural = 'Rotas'
         ordering = ['-data_rota']
+        # Listagens por (-data_rota, -id): o índice crescente é lido de trás para frente.
+        # (data_rota, id) também atende o carregamento (data_rota = X, por id).
+        indexes = [
+            models.Index(fields=['data_rota', 'id'], name='rota_data_idx'),
+            models.Index(fields=['motorista', 'data_rota', 'id'], name='rota_motorista_data_idx'),
+            models.Index(fields=['status', 'data_rota'], name='rota_status_data_idx'),
+        ]
+
+
+
+# CEP ----------------------------------------
+
+class CepCoordenada(models.Model):
+    """Coordenadas de um CEP, carregadas de arquivo local (comando carregar_ceps)"""
+    # CEP como inteiro (01310-100 -> 1310100): chave primária compacta e indexada
+    cep = models.PositiveIntegerField(primary_key=True)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+
+    def __str__(self):
+        cep = f'{self.cep:08d}'
+        return f'{cep[:5]}-{cep[5:]}'
+
+    class Meta:
+        verbose_name = 'Coordenada de CEP'
+        verbose_name_plural = 'Coordenadas de CEP'
 
 
 
 # ENTREGA ----------------------------------------
 
-class Entrega(models.Model):
+# Coordenadas preenchidas pela geocodificação a partir de cada CEP
+COORDENADAS_POR_CEP = {
+    'cep_origem': ('latitude_origem', 'longitude_origem'),
+    'cep_destino': ('latitude_destino', 'longitude_destino'),
+}
+
+
+class EntregaQuerySet(models.QuerySet):
+    def delete(self):
+        """Apaga em lote e recalcula de uma vez os totais das rotas afetadas"""
+        with transaction.atomic():
+            removidas = list(self.values_list('rota_id', 'codigo_rastreio'))
+            resultado = super().delete()
+            remover_entregas_dos_totais(removidas)
+        return resultado
+
+    delete.queryset_only = True
+
+
+class Entrega(RastreiaAlteracoes):
     STATUS_ENTREGA = [
         ('pendente', 'Pendente'),
         ('em_transito', 'Em trânsito'),
@@ -408,6 +684,13 @@ class Entrega(models.Model):
     # Observações
     obs = models.TextField(blank=True, null=True)
 
+    # Coordenadas dos CEPs (preenchidas pelo geocodificador) e ordem de visita na rota
+    latitude_origem = models.FloatField(null=True, blank=True, editable=False)
+    longitude_origem = models.FloatField(null=True, blank=True, editable=False)
+    latitude_destino = models.FloatField(null=True, blank=True, editable=False)
+    longitude_destino = models.FloatField(null=True, blank=True, editable=False)
+    ordem_parada = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
     # SOLUÇÃO 1: Mantemos a relação opcional direta com Motorista
     motorista = models.ForeignKey(
         Motorista,
@@ -427,9 +710,77 @@ class Entrega(models.Model):
         verbose_name='Rota'
     )
 
+    objects = EntregaQuerySet.as_manager()
+
     def __str__(self):
         return f"Entrega {self.codigo_rastreio}"
 
+    def delete(self, *args, **kwargs):
+        removida = (self.valor_original('rota_id'), self.valor_original('codigo_rastreio'))
+        with transaction.atomic():
+            resultado = super().delete(*args, **kwargs)
+            remover_entregas_dos_totais([removida])
+        return resultado
+
+    def _valores_na_rota(self):
+        """Rota, peso e valor como estão no banco (nada, se a entrega é nova)"""
+        if self._state.adding:
+            return None, 0, 0
+        return (self.valor_original('rota_id'), self.valor_original('capacidade_necessaria') or 0,
+                self.valor_original('valor_frete') or 0)
+
+    def descartar_coordenadas_antigas(self):
+        """
+        Zera as coordenadas do CEP de origem/destino que mudou desde a leitura,
+        para o geocodificar_entregas refazê-las. Retorna os campos zerados.
+        """
+        zerados = []
+        if self._state.adding:
+            return zerados
+        for cep, coordenadas in COORDENADAS_POR_CEP.items():
+            if getattr(self, cep) != self.valor_original(cep):
+                for campo in coordenadas:
+                    setattr(self, campo, None)
+                zerados.extend(coordenadas)
+        return zerados
+
+    def save(self, *args, **kwargs):
+        zerados = self.descartar_coordenadas_antigas()
+        if zerados and kwargs.get('update_fields') is not None:
+            kwargs['update_fields'] = {*kwargs['update_fields'], *zerados}
+        anteriores = self._valores_na_rota()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._atualizar_totais_rota(*anteriores)
+
+    def _atualizar_totais_rota(self, rota_anterior, capacidade_anterior, valor_anterior):
+        """Aplica na(s) rota(s) afetada(s) a diferença de capacidade, valor e contagem"""
+        capacidade_anterior = float(capacidade_anterior)
+        valor_anterior = Decimal(str(valor_anterior))
+        capacidade = float(self.capacidade_necessaria or 0)
+        valor = Decimal(str(self.valor_frete or 0))
+
+        if rota_anterior == self.rota_id:
+            if self.rota_id and (capacidade != capacidade_anterior or valor != valor_anterior):
+                Rota.objects.filter(pk=self.rota_id).update(
+                    capacidade_utilizada=F('capacidade_utilizada') + (capacidade - capacidade_anterior),
+                    valor_total=F('valor_total') + (valor - valor_anterior),
+                )
+            return
+
+        if rota_anterior:
+            Rota.objects.filter(pk=rota_anterior).update(
+                capacidade_utilizada=F('capacidade_utilizada') - capacidade_anterior,
+                valor_total=F('valor_total') - valor_anterior,
+                total_entregas=F('total_entregas') - 1,
+            )
+        if self.rota_id:
+            Rota.objects.filter(pk=self.rota_id).update(
+                capacidade_utilizada=F('capacidade_utilizada') + capacidade,
+                valor_total=F('valor_total') + valor,
+                total_entregas=F('total_entregas') + 1,
+            )
+
     def pode_ser_adicionada_na_rota(self, rota):
         """Verifica se a entrega pode ser adicionada em uma rota"""
         if self.rota is not None:
@@ -440,6 +791,136 @@ class Entrega(models.Model):
         verbose_name = 'Entrega'
         verbose_name_plural = 'Entregas'
         ordering = ['-data_solicitacao']
+        indexes = [
+            # Listagens por (-data_solicitacao, -id): todas, por status e as do motorista
+            models.Index(fields=['data_solicitacao', 'id'], name='entrega_solicitacao_idx'),
+            models.Index(fields=['status', 'data_solicitacao', 'id'], name='entrega_status_solic_idx'),
+            models.Index(fields=['motorista', 'data_solicitacao', 'id'], name='entrega_motorista_solic_idx'),
+            # Fila de entregas pendentes sem rota (carregamento e gerenciar rota): parcial,
+            # só com as entregas sem rota, na ordem do carregamento. O status fica como
+            # coluna e não na condição porque o SQLite não casa a condição com status = ?
+            models.Index(fields=['status', '-capacidade_necessaria', 'id'], name='entrega_fila_idx',
+                         condition=models.Q(rota__isnull=True)),
+        ]
+
+
+def remover_entregas_dos_totais(removidas):
+    """
+    (rota_id, codigo_rastreio) das entregas já apagadas: recalcula as rotas
+    afetadas num único UPDATE e envia entregas_removidas. Roda na transação do delete.
+    """
+    if not removidas:
+        return
+    rota_ids = {rota_id for rota_id, _ in removidas if rota_id}
+    if rota_ids:
+        recalcular_totais_rotas(Rota.objects.filter(pk__in=rota_ids))
+    entregas_removidas.send(sender=Entrega, rota_ids=rota_ids, codigos=[codigo for _, codigo in removidas])
+
+
+@receiver(pre_delete, sender=Cliente)
+def guardar_entregas_do_cliente(sender, instance, **kwargs):
+    """As entregas saem em cascata (em lote, sem signals); guarda antes o que o post_delete precisa"""
+    instance._entregas_removidas = list(instance.entregas.values_list('rota_id', 'codigo_rastreio'))
+
+
+@receiver(post_delete, sender=Cliente)
+def remover_entregas_do_cliente_dos_totais(sender, instance, **kwargs):
+    remover_entregas_dos_totais(getattr(instance, '_entregas_removidas', []))
+
+
+class EntregaEvento(models.Model):
+    """
+    Linha do tempo da entrega, só de inserção: cada mudança de status, rota ou
+    motorista grava o estado resultante. Rota e motorista não têm constraint
+    nem ON DELETE, para que remover uma rota ou um motorista não reescreva o
+    histórico (o id fica, mesmo sem o registro).
+    """
+
+    entrega = models.ForeignKey(Entrega, on_delete=models.CASCADE, related_name='eventos')
+    momento = models.DateTimeField(default=timezone.now)
+    status = models.CharField(max_length=20, choices=Entrega.STATUS_ENTREGA)
+    rota = models.ForeignKey(Rota, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True,
+                             related_name='+')
+    motorista = models.ForeignKey(Motorista, on_delete=models.DO_NOTHING, db_constraint=False, null=True,
+                                  blank=True, related_name='+')
+
+    def __str__(self):
+        return f"{self.entrega_id} {self.status} em {self.momento:%d/%m/%Y %H:%M}"
+
+    class Meta:
+        verbose_name = 'Evento da entrega'
+        verbose_name_plural = 'Eventos das entregas'
+        ordering = ['momento', 'id']
+        indexes = [models.Index(fields=['entrega', 'momento'], name='evento_entrega_momento_idx')]
+
+
+class IndicadorDiario(models.Model):
+    """
+    Agregado diário de um motorista, veículo ou cliente (ver indicadores.py):
+    entregas que entraram em cada status no dia, peso e frete entregues e as
+    rotas concluídas com seus km (pela data da rota).
+    """
+    DIMENSOES = [
+        ('motorista', 'Motorista'),
+        ('veiculo', 'Veículo'),
+        ('cliente', 'Cliente'),
+    ]
+
+    dimensao = models.CharField(max_length=10, choices=DIMENSOES)
+    referencia_id = models.PositiveBigIntegerField()
+    dia = models.DateField()
+
+    pendentes = models.PositiveIntegerField(default=0)
+    em_transito = models.PositiveIntegerField(default=0)
+    entregues = models.PositiveIntegerField(default=0)
+    canceladas = models.PositiveIntegerField(default=0)
+    remarcadas = models.PositiveIntegerField(default=0)
+    kg_entregues = models.FloatField(default=0)
+    valor_entregue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    rotas_concluidas = models.PositiveIntegerField(default=0)
+    km = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.dimensao} {self.referencia_id} em {self.dia:%d/%m/%Y}"
+
+    class Meta:
+        verbose_name = 'Indicador diário'
+        verbose_name_plural = 'Indicadores diários'
+        ordering = ['dia']
+        constraints = [
+            models.UniqueConstraint(fields=['dimensao', 'referencia_id', 'dia'], name='indicador_dimensao_dia_unico'),
+        ]
+
+
+class MarcoIndicadores(models.Model):
+    """Linha única: último EntregaEvento já somado nos indicadores diários"""
+    ultimo_evento = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Marco dos indicadores'
+
+
+def recalcular_totais_rotas(rotas=None):
+    """Recalcula em um único UPDATE os totais desnormalizados das rotas informadas"""
+    if rotas is None:
+        rotas = Rota.objects.all()
+
+    entregas = Entrega.objects.filter(rota=OuterRef('pk')).order_by().values('rota')
+    return rotas.update(
+        capacidade_utilizada=Coalesce(
+            Subquery(entregas.annotate(soma=Sum('capacidade_necessaria')).values('soma')),
+            Value(0.0),
+        ),
+        valor_total=Coalesce(
+            Subquery(entregas.annotate(soma=Sum('valor_frete')).values('soma')),
+            Value(Decimal('0')),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        ),
+        total_entregas=Coalesce(
+            Subquery(entregas.annotate(qtd=Count('id')).values('qtd')),
+            Value(0),
+        ),
+    )
 
 
 @receiver(post_save, sender=User)
@@ -455,7 +936,7 @@ def configurar_perfil_motorista(sender, instance, created, **kwargs):
             perfil.motorista = motorista
             perfil.tipo_usuario = 'motorista'
             perfil.save()
-            print(f"✅ Perfil configurado para motorista {motorista.nome}")
+            logger.info("Perfil configurado para motorista %s", motorista.nome)
         except Motorista.DoesNotExist:
             # Se não for motorista, definir como cliente
             perfil.tipo_usuario = 'cliente'
@@ -0,0 +1,160 @@
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+TAMANHO_PAGINA = 50
+
+
+class PaginaKeyset:
+    """Uma página da listagem com os cursores para a próxima e a anterior"""
+
+    def __init__(self, itens, proximo=None, anterior=None, querystring=''):
+        self.itens = itens
+        self.proximo = proximo
+        self.anterior = anterior
+        self.querystring = querystring
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+    @property
+    def tem_outras_paginas(self):
+        return bool(self.proximo or self.anterior)
+
+
+def _campos(ordenacao):
+    """('-data_solicitacao', 'id') -> [('data_solicitacao', True), ('id', False)]"""
+    return [(campo.lstrip('-'), campo.startswith('-')) for campo in ordenacao]
+
+
+def _codificar(valores, direcao):
+    dados = json.dumps({'v': valores, 'd': direcao}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(dados.encode()).decode().rstrip('=')
+
+
+def _decodificar(cursor, model, campos):
+    """Retorna (valores, direcao) ou None se o cursor for inválido"""
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        valores, direcao = dados['v'], dados['d']
+        if direcao not in ('p', 'a') or len(valores) != len(campos):
+            return None
+        return [model._meta.get_field(nome).to_python(valor)
+                for (nome, _), valor in zip(campos, valores)], direcao
+    except (ValueError, TypeError, KeyError, AttributeError):
+        return None
+
+
+def _valores(obj, campos):
+    return [obj._meta.get_field(nome).value_to_string(obj) for nome, _ in campos]
+
+
+def _filtro_apos(campos, valores, para_tras):
+    """
+    Condição "vem depois do cursor" na ordenação informada:
+    (a > x) OR (a = x AND b > y) ..., com < nos campos decrescentes.
+    """
+    condicao = Q()
+    for i, (nome, decrescente) in enumerate(campos):
+        operador = 'lt' if decrescente != para_tras else 'gt'
+        termo = Q(**{f'{nome}__{operador}': valores[i]})
+        for nome_anterior, valor_anterior in zip((c[0] for c in campos[:i]), valores[:i]):
+            termo &= Q(**{nome_anterior: valor_anterior})
+        condicao |= termo
+    return condicao
+
+
+def paginar_keyset(request, queryset, ordenacao, tamanho=TAMANHO_PAGINA):
+    """
+    Pagina o queryset por cursor (keyset) em vez de OFFSET.
+
+    ordenacao deve terminar em um campo único (normalmente 'id') para que a
+    posição seja sempre determinada. O cursor vem em ?cursor= e os demais
+    parâmetros da URL (filtros) são preservados nos links. Cada página custa
+    uma única consulta, independente de quantas páginas vêm antes.
+    """
+    campos = _campos(ordenacao)
+    decodificado = _decodificar(request.GET.get('cursor', ''), queryset.model, campos)
+
+    para_tras = False
+    if decodificado:
+        valores, direcao = decodificado
+        para_tras = direcao == 'a'
+        queryset = queryset.filter(_filtro_apos(campos, valores, para_tras))
+
+    if para_tras:
+        ordem = [nome if decrescente else f'-{nome}' for nome, decrescente in campos]
+    else:
+        ordem = list(ordenacao)
+    itens = list(queryset.order_by(*ordem)[:tamanho + 1])
+
+    ha_mais = len(itens) > tamanho
+    itens = itens[:tamanho]
+    if para_tras:
+        itens.reverse()
+
+    # Indo para frente, existe página anterior se viemos de um cursor;
+    # voltando, sempre existe a próxima (é a página de onde viemos)
+    tem_proxima = para_tras or ha_mais
+    tem_anterior = ha_mais if para_tras else decodificado is not None
+    proximo = anterior = None
+    if itens and tem_proxima:
+        proximo = _codificar(_valores(itens[-1], campos), 'p')
+    if itens and tem_anterior:
+        anterior = _codificar(_valores(itens[0], campos), 'a')
+
+    parametros = request.GET.copy()
+    parametros.pop('cursor', None)
+    return PaginaKeyset(itens, proximo, anterior, parametros.urlencode())
+
+
+class PaginacaoCursorApi(CursorPagination):
+    """
+    Paginação por cursor da API com o mesmo keyset das listagens HTML
+    (paginar_keyset). O CursorPagination do DRF posiciona o cursor só pelo
+    primeiro campo da ordem e, quando ele se repete (várias entregas na mesma
+    data), pula as linhas iguais com OFFSET; aqui o cursor leva todos os
+    campos e cada página é uma consulta por chave.
+
+    A ordem vem do atributo ordering de cada viewset (ou de ?ordering=); se
+    ela não terminar no id, o id entra como desempate.
+    """
+    page_size = TAMANHO_PAGINA
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    ordering = ('-id',)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        pk = queryset.model._meta.pk.name
+        ordenacao = [campo.replace('pk', pk) if campo.lstrip('-') == 'pk' else campo
+                     for campo in self.get_ordering(request, queryset, view)]
+        if ordenacao[-1].lstrip('-') != pk:
+            ordenacao.append(f'-{pk}' if ordenacao[-1].startswith('-') else pk)
+
+        self.pagina = paginar_keyset(request, queryset, ordenacao, tamanho=self.page_size)
+        self.has_next = self.pagina.proximo is not None
+        self.has_previous = self.pagina.anterior is not None
+        return self.pagina.itens
+
+    def _link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        return self._link(self.pagina.proximo)
+
+    def get_previous_link(self):
+        return self._link(self.pagina.anterior)
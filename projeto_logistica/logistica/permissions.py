@@ -1,6 +1,6 @@
 from django.contrib.auth.decorators import user_passes_test
 from rest_framework.permissions import BasePermission, SAFE_METHODS
-from .models import Motorista
+from .identidade import obter_identidade
 
 
 def is_admin(user):
@@ -13,20 +13,7 @@ def is_motorista(user):
     if not user.is_authenticated:
         return False
 
-    # Verificar de múltiplas formas
-    if hasattr(user, 'motorista_profile') and user.motorista_profile is not None:
-        return True
-
-    try:
-        Motorista.objects.get(user=user)
-        return True
-    except Motorista.DoesNotExist:
-        pass
-
-    if hasattr(user, 'perfil') and user.perfil.motorista is not None:
-        return True
-
-    return False
+    return obter_identidade(user).is_motorista
 
 
 def is_admin_or_motorista(user):
@@ -124,21 +111,13 @@ def get_motorista_from_user(user):
     if not user.is_authenticated:
         return None
 
-    # Primeiro tenta pelo related_name
-    if hasattr(user, 'motorista_profile') and user.motorista_profile:
-        return user.motorista_profile
-
-    # Tenta pelo banco
-    try:
-        return Motorista.objects.get(user=user)
-    except Motorista.DoesNotExist:
-        pass
+    # Motorista do próprio usuário ou vinculado ao perfil, resolvido uma vez por requisição
+    return obter_identidade(user).motorista
 
-    # Tenta pelo perfil
-    if hasattr(user, 'perfil') and user.perfil.motorista:
-        return user.perfil.motorista
 
-    return None
+def pertence_ao_grupo(user, nome_grupo):
+    """Verifica se o usuário está no grupo (sem consultar o banco de novo)"""
+    return user.is_authenticated and obter_identidade(user).tem_grupo(nome_grupo)
 
 
 # Funções de verificação de permissão para objetos específicos
@@ -250,14 +229,11 @@ def user_is_admin_or_motorista(user):
 
 class IsAdmin(BasePermission):
     def has_permission(self, request, view=None):
-        return (
-            request.user.is_authenticated and
-            request.user.groups.filter(name='Administradores').exists()
-        )
+        return pertence_ao_grupo(request.user, 'Administradores')
 
 
 class ReadOnlyOrAdmin(BasePermission):
     def has_permission(self, request, view=None):
         if request.method in ['GET', 'HEAD', 'OPTIONS']:
             return request.user.is_authenticated
-        return request.user.groups.filter(name='Administradores').exists()
+        return pertence_ao_grupo(request.user, 'Administradores')
@@ -0,0 +1,121 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .eventos import historico_status
+from .limites import CACHES_COMPARTILHADOS
+from .models import Entrega, entregas_removidas
+
+
+# Rastreamento público com cache de leitura: cada código tem um snapshot com
+# os campos públicos da entrega, o ETag e o instante em que foi montado. Com o
+# cache quente a consulta não toca no banco. Códigos inexistentes também são
+# guardados (cache negativo), por menos tempo, para que varreduras de códigos
+# não caiam no banco a cada tentativa. O snapshot leva também o histórico de
+# status (EntregaEvento), então a linha do tempo sai do cache junto.
+#
+# A invalidação só alcança o cache de quem salvou a entrega. Com o cache
+# default por processo (LocMemCache), os outros workers continuariam servindo
+# o status e o ETag antigos; nesse caso o snapshot dura só RASTREIO_MAX_AGE,
+# o mesmo atraso que a resposta pública já admite. O TTL longo vale apenas
+# com um cache compartilhado (redis/memcached) em CACHES['default'].
+
+RASTREIO_TIMEOUT = 3600
+RASTREIO_NEGATIVO_TIMEOUT = 60
+
+# max-age das respostas públicas (navegadores e CDN revalidam com o ETag)
+RASTREIO_MAX_AGE = 30
+
+# Versão de todos os snapshots; alterações em lote (update/bulk_create não
+# disparam signals) incrementam a versão em vez de apagar código por código
+CHAVE_VERSAO = 'logistica:rastreio:versao'
+
+CAMPOS_PUBLICOS = ('codigo_rastreio', 'status', 'endereco_origem', 'endereco_destino', 'data_solicitacao',
+                   'data_entrega_prevista', 'data_entrega_real', 'obs')
+
+NAO_ENCONTRADA = {'encontrada': False}
+
+
+def _versao():
+    versao = cache.get(CHAVE_VERSAO)
+    if versao is None:
+        versao = 1
+        cache.add(CHAVE_VERSAO, versao, None)
+    return versao
+
+
+def _chave(codigo, versao=None):
+    # Códigos vêm da URL: o hash mantém a chave curta e válida para o memcached
+    return f'logistica:rastreio:v{versao or _versao()}:{hashlib.sha1(codigo.encode()).hexdigest()}'
+
+
+def _timeouts():
+    """(snapshot, negativo) conforme o cache default seja visto por todos os processos"""
+    if settings.CACHES.get('default', {}).get('BACKEND') in CACHES_COMPARTILHADOS:
+        return RASTREIO_TIMEOUT, RASTREIO_NEGATIVO_TIMEOUT
+    return RASTREIO_MAX_AGE, min(RASTREIO_NEGATIVO_TIMEOUT, RASTREIO_MAX_AGE)
+
+
+def _snapshot(entrega):
+    dados = {campo: getattr(entrega, campo) for campo in CAMPOS_PUBLICOS}
+    dados['status_display'] = entrega.get_status_display()
+    dados['historico'] = historico_status(entrega)
+    corpo = json.dumps(dados, sort_keys=True, default=str).encode()
+    return {
+        'encontrada': True,
+        'dados': dados,
+        'etag': f'"{hashlib.md5(corpo).hexdigest()}"',
+        'atualizado_em': timezone.now().replace(microsecond=0),
+    }
+
+
+def obter_rastreio(codigo):
+    """
+    Snapshot do código: {'encontrada': True, 'dados', 'etag', 'atualizado_em'}
+    ou NAO_ENCONTRADA. Lê do cache e, na falta, monta a partir do banco.
+    """
+    chave = _chave(codigo)
+    snapshot = cache.get(chave)
+    if snapshot is not None:
+        return snapshot
+
+    timeout, timeout_negativo = _timeouts()
+    entrega = Entrega.objects.only(*CAMPOS_PUBLICOS).filter(codigo_rastreio=codigo).first()
+    if entrega is None:
+        cache.set(chave, NAO_ENCONTRADA, timeout_negativo)
+        return NAO_ENCONTRADA
+    snapshot = _snapshot(entrega)
+    cache.set(chave, snapshot, timeout)
+    return snapshot
+
+
+def invalidar_rastreio(*codigos):
+    """Descarta o snapshot (inclusive o negativo) dos códigos informados"""
+    versao = _versao()
+    cache.delete_many([_chave(codigo, versao) for codigo in codigos if codigo])
+
+
+def invalidar_rastreios():
+    """Invalida todos os snapshots (após update/bulk_create de entregas)"""
+    try:
+        cache.incr(CHAVE_VERSAO)
+    except ValueError:
+        cache.set(CHAVE_VERSAO, 2, None)
+
+
+@receiver(post_save, sender=Entrega)
+def invalidar_rastreio_ao_salvar(sender, instance, created, update_fields=None, **kwargs):
+    """Status, datas ou endereços mudaram (ou o código passou a existir)"""
+    if update_fields is not None and not update_fields & set(CAMPOS_PUBLICOS):
+        return  # rota, coordenadas, ordem de parada não aparecem no rastreio
+    invalidar_rastreio(instance.codigo_rastreio, instance.valor_original('codigo_rastreio'))
+
+
+@receiver(entregas_removidas)
+def invalidar_rastreio_ao_remover(sender, codigos, **kwargs):
+    invalidar_rastreio(*codigos)
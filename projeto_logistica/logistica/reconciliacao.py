@@ -0,0 +1,52 @@
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+
+from .identidade import invalidar_identidades
+from .lotes import TAMANHO_BATCH
+from .models import Motorista
+
+
+GRUPO_MOTORISTAS = 'Motoristas'
+
+
+def reconciliar_grupo_motoristas(simular=False):
+    """
+    Coloca no grupo Motoristas todo usuário vinculado a um motorista.
+
+    As associações que faltam saem de um único anti-join (motoristas com
+    usuário sem linha em auth_user_groups) e entram com um bulk_create na
+    tabela intermediária, então o custo não cresce com a frota. Com
+    simular=True só calcula. Retorna um relatório com o que mudou.
+    """
+    with transaction.atomic():
+        if simular:
+            grupo = Group.objects.filter(name=GRUPO_MOTORISTAS).first()
+            grupo_criado = grupo is None
+        else:
+            grupo, grupo_criado = Group.objects.get_or_create(name=GRUPO_MOTORISTAS)
+
+        grupo_id = grupo.id if grupo else None
+        no_grupo = User.groups.through.objects.filter(group_id=grupo_id, user_id=OuterRef('user_id'))
+        motoristas = Motorista.objects.filter(user__isnull=False).annotate(no_grupo=Exists(no_grupo))
+        faltando = list(motoristas.filter(no_grupo=False).values_list('user_id', 'user__username'))
+        total = motoristas.aggregate(com_usuario=Count('id'), ja_no_grupo=Count('id', filter=Q(no_grupo=True)))
+
+        if faltando and not simular:
+            User.groups.through.objects.bulk_create(
+                [User.groups.through(user_id=user_id, group_id=grupo_id) for user_id, _ in faltando],
+                batch_size=TAMANHO_BATCH, ignore_conflicts=True,
+            )
+            # bulk_create não dispara m2m_changed
+            transaction.on_commit(invalidar_identidades)
+
+        total_no_grupo = User.groups.through.objects.filter(group_id=grupo_id).count() if grupo_id else 0
+
+    return {
+        'grupo_criado': grupo_criado,
+        'com_usuario': total['com_usuario'],
+        'ja_no_grupo': total['ja_no_grupo'],
+        'adicionados': [username for _, username in faltando],
+        'total_no_grupo': total_no_grupo,
+        'simulado': simular,
+    }
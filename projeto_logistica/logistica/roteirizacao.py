@@ -0,0 +1,203 @@
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection, transaction
+
+from .geocodificacao import geocodificar_entregas
+from .models import Entrega, Rota
+
+
+logger = logging.getLogger(__name__)
+
+# Parâmetros de estimativa
+FATOR_CIRCUITO = 1.3          # distância por estrada / distância em linha reta
+VELOCIDADE_MEDIA_KMH = 40.0
+TEMPO_POR_PARADA_MIN = 10
+TEMPO_LIMITE_PADRAO = 2.0     # segundos de otimização por rota
+RAIO_TERRA_KM = 6371.0
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='roteirizacao')
+_pendentes = set()
+_pendentes_lock = threading.Lock()
+
+
+def distancia_km(lat1, lon1, lat2, lon2):
+    """Distância estimada por estrada (haversine x fator de circuito)"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * RAIO_TERRA_KM * math.asin(math.sqrt(a)) * FATOR_CIRCUITO
+
+
+def matriz_distancias(pontos):
+    """Matriz simétrica de distâncias entre os pontos (lat, lon)"""
+    n = len(pontos)
+    matriz = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(i + 1, n):
+            d = distancia_km(*pontos[i], *pontos[j])
+            matriz[i][j] = matriz[j][i] = d
+    return matriz
+
+
+def custo_rota(tour, dist):
+    """Custo do circuito fechado (volta ao ponto 0)"""
+    return sum(dist[tour[i - 1]][tour[i]] for i in range(1, len(tour))) + dist[tour[-1]][tour[0]]
+
+
+def vizinho_mais_proximo(dist):
+    """Circuito inicial partindo do ponto 0 (depósito)"""
+    n = len(dist)
+    tour = [0]
+    restantes = set(range(1, n))
+    while restantes:
+        atual = tour[-1]
+        proximo = min(restantes, key=lambda j: dist[atual][j])
+        tour.append(proximo)
+        restantes.remove(proximo)
+    return tour
+
+
+def dois_opt(tour, dist, prazo):
+    """Inverte trechos enquanto houver ganho e tempo (o depósito fica fixo na posição 0)"""
+    n = len(tour)
+    melhorou = True
+    while melhorou and time.monotonic() < prazo:
+        melhorou = False
+        for i in range(1, n - 1):
+            if time.monotonic() >= prazo:
+                break
+            a, b = tour[i - 1], tour[i]
+            for j in range(i + 1, n):
+                c, d = tour[j], tour[(j + 1) % n]
+                delta = dist[a][c] + dist[b][d] - dist[a][b] - dist[c][d]
+                if delta < -1e-9:
+                    tour[i:j + 1] = reversed(tour[i:j + 1])
+                    a, b = tour[i - 1], tour[i]
+                    melhorou = True
+    return tour
+
+
+def or_opt(tour, dist, prazo):
+    """Move segmentos de 1 a 3 paradas para a melhor posição enquanto houver ganho e tempo"""
+    n = len(tour)
+    melhorou = True
+    while melhorou and time.monotonic() < prazo:
+        melhorou = False
+        for tamanho in (1, 2, 3):
+            for i in range(1, n - tamanho + 1):
+                if time.monotonic() >= prazo:
+                    return tour
+                j = i + tamanho - 1
+                anterior, primeiro, ultimo, seguinte = tour[i - 1], tour[i], tour[j], tour[(j + 1) % n]
+                ganho_remocao = (dist[anterior][primeiro] + dist[ultimo][seguinte]
+                                 - dist[anterior][seguinte])
+                segmento = tour[i:j + 1]
+                resto = tour[:i] + tour[j + 1:]
+                melhor_delta, melhor_pos = 0.0, None
+                for k in range(len(resto)):
+                    p, q = resto[k], resto[(k + 1) % len(resto)]
+                    custo_insercao = dist[p][primeiro] + dist[ultimo][q] - dist[p][q]
+                    delta = custo_insercao - ganho_remocao
+                    if delta < melhor_delta - 1e-9:
+                        melhor_delta, melhor_pos = delta, k + 1
+                if melhor_pos is not None:
+                    tour[:] = resto[:melhor_pos] + segmento + resto[melhor_pos:]
+                    melhorou = True
+    return tour
+
+
+def otimizar_rota(rota_id, tempo_limite=TEMPO_LIMITE_PADRAO):
+    """
+    Ordena as paradas da rota e grava ordem_parada, km_total_estimado e tempo_estimado.
+
+    O depósito é a origem da primeira entrega com coordenadas. Parte do vizinho
+    mais próximo e melhora com 2-opt e Or-opt até acabar o tempo_limite.
+    Entregas ainda sem coordenadas são geocodificadas pelo CEP antes; as que
+    continuarem sem (CEP fora da tabela) ficam no fim, na ordem atual.
+    """
+    inicio = time.monotonic()
+    prazo = inicio + tempo_limite
+
+    geocodificar_entregas(Entrega.objects.filter(rota_id=rota_id))
+
+    entregas = list(
+        Entrega.objects.filter(rota_id=rota_id)
+        .order_by('ordem_parada', 'id')
+        .values('id', 'latitude_origem', 'longitude_origem', 'latitude_destino', 'longitude_destino')
+    )
+    com_coordenadas, sem_coordenadas = [], []
+    for entrega in entregas:
+        if entrega['latitude_destino'] is not None and entrega['longitude_destino'] is not None:
+            com_coordenadas.append(entrega)
+        else:
+            sem_coordenadas.append(entrega)
+
+    deposito = next(
+        ((e['latitude_origem'], e['longitude_origem']) for e in com_coordenadas
+         if e['latitude_origem'] is not None and e['longitude_origem'] is not None),
+        None,
+    )
+    if deposito is None and com_coordenadas:
+        deposito = (com_coordenadas[0]['latitude_destino'], com_coordenadas[0]['longitude_destino'])
+
+    km = 0.0
+    ordenadas = []
+    if com_coordenadas:
+        pontos = [deposito] + [(e['latitude_destino'], e['longitude_destino']) for e in com_coordenadas]
+        dist = matriz_distancias(pontos)
+        tour = vizinho_mais_proximo(dist)
+        if len(tour) > 3:
+            dois_opt(tour, dist, prazo)
+            or_opt(tour, dist, prazo)
+        km = custo_rota(tour, dist)
+        ordenadas = [com_coordenadas[i - 1] for i in tour[1:]]
+
+    ordenadas += sem_coordenadas
+    minutos = km / VELOCIDADE_MEDIA_KMH * 60 + TEMPO_POR_PARADA_MIN * len(ordenadas)
+
+    with transaction.atomic():
+        objetos = [Entrega(id=e['id'], ordem_parada=posicao) for posicao, e in enumerate(ordenadas, start=1)]
+        Entrega.objects.bulk_update(objetos, ['ordem_parada'], batch_size=500)
+        Rota.objects.filter(pk=rota_id).update(km_total_estimado=round(km), tempo_estimado=round(minutos))
+
+    return {
+        'rota_id': rota_id,
+        'paradas': len(ordenadas),
+        'sem_coordenadas': len(sem_coordenadas),
+        'km_total_estimado': round(km),
+        'tempo_estimado': round(minutos),
+        'tempo_gasto': round(time.monotonic() - inicio, 3),
+    }
+
+
+def _enfileirar(rota_id, tempo_limite):
+    with _pendentes_lock:
+        if rota_id in _pendentes:
+            return
+        _pendentes.add(rota_id)
+    _executor.submit(_executar_em_segundo_plano, rota_id, tempo_limite)
+
+
+def _executar_em_segundo_plano(rota_id, tempo_limite):
+    with _pendentes_lock:
+        _pendentes.discard(rota_id)
+    try:
+        otimizar_rota(rota_id, tempo_limite)
+    except Exception:
+        logger.exception('Falha ao otimizar a rota %s', rota_id)
+    finally:
+        connection.close()
+
+
+def agendar_otimizacao(rota_id, tempo_limite=TEMPO_LIMITE_PADRAO):
+    """
+    Enfileira a otimização da rota no worker em segundo plano após o commit.
+
+    Pedidos repetidos para a mesma rota enquanto ela aguarda na fila são
+    descartados, já que a execução pendente vai ler o estado mais recente.
+    """
+    transaction.on_commit(lambda: _enfileirar(rota_id, tempo_limite))
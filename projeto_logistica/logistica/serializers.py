@@ -0,0 +1,85 @@
+from rest_framework import serializers
+
+from .models import Motorista, Cliente, Veiculo, Entrega, Rota
+
+
+class ClienteSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Cliente
+        fields = '__all__'
+
+
+class MotoristaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Motorista
+        fields = '__all__'
+
+
+class VeiculoSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Veiculo
+        fields = '__all__'
+
+
+class EntregaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Entrega
+        fields = '__all__'
+
+
+class RotaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Rota
+        fields = '__all__'
+
+
+class EntregaLoteSerializer(serializers.ModelSerializer):
+    """
+    Valida uma entrega de um lote sem consultar o banco. Unicidade do código
+    e existência de cliente/motorista são conferidas para o lote inteiro em
+    lotes.validar_entregas. A rota não é aceita aqui: a alocação passa pela
+    reserva de capacidade (rotas/{id}/reservar ou carregamento automático).
+    """
+    cliente = serializers.IntegerField(source='cliente_id')
+    motorista = serializers.IntegerField(source='motorista_id', required=False, allow_null=True)
+
+    class Meta:
+        model = Entrega
+        fields = [
+            'codigo_rastreio', 'cliente', 'endereco_origem', 'cep_origem', 'endereco_destino',
+            'cep_destino', 'status', 'capacidade_necessaria', 'valor_frete',
+            'data_entrega_prevista', 'data_entrega_real', 'obs', 'motorista',
+        ]
+        extra_kwargs = {'codigo_rastreio': {'validators': []}}
+
+    def validate_codigo_rastreio(self, valor):
+        return valor.upper()
+
+    def validate_capacidade_necessaria(self, valor):
+        if valor <= 0:
+            raise serializers.ValidationError('Capacidade necessária deve ser maior que zero.')
+        return valor
+
+    def validate_valor_frete(self, valor):
+        if valor < 0:
+            raise serializers.ValidationError('Valor do frete não pode ser negativo.')
+        return valor
+
+
+class EntregaLoteAtualizacaoSerializer(serializers.ModelSerializer):
+    """Campos alteráveis em lote (nenhum deles afeta os totais da rota)"""
+    id = serializers.IntegerField()
+    motorista = serializers.IntegerField(source='motorista_id', required=False, allow_null=True)
+
+    class Meta:
+        model = Entrega
+        fields = ['id', 'status', 'motorista', 'data_entrega_prevista', 'data_entrega_real', 'obs']
+
+
+class ClienteLoteSerializer(serializers.ModelSerializer):
+    """Valida um cliente de um lote; e-mail único é conferido em lotes.validar_clientes"""
+
+    class Meta:
+        model = Cliente
+        fields = ['nome', 'email', 'telefone']
+        extra_kwargs = {'email': {'validators': []}}
@@ -0,0 +1,187 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+
+from .estatisticas import invalidar_estatisticas
+from .eventos import estado, registrar_eventos
+from .rastreamento import invalidar_rastreios
+from .lotes import TAMANHO_BATCH
+from .models import Cliente, Motorista, PerfilUsuario, Veiculo, Entrega, Rota, recalcular_totais_rotas
+
+
+# Base sintética para testes de carga: determinística para a mesma semente e
+# data base, gravada só com bulk_create (sem criar_usuario nem signals).
+
+SENHA_PADRAO = 'carga123'
+
+NOMES = ['Ana', 'Bruno', 'Carla', 'Diego', 'Elisa', 'Fábio', 'Gabriela', 'Hugo', 'Isabel', 'João',
+         'Larissa', 'Marcos', 'Natália', 'Otávio', 'Paula', 'Rafael', 'Sandra', 'Tiago', 'Vanessa', 'Wagner']
+SOBRENOMES = ['Silva', 'Santos', 'Oliveira', 'Souza', 'Lima', 'Pereira', 'Costa', 'Almeida', 'Ferreira', 'Rocha']
+RUAS = ['Rua das Flores', 'Av. Paulista', 'Rua Augusta', 'Av. Brasil', 'Rua XV de Novembro',
+        'Rua da Consolação', 'Av. Rebouças', 'Rua Vergueiro', 'Av. Ipiranga', 'Rua Oscar Freire']
+
+# (tipo, modelo, capacidade em kg, peso na frota)
+FROTA = [
+    ('moto', 'Honda CG 160', 30, 10),
+    ('carro', 'Fiat Fiorino', 600, 30),
+    ('van', 'Renault Master', 1500, 40),
+    ('caminhao', 'VW Delivery', 6000, 20),
+]
+
+# Status das entregas conforme o status da rota (sem rota: fila de espera)
+STATUS_ENTREGA_POR_ROTA = {
+    None: [('pendente', 70), ('cancelada', 15), ('remarcada', 15)],
+    'planejada': [('pendente', 95), ('remarcada', 5)],
+    'em_andamento': [('em_transito', 60), ('entregue', 35), ('remarcada', 5)],
+    'concluida': [('entregue', 92), ('cancelada', 3), ('remarcada', 5)],
+}
+
+
+def _sortear(rng, pesos):
+    opcoes, valores = zip(*pesos)
+    return rng.choices(opcoes, weights=valores)[0]
+
+
+def _nome(rng):
+    return f'{rng.choice(NOMES)} {rng.choice(SOBRENOMES)}'
+
+
+def _cep(rng):
+    return f'{rng.randint(1000, 9999):05d}-{rng.randint(0, 999):03d}'
+
+
+def _endereco(rng):
+    return f'{rng.choice(RUAS)}, {rng.randint(1, 3000)}'
+
+
+def _status_rota(data_rota, data_base):
+    if data_rota < data_base:
+        return 'concluida'
+    if data_rota == data_base:
+        return 'em_andamento'
+    return 'planejada'
+
+
+def gerar_base(clientes=500, motoristas=100, veiculos=80, rotas=1000, entregas=20000, semente=1,
+               data_base=None, fracao_com_usuario=0.8, senha=SENHA_PADRAO, progresso=None):
+    """
+    Gera clientes, motoristas (com usuário, perfil e grupo Motoristas para
+    fracao_com_usuario deles), veículos, rotas nos 180 dias antes e 14 depois
+    de data_base e entregas com status coerentes com a rota. Os
+    identificadores levam a semente, então bases de sementes diferentes
+    convivem no mesmo banco. Retorna as quantidades criadas.
+    """
+    rng = random.Random(semente)
+    data_base = data_base or date.today()
+    prefixo = f'{semente % 1000:03d}'
+
+    def avisar(etapa):
+        if progresso:
+            progresso(etapa)
+
+    with transaction.atomic():
+        novos_clientes = Cliente.objects.bulk_create([
+            Cliente(nome=_nome(rng), email=f'cliente{i}.s{prefixo}@sintetico.com.br',
+                    telefone=f'11 9{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}')
+            for i in range(clientes)
+        ], batch_size=TAMANHO_BATCH)
+        avisar('clientes')
+
+        # Uma única senha com hash para todos os usuários sintéticos
+        senha_hash = make_password(senha)
+        com_usuario = int(motoristas * fracao_com_usuario)
+        usuarios = User.objects.bulk_create([
+            User(username=f'motorista_s{prefixo}_{i}', email=f'motorista_s{prefixo}_{i}@sintetico.com.br',
+                 password=senha_hash, is_active=True)
+            for i in range(com_usuario)
+        ], batch_size=TAMANHO_BATCH)
+        novos_motoristas = Motorista.objects.bulk_create([
+            Motorista(nome=_nome(rng), cpf=f'{prefixo}.{i // 1000:03d}.{i % 1000:03d}-00',
+                      cnh=rng.choice('BCDE'), telefone=f'11 9{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}',
+                      status=_sortear(rng, [('disponivel', 60), ('em_rota', 30), ('inativo', 10)]),
+                      user=usuarios[i] if i < com_usuario else None)
+            for i in range(motoristas)
+        ], batch_size=TAMANHO_BATCH)
+        if usuarios:
+            grupo_motoristas, _ = Group.objects.get_or_create(name='Motoristas')
+            User.groups.through.objects.bulk_create([
+                User.groups.through(user_id=usuario.id, group_id=grupo_motoristas.id) for usuario in usuarios
+            ], batch_size=TAMANHO_BATCH)
+            PerfilUsuario.objects.bulk_create([
+                PerfilUsuario(user=usuario, motorista=motorista, tipo_usuario='motorista')
+                for usuario, motorista in zip(usuarios, novos_motoristas)
+            ], batch_size=TAMANHO_BATCH)
+        avisar('motoristas')
+
+        frota = [(tipo, modelo, capacidade) for tipo, modelo, capacidade, _ in FROTA]
+        pesos_frota = [peso for *_, peso in FROTA]
+        novos_veiculos = []
+        for i in range(veiculos):
+            tipo, modelo, capacidade = rng.choices(frota, weights=pesos_frota)[0]
+            novos_veiculos.append(Veiculo(
+                placa=f'S{prefixo}{i:05d}', modelo=modelo, tipo=tipo, capacidade_maxima=capacidade,
+                km_atual=rng.randint(0, 250000),
+                status=_sortear(rng, [('disponivel', 70), ('em_uso', 25), ('manutencao', 5)]),
+                motorista=novos_motoristas[i] if i < motoristas else None,
+            ))
+        Veiculo.objects.bulk_create(novos_veiculos, batch_size=TAMANHO_BATCH)
+        avisar('veiculos')
+
+        novas_rotas = []
+        for i in range(rotas):
+            data_rota = data_base + timedelta(days=rng.randint(-180, 14))
+            novas_rotas.append(Rota(
+                nome=f'Rota {prefixo}-{i}', motorista=rng.choice(novos_motoristas),
+                veiculo=rng.choice(novos_veiculos), data_rota=data_rota,
+                status=_status_rota(data_rota, data_base),
+                km_total_estimado=rng.randint(10, 400), tempo_estimado=rng.randint(30, 600),
+            ))
+        Rota.objects.bulk_create(novas_rotas, batch_size=TAMANHO_BATCH)
+        avisar('rotas')
+
+        paradas = {}
+        lote = []
+        for i in range(entregas):
+            # ~75% das entregas já estão em alguma rota
+            rota = rng.choice(novas_rotas) if novas_rotas and rng.random() < 0.75 else None
+            status = _sortear(rng, STATUS_ENTREGA_POR_ROTA[rota.status if rota else None])
+            prevista = (rota.data_rota if rota else data_base) + timedelta(days=rng.randint(0, 3))
+            ordem = None
+            if rota:
+                ordem = paradas[rota.id] = paradas.get(rota.id, 0) + 1
+            lote.append(Entrega(
+                codigo_rastreio=f'S{prefixo}{i:09d}', cliente=rng.choice(novos_clientes),
+                endereco_origem=_endereco(rng), cep_origem=_cep(rng),
+                endereco_destino=_endereco(rng), cep_destino=_cep(rng),
+                status=status, capacidade_necessaria=round(rng.uniform(0.5, 25), 1),
+                valor_frete=Decimal(rng.randint(1500, 30000)).scaleb(-2),
+                data_entrega_prevista=prevista,
+                data_entrega_real=prevista if status == 'entregue' else None,
+                motorista=rota.motorista if rota else None, rota=rota, ordem_parada=ordem,
+            ))
+            if len(lote) >= TAMANHO_BATCH:
+                Entrega.objects.bulk_create(lote)
+                registrar_eventos(estado(entrega) for entrega in lote)
+                lote = []
+        if lote:
+            Entrega.objects.bulk_create(lote)
+            registrar_eventos(estado(entrega) for entrega in lote)
+        avisar('entregas')
+
+        if novas_rotas:
+            recalcular_totais_rotas(Rota.objects.filter(pk__gte=novas_rotas[0].id, pk__lte=novas_rotas[-1].id))
+
+    invalidar_estatisticas()
+    invalidar_rastreios()
+    return {
+        'clientes': len(novos_clientes),
+        'motoristas': len(novos_motoristas),
+        'usuarios': len(usuarios),
+        'veiculos': len(novos_veiculos),
+        'rotas': len(novas_rotas),
+        'entregas': entregas,
+    }
@@ -0,0 +1,374 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+
+from django.conf import settings
+from django.db import connection
+
+
+logger = logging.getLogger(__name__)
+
+# Configuração padrão; settings.TELEMETRIA sobrescreve as chaves informadas
+PADRAO = {
+    'AMOSTRAGEM': 0.0,          # fração das requisições com span (0 desliga)
+    'EXPORTADOR': None,         # None, 'arquivo' ou 'otlp'
+    'ARQUIVO': 'telemetria.ndjson',
+    'OTLP_URL': 'http://localhost:4318/v1/traces',
+    'SERVICO': 'projeto_logistica',
+    'LOTE': 100,                # spans enviados por vez
+    'INTERVALO': 2.0,           # segundos máximos até enviar um lote incompleto
+}
+
+
+def configuracao():
+    return {**PADRAO, **getattr(settings, 'TELEMETRIA', {})}
+
+
+_span_atual = contextvars.ContextVar('logistica_span', default=None)
+
+
+def span_atual():
+    """Span da requisição em andamento (None se ela não foi amostrada)"""
+    return _span_atual.get()
+
+
+class Span:
+    """Uma requisição medida: view, status, consultas, tempo de banco e de template"""
+
+    def __init__(self, nome, atributos=None):
+        self.nome = nome
+        self.trace_id = os.urandom(16).hex()
+        self.span_id = os.urandom(8).hex()
+        self.atributos = dict(atributos or {})
+        self.consultas = 0
+        self.tempo_db = 0.0
+        self.tempo_template = 0.0
+        self._em_template = False
+        self.inicio_ns = time.time_ns()
+        self._inicio = time.perf_counter()
+        self.duracao = None
+
+    def registrar_consulta(self, execute, sql, params, many, context):
+        """execute_wrapper do Django: conta as consultas e soma o tempo delas"""
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.consultas += 1
+            self.tempo_db += time.perf_counter() - inicio
+
+    def finalizar(self):
+        self.duracao = time.perf_counter() - self._inicio
+
+    def como_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'nome': self.nome,
+            'inicio_ns': self.inicio_ns,
+            'duracao_ms': round(self.duracao * 1000, 3),
+            'consultas': self.consultas,
+            'db_ms': round(self.tempo_db * 1000, 3),
+            'template_ms': round(self.tempo_template * 1000, 3),
+            'atributos': self.atributos,
+        }
+
+
+# ---- Exportadores ----
+
+class ExportadorArquivo:
+    """Acrescenta cada span como uma linha JSON em um arquivo local"""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+
+    def exportar(self, spans):
+        with open(self.caminho, 'a', encoding='utf-8') as arquivo:
+            for span in spans:
+                arquivo.write(json.dumps(span, ensure_ascii=False, default=str) + '\n')
+
+
+def _atributo_otlp(chave, valor):
+    if isinstance(valor, bool):
+        return {'key': chave, 'value': {'boolValue': valor}}
+    if isinstance(valor, int):
+        return {'key': chave, 'value': {'intValue': str(valor)}}
+    if isinstance(valor, float):
+        return {'key': chave, 'value': {'doubleValue': valor}}
+    return {'key': chave, 'value': {'stringValue': str(valor)}}
+
+
+class ExportadorOtlp:
+    """Envia os spans para um coletor OTLP/HTTP no formato JSON"""
+
+    def __init__(self, url, servico, timeout=5):
+        self.url = url
+        self.servico = servico
+        self.timeout = timeout
+
+    def payload(self, spans):
+        return {'resourceSpans': [{
+            'resource': {'attributes': [_atributo_otlp('service.name', self.servico)]},
+            'scopeSpans': [{
+                'scope': {'name': 'logistica.telemetria'},
+                'spans': [{
+                    'traceId': span['trace_id'],
+                    'spanId': span['span_id'],
+                    'name': span['nome'],
+                    'kind': 2,  # SERVER
+                    'startTimeUnixNano': str(span['inicio_ns']),
+                    'endTimeUnixNano': str(span['inicio_ns'] + int(span['duracao_ms'] * 1_000_000)),
+                    'attributes': [
+                        _atributo_otlp(chave, valor)
+                        for chave, valor in dict(
+                            span['atributos'],
+                            **{'db.consultas': span['consultas'], 'db.tempo_ms': span['db_ms'],
+                               'template.tempo_ms': span['template_ms']},
+                        ).items()
+                    ],
+                } for span in spans],
+            }],
+        }]}
+
+    def exportar(self, spans):
+        corpo = json.dumps(self.payload(spans)).encode()
+        requisicao = urllib.request.Request(self.url, data=corpo, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(requisicao, timeout=self.timeout) as resposta:
+            resposta.read()
+
+
+class _Despachante:
+    """
+    Fila com uma thread que agrupa os spans e chama o exportador fora da
+    requisição, então gravar ou enviar nunca atrasa a resposta.
+    """
+
+    def __init__(self, exportador, lote, intervalo):
+        self.exportador = exportador
+        self.lote = lote
+        self.intervalo = intervalo
+        self.fila = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def enviar(self, span):
+        self.fila.put(span)
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._executar, name='telemetria', daemon=True)
+                    self._thread.start()
+
+    def _exportar(self, spans):
+        try:
+            self.exportador.exportar(spans)
+        except Exception:
+            logger.warning('Falha ao exportar %d span(s)', len(spans), exc_info=True)
+
+    def _executar(self):
+        while True:
+            spans = [self.fila.get()]
+            limite = time.monotonic() + self.intervalo
+            while len(spans) < self.lote:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    spans.append(self.fila.get(timeout=restante))
+                except queue.Empty:
+                    break
+            self._exportar(spans)
+
+    def descarregar(self):
+        """Exporta já o que estiver na fila (usado no encerramento e nos testes)"""
+        spans = []
+        while True:
+            try:
+                spans.append(self.fila.get_nowait())
+            except queue.Empty:
+                break
+        if spans:
+            self._exportar(spans)
+
+
+_despachante = None
+
+
+def configurar_exportador(exportador, lote=None, intervalo=None):
+    """Troca o exportador dos spans (None descarta os spans)"""
+    global _despachante
+    if _despachante is not None:
+        _despachante.descarregar()
+    config = configuracao()
+    _despachante = _Despachante(
+        exportador, lote or config['LOTE'], intervalo or config['INTERVALO']) if exportador else None
+
+
+def exportador_configurado():
+    """Cria o exportador definido em settings.TELEMETRIA"""
+    config = configuracao()
+    if config['EXPORTADOR'] == 'arquivo':
+        return ExportadorArquivo(config['ARQUIVO'])
+    if config['EXPORTADOR'] == 'otlp':
+        return ExportadorOtlp(config['OTLP_URL'], config['SERVICO'])
+    return None
+
+
+def registrar(span):
+    if _despachante is not None:
+        _despachante.enviar(span.como_dict())
+
+
+def descarregar():
+    if _despachante is not None:
+        _despachante.descarregar()
+
+
+atexit.register(descarregar)
+
+
+# ---- Templates ----
+
+def instrumentar_templates():
+    """
+    Mede o tempo de renderização dos templates do Django dentro do span
+    atual. Só a renderização mais externa conta ({% include %} e
+    {% extends %} ficam dentro dela).
+    """
+    from django.template.base import Template
+
+    if getattr(Template.render, '_telemetria', False):
+        return
+    original = Template.render
+
+    def render(self, context):
+        span = _span_atual.get()
+        if span is None or span._em_template:
+            return original(self, context)
+        span._em_template = True
+        inicio = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            span.tempo_template += time.perf_counter() - inicio
+            span._em_template = False
+
+    render._telemetria = True
+    Template.render = render
+
+
+# ---- Logging ----
+
+class FiltroAmostragem(logging.Filter):
+    """
+    Deixa passar só uma fração (taxa) dos registros até nivel_maximo;
+    avisos e erros acima dele passam sempre.
+    """
+
+    def __init__(self, taxa=1.0, nivel_maximo='INFO'):
+        super().__init__()
+        self.taxa = float(taxa)
+        self.nivel_maximo = logging.getLevelName(nivel_maximo) if isinstance(nivel_maximo, str) else nivel_maximo
+
+    def filter(self, record):
+        return record.levelno > self.nivel_maximo or random.random() < self.taxa
+
+
+class FormatadorJson(logging.Formatter):
+    """Uma linha JSON por registro, com o trace_id da requisição quando houver"""
+
+    def format(self, record):
+        dados = {
+            'hora': self.formatTime(record),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensagem': record.getMessage(),
+        }
+        # Vindo do HandlerFila, o trace_id já foi lido na thread da requisição
+        trace_id = getattr(record, 'trace_id', None)
+        if trace_id is None:
+            span = _span_atual.get()
+            trace_id = span.trace_id if span is not None else None
+        if trace_id is not None:
+            dados['trace_id'] = trace_id
+        if hasattr(record, 'dados'):
+            dados['dados'] = record.dados
+        if record.exc_info:
+            dados['excecao'] = self.formatException(record.exc_info)
+        return json.dumps(dados, ensure_ascii=False, default=str)
+
+
+class HandlerFila(logging.handlers.QueueHandler):
+    """
+    Põe os registros numa fila e deixa um QueueListener formatar e gravar no
+    stream, como o despachante dos spans: a escrita no console não segura a
+    requisição. O formatter configurado vale para a saída do listener.
+    """
+
+    def __init__(self, stream=None):
+        super().__init__(queue.SimpleQueue())
+        self.saida = logging.StreamHandler(stream)
+        self.listener = logging.handlers.QueueListener(self.queue, self.saida)
+        self.listener.start()
+
+    def setFormatter(self, fmt):
+        self.saida.setFormatter(fmt)
+
+    def close(self):
+        # logging.shutdown fecha os handlers na saída: grava o que ainda estiver na fila
+        if self.listener._thread is not None:
+            self.listener.stop()
+        super().close()
+
+    def prepare(self, record):
+        # O span é de contextvar: só a thread que registrou o enxerga
+        record = copy.copy(record)
+        span = _span_atual.get()
+        if span is not None:
+            record.trace_id = span.trace_id
+        return record
+
+
+# ---- Middleware ----
+
+class TelemetriaMiddleware:
+    """
+    Abre um span para uma fração das requisições (TELEMETRIA['AMOSTRAGEM'])
+    com a view, o status, a quantidade e o tempo das consultas e o tempo de
+    template, e o entrega ao exportador em segundo plano.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.amostragem = configuracao()['AMOSTRAGEM']
+
+    def __call__(self, request):
+        if self.amostragem <= 0 or random.random() >= self.amostragem:
+            return self.get_response(request)
+
+        span = Span(f'{request.method} {request.path}', {'http.method': request.method, 'http.path': request.path})
+        token = _span_atual.set(span)
+        try:
+            with connection.execute_wrapper(span.registrar_consulta):
+                response = self.get_response(request)
+        finally:
+            _span_atual.reset(token)
+            span.finalizar()
+
+        if request.resolver_match:
+            span.atributos['view'] = request.resolver_match.view_name
+            span.nome = request.resolver_match.view_name or span.nome
+        span.atributos['http.status'] = response.status_code
+        registrar(span)
+        logger.debug('%s %s -> %s em %.1f ms, %d consulta(s)', request.method, request.path,
+                     response.status_code, span.duracao * 1000, span.consultas)
+        return response
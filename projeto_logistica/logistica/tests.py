@@ -1,3 +1,1826 @@
-from django.test import TestCase
+import copy
+import csv
+import gzip
+import io
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import Group, User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import connection, reset_queries, transaction
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import importacao, limites, rastreamento, roteirizacao, telemetria
+from .carregamento import executar_carregamento, planejar_carregamento
+from .ciclo_rotas import cancelar_rotas, concluir_rotas, deletar_rotas, iniciar_rotas
+from .credenciamento import gerar_hashes
+from .estatisticas import estatisticas_admin, estatisticas_motorista
+from .eventos import linha_do_tempo, permanencia_por_status
+from .exportacao import COLUNAS, CONTENT_TYPES, exportar, ler_colunar
+from .identidade import IDENTIDADE_TTL
+from .forms import ClienteForm, EntregaForm, MotoristaForm, RotaForm, VeiculoForm
+from .geocodificacao import (IndiceCep, carregar_ceps, coordenadas_cep, geocodificar_entregas, normalizar_cep,
+                             recarregar_indice)
+from .indicadores import _travar_marco, atualizar_indicadores, indicadores, recalcular_indicadores
+from .lotes import alterar_status
+from .reconciliacao import reconciliar_grupo_motoristas
+from .paginacao import paginar_keyset
+from .rastreamento import RASTREIO_MAX_AGE, RASTREIO_NEGATIVO_TIMEOUT, RASTREIO_TIMEOUT
+from .models import (Cliente, Motorista, Veiculo, Entrega, EntregaEvento, IndicadorDiario, Rota,
+                     recalcular_totais_rotas)
+from .roteirizacao import (agendar_otimizacao, custo_rota, dois_opt, matriz_distancias, or_opt, otimizar_rota,
+                           vizinho_mais_proximo)
+from .serializers import EntregaSerializer
+from .sinteticos import gerar_base
+from .views_html import LIMITE_OPCOES_FILTRO
+
+
+def criar_entregas(cliente, quantidade, **extra):
+    return Entrega.objects.bulk_create([
+        Entrega(
+            codigo_rastreio=f'TST{i:06d}',
+            cliente=cliente,
+            endereco_origem='Rua A, 1',
+            cep_origem='01310-100',
+            endereco_destino='Rua B, 2',
+            cep_destino='04538-133',
+            capacidade_necessaria=10,
+            valor_frete=50,
+            **extra,
+        )
+        for i in range(quantidade)
+    ])
+
+
+class EstatisticasCacheTest(TestCase):
+    """Os contadores do dashboard saem do snapshot até alguma alteração relevante"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nome='Cliente', email='stats@teste.com', telefone='11')
+        cls.motorista = Motorista.objects.create(nome='Stats', cpf='010.000.000-00', cnh='B', telefone='11')
+        cls.usuario = User.objects.create_user('stats', password='senha')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_snapshot_servido_do_cache(self):
+        with self.assertNumQueries(5):
+            primeira = estatisticas_admin()
+        with self.assertNumQueries(0):
+            self.assertEqual(estatisticas_admin(), primeira)
+        estatisticas_motorista(self.motorista)
+        with self.assertNumQueries(0):
+            estatisticas_motorista(self.motorista)
+
+    def test_alteracao_invalida_snapshot(self):
+        self.assertEqual(estatisticas_admin()['total_entregas'], 0)
+        criar_entregas(self.cliente, 1)[0].save()  # bulk_create não dispara signals; o save() sim
+        with self.assertNumQueries(5):
+            self.assertEqual(estatisticas_admin()['total_entregas'], 1)
+
+        estatisticas_motorista(self.motorista)
+        Cliente.objects.get(pk=self.cliente.pk).delete()
+        with self.assertNumQueries(3):
+            estatisticas_motorista(self.motorista)
+
+    def test_login_e_dados_pessoais_nao_invalidam(self):
+        estatisticas_admin()
+        self.usuario.last_login = timezone.now()
+        self.usuario.save(update_fields=['last_login'])
+        self.usuario.first_name = 'Outro'
+        self.usuario.save(update_fields=['first_name', 'email'])
+        with self.assertNumQueries(0):
+            estatisticas_admin()
+
+        self.usuario.is_active = False
+        self.usuario.save(update_fields=['is_active'])
+        with self.assertNumQueries(5):
+            estatisticas_admin()
+
+        self.usuario.save()  # sem update_fields não dá para saber o que mudou
+        with self.assertNumQueries(5):
+            estatisticas_admin()
+
+
+class TotaisRotaTest(TestCase):
+    """Capacidade, valor e contagem desnormalizados na rota acompanham as entregas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nome='Cliente', email='totais@teste.com', telefone='11')
+        motorista = Motorista.objects.create(nome='Totais', cpf='020.000.000-00', cnh='B', telefone='11')
+        veiculo = Veiculo.objects.create(placa='TOT0001', modelo='Van', tipo='van', capacidade_maxima=500)
+        cls.rota_a = Rota.objects.create(nome='A', motorista=motorista, veiculo=veiculo, data_rota=date(2024, 6, 1))
+        cls.rota_b = Rota.objects.create(nome='B', motorista=motorista, veiculo=veiculo, data_rota=date(2024, 6, 1))
+
+    def totais(self, rota):
+        rota.refresh_from_db(fields=['capacidade_utilizada', 'valor_total', 'total_entregas'])
+        return rota.capacidade_utilizada, rota.valor_total, rota.total_entregas
+
+    def assertBateComRecalculo(self):
+        antes = [self.totais(rota) for rota in (self.rota_a, self.rota_b)]
+        recalcular_totais_rotas()
+        self.assertEqual([self.totais(rota) for rota in (self.rota_a, self.rota_b)], antes)
+
+    def test_mover_editar_e_remover(self):
+        primeira, segunda = Entrega.objects.filter(pk__in=[e.pk for e in criar_entregas(self.cliente, 2)])
+        for entrega in (primeira, segunda):
+            entrega.rota = self.rota_a
+            entrega.save()
+        self.assertEqual(self.totais(self.rota_a), (20, Decimal('100.00'), 2))
+
+        primeira.rota = self.rota_b
+        primeira.save()
+        self.assertEqual(self.totais(self.rota_a), (10, Decimal('50.00'), 1))
+        self.assertEqual(self.totais(self.rota_b), (10, Decimal('50.00'), 1))
+        self.assertBateComRecalculo()
+
+        segunda.capacidade_necessaria = 35.5
+        segunda.valor_frete = Decimal('80.25')
+        segunda.save()
+        self.assertEqual(self.totais(self.rota_a), (35.5, Decimal('80.25'), 1))
+        self.assertBateComRecalculo()
+
+        segunda.rota = None
+        segunda.save()
+        primeira.delete()
+        self.assertEqual(self.totais(self.rota_a), (0, Decimal('0.00'), 0))
+        self.assertEqual(self.totais(self.rota_b), (0, Decimal('0.00'), 0))
+        self.assertBateComRecalculo()
+
+    def test_remover_cliente_e_lote_recalculam_uma_vez(self):
+        outro = Cliente.objects.create(nome='Outro', email='totais2@teste.com', telefone='11')
+        ids = [e.pk for e in criar_entregas(self.cliente, 4)]
+        Entrega.objects.filter(pk__in=ids[:2]).update(rota=self.rota_a)
+        Entrega.objects.filter(pk__in=ids[2:]).update(rota=self.rota_b)
+        Entrega.objects.create(codigo_rastreio='TOTOUTRO', cliente=outro, rota=self.rota_a, endereco_origem='A',
+                               cep_origem='1', endereco_destino='B', cep_destino='2', capacidade_necessaria=7,
+                               valor_frete=3)
+
+        # As entregas saem em lote, sem consulta por entrega, e as rotas são recalculadas num UPDATE só
+        with CaptureQueriesContext(connection) as consultas:
+            self.cliente.delete()
+        self.assertEqual(sum(1 for c in consultas if c['sql'].startswith('UPDATE "logistica_rota"')), 1)
+        self.assertEqual(sum(1 for c in consultas if c['sql'].startswith('DELETE FROM "logistica_entrega"')), 1)
+        self.assertEqual(self.totais(self.rota_a), (7, Decimal('3.00'), 1))
+        self.assertEqual(self.totais(self.rota_b), (0, Decimal('0.00'), 0))
+
+        Entrega.objects.filter(cliente=outro).delete()
+        self.assertEqual(self.totais(self.rota_a), (0, Decimal('0.00'), 0))
+
+    def test_recalcular_repara_divergencia(self):
+        Entrega.objects.filter(pk__in=[e.pk for e in criar_entregas(self.cliente, 3)]).update(rota=self.rota_b)
+        self.assertEqual(self.totais(self.rota_b), (0, Decimal('0.00'), 0))  # update() não passa pelo save()
+        self.rota_b.recalcular_totais()
+        self.assertEqual((self.rota_b.capacidade_utilizada, self.rota_b.valor_total, self.rota_b.total_entregas),
+                         (30, Decimal('150.00'), 3))
+
+
+class ReservaEntregasTest(TestCase):
+    """Rota.reservar_entregas: motivos de rejeição, capacidade do veículo e mover"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin_reserva', password='senha', is_staff=True)
+        cls.cliente = Cliente.objects.create(nome='Cliente', email='reserva@teste.com', telefone='11')
+        motorista = Motorista.objects.create(nome='Reserva', cpf='030.000.000-00', cnh='B', telefone='11')
+        veiculo = Veiculo.objects.create(placa='RES0001', modelo='Van', tipo='van', capacidade_maxima=25)
+        dados = {'motorista': motorista, 'veiculo': veiculo, 'data_rota': date(2024, 6, 1)}
+        cls.rota = Rota.objects.create(nome='Rota', **dados)
+        cls.outra = Rota.objects.create(nome='Outra', **dados)
+        cls.concluida = Rota.objects.create(nome='Concluída', status='concluida', **dados)
+        cls.cancelada = Rota.objects.create(nome='Cancelada', status='cancelada', **dados)
+
+    def setUp(self):
+        self.entregas = [e.pk for e in criar_entregas(self.cliente, 3)]
+
+    def motivos(self, resultados):
+        return [r['motivo'] for r in resultados]
+
+    def test_motivos_de_rejeicao(self):
+        primeira, segunda, terceira = self.entregas
+        self.assertEqual(self.motivos(self.concluida.reservar_entregas([primeira])), ['rota_concluida'])
+        self.assertEqual(self.motivos(self.cancelada.reservar_entregas([primeira])), ['rota_cancelada'])
+
+        resultados = self.rota.reservar_entregas([primeira, primeira, segunda, terceira, 999999])
+        # 10 + 10 cabem no veículo de 25; a terceira não
+        self.assertEqual(self.motivos(resultados),
+                         [None, 'ja_nesta_rota', None, 'capacidade_excedida', 'nao_encontrada'])
+        self.assertEqual([r['reservada'] for r in resultados], [True, False, True, False, False])
+        self.assertEqual(resultados[3]['mensagem'], Rota.MOTIVOS_RESERVA['capacidade_excedida'])
+        self.assertEqual(self.rota.capacidade_utilizada, 20)
+        self.assertEqual(self.motivos(self.rota.reservar_entregas([primeira])), ['ja_nesta_rota'])
+        self.assertEqual(self.motivos(self.outra.reservar_entregas([primeira])), ['ja_em_rota'])
+
+    def test_so_pendentes_ou_remarcadas(self):
+        primeira, segunda, terceira = self.entregas
+        Entrega.objects.filter(pk=primeira).update(status='entregue')
+        Entrega.objects.filter(pk=segunda).update(status='cancelada')
+        Entrega.objects.filter(pk=terceira).update(status='remarcada')
+        self.assertEqual(self.motivos(self.rota.reservar_entregas(self.entregas)),
+                         ['status_invalido', 'status_invalido', None])
+        self.assertEqual((self.rota.capacidade_utilizada, self.rota.total_entregas), (10, 1))
+
+    def test_mover_transfere_totais(self):
+        primeira, segunda, _ = self.entregas
+        self.outra.reservar_entregas([primeira, segunda])
+        self.assertEqual(self.outra.total_entregas, 2)
+
+        resultados = self.rota.reservar_entregas([primeira], mover=True)
+        self.assertTrue(resultados[0]['reservada'])
+        self.assertEqual(Entrega.objects.get(pk=primeira).rota_id, self.rota.id)
+        self.assertEqual((self.rota.capacidade_utilizada, self.rota.valor_total, self.rota.total_entregas),
+                         (10, Decimal('50.00'), 1))
+        self.outra.refresh_from_db()
+        self.assertEqual((self.outra.capacidade_utilizada, self.outra.valor_total, self.outra.total_entregas),
+                         (10, Decimal('50.00'), 1))
+
+    def test_api_le_mover_como_booleano(self):
+        primeira = self.entregas[0]
+        self.outra.reservar_entregas([primeira])
+        api = APIClient()
+        api.force_authenticate(self.admin)
+        url = f'/api/rotas/{self.rota.id}/reservar/'
+
+        for valor in ('false', '0', False):
+            with self.subTest(mover=valor):
+                resposta = api.post(url, {'entregas': [primeira], 'mover': valor}, format='json')
+                self.assertEqual(resposta.json()['resultados'][0]['motivo'], 'ja_em_rota')
+        self.assertEqual(api.post(url, {'entregas': [primeira], 'mover': 'talvez'}, format='json').status_code, 400)
+
+        resposta = api.post(url, {'entregas': [primeira], 'mover': 'true'}, format='json')
+        self.assertEqual(resposta.json()['reservadas'], 1)
+        self.assertEqual(Entrega.objects.get(pk=primeira).rota_id, self.rota.id)
+
+
+class CarregamentoTest(TestCase):
+    """Empacotamento das entregas pendentes nas rotas planejadas do dia"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin_carga', password='senha', is_staff=True)
+        cls.cliente = Cliente.objects.create(nome='Cliente', email='carga@teste.com', telefone='11')
+        cls.motorista = Motorista.objects.create(nome='Carga', cpf='040.000.000-00', cnh='B', telefone='11')
+        outro = Motorista.objects.create(nome='Outro', cpf='041.000.000-00', cnh='B', telefone='11')
+        grande = Veiculo.objects.create(placa='CAR0050', modelo='Van', tipo='van', capacidade_maxima=50)
+        pequeno = Veiculo.objects.create(placa='CAR0030', modelo='Fiorino', tipo='van', capacidade_maxima=30)
+        cls.dia = date(2024, 6, 1)
+        cls.rota_grande = Rota.objects.create(nome='Grande', motorista=outro, veiculo=grande, data_rota=cls.dia)
+        cls.rota_pequena = Rota.objects.create(nome='Pequena', motorista=cls.motorista, veiculo=pequeno,
+                                               data_rota=cls.dia)
+        Rota.objects.create(nome='Outro dia', motorista=outro, veiculo=grande, data_rota=date(2024, 6, 2))
+        entregas = criar_entregas(cls.cliente, 4)
+        cls.pesos = {}
+        for entrega, peso in zip(entregas, (25, 20, 10, 60)):
+            cls.pesos[peso] = entrega.pk
+        for peso, pk in cls.pesos.items():
+            Entrega.objects.filter(pk=pk).update(capacidade_necessaria=peso)
+
+    def alocacao(self, plano):
+        por_id = {pk: peso for peso, pk in self.pesos.items()}
+        return {linha['nome']: [por_id[e['id']] for e in linha['entregas']] for linha in plano['rotas']}
+
+    def test_estrategias(self):
+        best_fit = planejar_carregamento(self.dia, 'best_fit')
+        # Cada item vai para a rota com a menor sobra que ainda o comporta
+        self.assertEqual(self.alocacao(best_fit), {'Grande': [20, 10], 'Pequena': [25]})
+        first_fit = planejar_carregamento(self.dia, 'first_fit')
+        self.assertEqual(self.alocacao(first_fit), {'Grande': [25, 20], 'Pequena': [10]})
+        for plano in (best_fit, first_fit):
+            self.assertEqual([e['id'] for e in plano['nao_alocadas']], [self.pesos[60]])
+            self.assertEqual(plano['total_alocadas'], 3)
+            for linha in plano['rotas']:
+                self.assertLessEqual(linha['capacidade_planejada'], linha['capacidade_maxima'])
+        with self.assertRaises(ValueError):
+            planejar_carregamento(self.dia, 'worst_fit')
+
+    def test_entrega_com_motorista_so_vai_para_rota_dele(self):
+        Entrega.objects.filter(pk=self.pesos[20]).update(motorista=self.motorista)
+        plano = planejar_carregamento(self.dia, 'first_fit')
+        self.assertIn(20, self.alocacao(plano)['Pequena'])
+
+    def test_capacidade_ja_utilizada(self):
+        self.rota_pequena.reservar_entregas([self.pesos[25]])
+        plano = planejar_carregamento(self.dia, 'best_fit')
+        self.assertEqual(self.alocacao(plano), {'Grande': [20, 10], 'Pequena': []})
+
+    @mock.patch('logistica.carregamento.agendar_otimizacao')
+    def test_dry_run_nao_grava(self, agendar):
+        plano = executar_carregamento(self.dia, 'best_fit', dry_run=True)
+        self.assertEqual(plano['total_alocadas'], 3)
+        self.assertFalse(Entrega.objects.filter(rota__isnull=False).exists())
+        agendar.assert_not_called()
+
+        plano = executar_carregamento(self.dia, 'best_fit')
+        self.assertEqual((plano['total_alocadas'], plano['rejeitadas']), (3, []))
+        self.assertEqual(Entrega.objects.get(pk=self.pesos[25]).rota_id, self.rota_pequena.id)
+        self.rota_grande.refresh_from_db()
+        self.assertEqual(self.rota_grande.capacidade_utilizada, 30)
+        self.assertEqual(sorted(c.args[0] for c in agendar.call_args_list),
+                         sorted([self.rota_grande.id, self.rota_pequena.id]))
+
+    @mock.patch('logistica.carregamento.agendar_otimizacao')
+    def test_api_le_dry_run_como_booleano(self, agendar):
+        api = APIClient()
+        api.force_authenticate(self.admin)
+        url = '/api/rotas/carregamento-automatico/'
+        resposta = api.post(url, {'data_rota': '2024-06-01', 'dry_run': 'true'}, format='json')
+        self.assertTrue(resposta.json()['dry_run'])
+        self.assertFalse(Entrega.objects.filter(rota__isnull=False).exists())
+        self.assertEqual(api.post(url, {'data_rota': '2024-06-01', 'dry_run': 'x'}, format='json').status_code, 400)
+
+        resposta = api.post(url, {'data_rota': '2024-06-01', 'dry_run': 'false'}, format='json')
+        self.assertFalse(resposta.json()['dry_run'])
+        self.assertEqual(Entrega.objects.filter(rota__isnull=False).count(), 3)
+
+
+class RoteirizacaoTest(TestCase):
+    """Sequenciamento das paradas: as melhorias nunca alongam o circuito inicial"""
+
+    # Pontos fixos em São Paulo (depósito primeiro)
+    PONTOS = [(-23.5505, -46.6333), (-23.5614, -46.6559), (-23.5329, -46.6395), (-23.5874, -46.6576),
+              (-23.5430, -46.6290), (-23.5718, -46.6401), (-23.5275, -46.6780), (-23.5980, -46.6190),
+              (-23.5600, -46.6100), (-23.5150, -46.6500)]
+
+    def test_vizinho_mais_proximo(self):
+        dist = [[0, 1, 5, 9], [1, 0, 2, 8], [5, 2, 0, 3], [9, 8, 3, 0]]
+        self.assertEqual(vizinho_mais_proximo(dist), [0, 1, 2, 3])
+
+    def test_melhorias_nao_alongam_o_circuito(self):
+        dist = matriz_distancias(self.PONTOS)
+        inicial = vizinho_mais_proximo(dist)
+        custo_inicial = custo_rota(inicial, dist)
+        prazo = time.monotonic() + 5
+        for melhorar in (dois_opt, or_opt):
+            with self.subTest(melhorar.__name__):
+                tour = melhorar(list(inicial), dist, prazo)
+                self.assertEqual(tour[0], 0)
+                self.assertEqual(sorted(tour), list(range(len(self.PONTOS))))
+                self.assertLessEqual(custo_rota(tour, dist), custo_inicial + 1e-9)
+
+    def test_otimizar_rota_geocodifica_antes(self):
+        carregar_ceps([(4538133 + i, lat, lon) for i, (lat, lon) in enumerate(self.PONTOS)])
+        self.addCleanup(recarregar_indice)
+        cliente = Cliente.objects.create(nome='Cliente', email='rota@teste.com', telefone='11')
+        motorista = Motorista.objects.create(nome='Rota', cpf='050.000.000-00', cnh='B', telefone='11')
+        veiculo = Veiculo.objects.create(placa='OTM0001', modelo='Van', tipo='van', capacidade_maxima=500)
+        rota = Rota.objects.create(nome='Rota', motorista=motorista, veiculo=veiculo, data_rota=date(2024, 6, 1))
+        # Entregas criadas depois do backfill: sem coordenadas, só com o CEP
+        entregas = criar_entregas(cliente, len(self.PONTOS) - 1, rota=rota)
+        for i, entrega in enumerate(entregas, start=1):
+            entrega.cep_origem = '04538-133'
+            entrega.cep_destino = f'{4538133 + i:08d}'
+        Entrega.objects.bulk_update(entregas, ['cep_origem', 'cep_destino'])
+        Entrega.objects.create(codigo_rastreio='SEMCEP', cliente=cliente, endereco_origem='A', cep_origem='1',
+                               endereco_destino='B', cep_destino='99999-999', capacidade_necessaria=1,
+                               valor_frete=1, rota=rota)
+
+        resultado = otimizar_rota(rota.id, tempo_limite=5)
+        self.assertEqual((resultado['paradas'], resultado['sem_coordenadas']), (len(self.PONTOS), 1))
+
+        dist = matriz_distancias(self.PONTOS)
+        self.assertLessEqual(resultado['km_total_estimado'], round(custo_rota(vizinho_mais_proximo(dist), dist)))
+        ordem = list(rota.entregas.order_by('ordem_parada').values_list('codigo_rastreio', flat=True))
+        self.assertEqual(ordem[-1], 'SEMCEP')
+        rota.refresh_from_db()
+        self.assertEqual(rota.km_total_estimado, resultado['km_total_estimado'])
+
+    def test_agendar_descarta_pedidos_repetidos(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            agendar_otimizacao(42)
+            agendar_otimizacao(42)
+        with mock.patch.object(roteirizacao._executor, 'submit') as submit:
+            for callback in callbacks:
+                callback()
+        self.addCleanup(roteirizacao._pendentes.discard, 42)
+        submit.assert_called_once_with(roteirizacao._executar_em_segundo_plano, 42, roteirizacao.TEMPO_LIMITE_PADRAO)
+
+
+class GeocodificacaoTest(TestCase):
+    """Normalização de CEP, índice por busca binária e o cache LRU das consultas"""
+
+    def setUp(self):
+        recarregar_indice()
+        self.addCleanup(recarregar_indice)
+
+    def test_normalizar_cep(self):
+        self.assertEqual(normalizar_cep('01310-100'), '01310100')
+        self.assertEqual(normalizar_cep(' 01.310-100 '), '01310100')
+        self.assertEqual(normalizar_cep(1310100), '01310100')  # zero à esquerda perdido na planilha
+        self.assertEqual(normalizar_cep('01310-100²'), '01310100')  # dígito Unicode é ignorado, não quebra o int()
+        for invalido in (None, '', 'sem cep', '123456789', '٠١٣١٠١٠٠'):
+            with self.subTest(invalido=invalido):
+                self.assertIsNone(normalizar_cep(invalido))
+
+    def test_indice_exato_e_prefixo_mais_proximo(self):
+        indice = IndiceCep([(1310100, -23.56, -46.65), (1310200, -23.57, -46.66), (4538133, -23.58, -46.67)])
+        self.assertEqual(len(indice), 3)
+        self.assertEqual(indice.consultar(1310100), (-23.56, -46.65))
+        self.assertEqual(indice.consultar(1310180), (-23.57, -46.66))  # mais perto de 01310-200
+        self.assertEqual(indice.consultar(1310001), (-23.56, -46.65))  # antes do primeiro do prefixo
+        self.assertEqual(indice.consultar(4538999), (-23.58, -46.67))  # depois do último
+        self.assertIsNone(indice.consultar(1311000))  # outro prefixo de 5 dígitos
+        self.assertIsNone(IndiceCep().consultar(1310100))
+
+    def test_consulta_em_cache_e_recarga(self):
+        carregar_ceps([(1310100, -23.56, -46.65)])
+        with self.assertNumQueries(1):
+            self.assertEqual(coordenadas_cep('01310-100'), (-23.56, -46.65))
+        with self.assertNumQueries(0):
+            self.assertEqual(coordenadas_cep('01310-100'), (-23.56, -46.65))
+            self.assertEqual(coordenadas_cep('01310-150'), (-23.56, -46.65))
+            self.assertIsNone(coordenadas_cep('inválido'))
+        self.assertGreater(coordenadas_cep.cache_info().hits, 0)
+
+        # carregar_ceps descarta o índice e o LRU: a próxima consulta já vê o valor novo
+        carregar_ceps([(1310100, -10.0, -40.0)])
+        self.assertEqual(coordenadas_cep('01310-100'), (-10.0, -40.0))
+
+    def test_geocodificar_entregas(self):
+        carregar_ceps([(1310100, -23.56, -46.65), (4538133, -23.58, -46.67)])
+        cliente = Cliente.objects.create(nome='Cliente', email='geo@teste.com', telefone='11')
+        entregas = criar_entregas(cliente, 2)
+        Entrega.objects.filter(pk=entregas[1].pk).update(cep_destino='99999-999')
+        self.assertEqual(geocodificar_entregas(), (2, 1))
+        entrega = Entrega.objects.get(pk=entregas[0].pk)
+        self.assertEqual((entrega.latitude_origem, entrega.latitude_destino), (-23.56, -23.58))
+
+    def test_cep_corrigido_e_refeito(self):
+        carregar_ceps([(1310100, -23.56, -46.65), (4538133, -23.58, -46.67), (20040020, -22.90, -43.17)])
+        cliente = Cliente.objects.create(nome='Cliente', email='geo2@teste.com', telefone='11')
+        primeira, segunda = criar_entregas(cliente, 2)
+        Entrega.objects.filter(pk=segunda.pk).update(cep_origem='99999-999')
+        geocodificar_entregas()
+
+        entrega = Entrega.objects.get(pk=primeira.pk)
+        entrega.cep_destino = '20040-020'
+        entrega.save()
+        entrega.refresh_from_db()
+        self.assertEqual((entrega.latitude_origem, entrega.latitude_destino), (-23.56, None))
+
+        # A origem que falhou é tentada de novo, mesmo com o destino já preenchido
+        Entrega.objects.filter(pk=segunda.pk).update(cep_origem='01310-100')
+        self.assertEqual(geocodificar_entregas(), (2, 0))
+        self.assertEqual(Entrega.objects.get(pk=primeira.pk).latitude_destino, -22.90)
+        self.assertEqual(Entrega.objects.get(pk=segunda.pk).latitude_origem, -23.56)
+
+
+class PaginacaoKeysetTest(TestCase):
+    """paginar_keyset percorre a listagem nos dois sentidos sem OFFSET"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin_keyset', password='senha', is_staff=True)
+        Group.objects.get_or_create(name='Administradores')[0].user_set.add(cls.admin)
+        cls.cliente = Cliente.objects.create(nome='Cliente', email='keyset@teste.com', telefone='11')
+        criar_entregas(cls.cliente, 23)
+        # Duas datas com várias entregas cada: dentro da data o desempate é pelo id
+        Entrega.objects.filter(pk__in=Entrega.objects.order_by('id').values('pk')[:12]).update(
+            data_solicitacao=date(2024, 6, 1))
+
+    def pagina(self, **parametros):
+        request = RequestFactory().get('/entregas/', parametros)
+        return paginar_keyset(request, Entrega.objects.all(), ('-data_solicitacao', '-id'), tamanho=5)
+
+    def test_percorre_nos_dois_sentidos(self):
+        esperado = list(Entrega.objects.order_by('-data_solicitacao', '-id').values_list('id', flat=True))
+        paginas = [self.pagina(status='pendente')]
+        self.assertEqual(paginas[0].querystring, 'status=pendente')
+        self.assertIsNone(paginas[0].anterior)
+        while paginas[-1].proximo:
+            with self.assertNumQueries(1):
+                paginas.append(self.pagina(cursor=paginas[-1].proximo))
+        self.assertEqual([e.id for pagina in paginas for e in pagina], esperado)
+        self.assertEqual([len(pagina) for pagina in paginas], [5, 5, 5, 5, 3])
+
+        voltando = self.pagina(cursor=paginas[-1].anterior)
+        self.assertEqual([e.id for e in voltando], [e.id for e in paginas[-2]])
+        self.assertTrue(voltando.tem_outras_paginas)
+
+    def test_cursor_invalido_volta_ao_inicio(self):
+        for cursor in ('lixo', 'eyJ2IjpbXSwiZCI6InAifQ', ''):
+            with self.subTest(cursor=cursor):
+                self.assertEqual([e.id for e in self.pagina(cursor=cursor)], [e.id for e in self.pagina()])
+
+    def test_filtros_invalidos_na_listagem(self):
+        self.client.force_login(self.admin)
+        for parametros in ({'cliente': '²'}, {'motorista': '-1'}, {'rota': '1.5'}, {'rota': 'sem'}):
+            with self.subTest(**parametros):
+                self.assertEqual(self.client.get(reverse('list_entrega'), parametros).status_code, 200)
+        resposta = self.client.get(reverse('list_entrega'), {'cliente': self.cliente.id})
+        self.assertEqual(resposta.context['filtros'], {'cliente': self.cliente.id})
+
+    def test_filtros_limitam_as_opcoes(self):
+        Cliente.objects.bulk_create([Cliente(nome=f'Z {i:03d}', email=f'z{i}@teste.com', telefone='11')
+                                     for i in range(LIMITE_OPCOES_FILTRO + 5)])
+        ultimo = Cliente.objects.order_by('-nome').first()
+        self.client.force_login(self.admin)
+        resposta = self.client.get(reverse('list_entrega'), {'cliente': ultimo.id})
+        clientes = resposta.context['clientes']
+        # As primeiras em ordem de nome e a selecionada, que ficou de fora do limite
+        self.assertEqual(len(clientes), LIMITE_OPCOES_FILTRO + 1)
+        self.assertEqual(clientes[-1], {'id': ultimo.id, 'nome': ultimo.nome})
+
+    def test_motorista_so_ve_as_proprias_opcoes(self):
+        usuario = User.objects.create_user('motorista_keyset', password='senha')
+        motorista = Motorista.objects.create(nome='Keyset', cpf='060.000.000-00', cnh='B', telefone='11',
+                                             user=usuario)
+        outro = Motorista.objects.create(nome='Outro', cpf='061.000.000-00', cnh='B', telefone='11')
+        veiculo = Veiculo.objects.create(placa='KEY0001', modelo='Van', tipo='van', capacidade_maxima=50)
+        propria = Rota.objects.create(nome='Própria', motorista=motorista, veiculo=veiculo, data_rota=date(2024, 6, 1))
+        Rota.objects.create(nome='Alheia', motorista=outro, veiculo=veiculo, data_rota=date(2024, 6, 2))
+        proprio = Cliente.objects.create(nome='Do motorista', email='keyset2@teste.com', telefone='11')
+        Entrega.objects.filter(pk=Entrega.objects.order_by('id').first().pk).update(cliente=proprio,
+                                                                                motorista=motorista)
+
+        self.client.force_login(usuario)
+        resposta = self.client.get(reverse('list_entrega'))
+        self.assertEqual(resposta.context['rotas'], [{'id': propria.id, 'nome': propria.nome}])
+        self.assertEqual(resposta.context['clientes'], [{'id': proprio.id, 'nome': proprio.nome}])
+
+
+class ImportacaoTest(TestCase):
+    """Upload de entregas e clientes: linhas válidas, recusadas e arquivos malformados"""
+
+    CABECALHO = 'codigo_rastreio,cliente_email,endereco_origem,cep_origem,endereco_destino,cep_destino,' \
+                'capacidade_necessaria,valor_frete\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin_importacao', password='senha', is_staff=True)
+        cls.cliente = Cliente.objects.create(nome='Cliente', email='importa@teste.com', telefone='11')
+        criar_entregas(cls.cliente, 1)  # TST000000 já existe
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    def linha(self, codigo, email='importa@teste.com', capacidade='10'):
+        return f'{codigo},{email},Rua A,1310100,Rua B,04538-133,{capacidade},50\n'
+
+    def enviar(self, conteudo, nome='entregas.csv', recurso='entregas'):
+        if isinstance(conteudo, str):
+            conteudo = conteudo.encode()
+        arquivo = SimpleUploadedFile(nome, conteudo)
+        return self.api.post(f'/api/{recurso}/importar/', {'arquivo': arquivo}, format='multipart')
+
+    def test_linhas_validas_e_recusadas(self):
+        conteudo = (self.CABECALHO + self.linha('imp001') + self.linha('TST000000') + self.linha('IMP001')
+                    + self.linha('IMP002', email='nao@existe.com') + self.linha('IMP003', capacidade='0'))
+        resposta = self.enviar(conteudo)
+        self.assertEqual(resposta.status_code, 200)
+        resumo = resposta.json()
+        self.assertEqual((resumo['lidas'], resumo['importadas'], resumo['rejeitadas']), (5, 1, 4))
+        self.assertEqual([r['linha'] for r in resumo['rejeitados']], [3, 4, 5, 6])
+        self.assertIn('codigo_rastreio', resumo['rejeitados'][0]['erros'])
+        self.assertIn('cliente_email', resumo['rejeitados'][2]['erros'])
+        self.assertIn('capacidade_necessaria', resumo['rejeitados'][3]['erros'])
+
+        entrega = Entrega.objects.get(codigo_rastreio='IMP001')
+        self.assertEqual((entrega.cep_origem, entrega.cliente_id), ('01310-100', self.cliente.id))
+        self.assertEqual(EntregaEvento.objects.filter(entrega=entrega).count(), 1)
+
+    def test_csv_malformado_recusa_a_linha(self):
+        # Campo acima de csv.field_size_limit(): o leitor levanta csv.Error nessa linha
+        conteudo = self.CABECALHO + self.linha('IMP001') + 'IMP002,"' + 'x' * 200000 + '"\n' + self.linha('IMP003')
+        resposta = self.enviar(conteudo)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual((resposta.json()['importadas'], resposta.json()['rejeitadas']), (2, 1))
+        self.assertIn('CSV inválido', resposta.json()['rejeitados'][0]['erros']['registro'][0])
+
+    def test_ndjson_e_arquivo_invalido(self):
+        conteudo = '{"nome": "Novo", "email": "novo@teste.com", "telefone": "11"}\n{quebrado\n[1]\n'
+        resumo = self.enviar(conteudo, 'clientes.ndjson', 'clientes').json()
+        self.assertEqual((resumo['importadas'], resumo['rejeitadas']), (1, 2))
+        self.assertEqual(self.enviar(b'\xff\xfe\x00lixo').status_code, 400)
+        self.assertEqual(self.enviar(b'nao e gzip', 'entregas.csv.gz').status_code, 400)
+        self.assertEqual(self.api.post('/api/entregas/importar/', {}, format='multipart').status_code, 400)
+
+    def test_gzip(self):
+        conteudo = gzip.compress((self.CABECALHO + self.linha('IMP001') + self.linha('IMP002')).encode())
+        resposta = self.enviar(conteudo, 'entregas.csv.gz')
+        self.assertEqual(resposta.json()['importadas'], 2)
+
+    def test_codigo_gravado_por_outra_importacao(self):
+        validar_original = importacao.validar_entregas
+
+        def validar_e_concorrer(itens):
+            # Outra importação grava IMP002 depois da validação deste chunk
+            resultado = validar_original(itens)
+            Entrega.objects.create(codigo_rastreio='IMP002', cliente=self.cliente, endereco_origem='A',
+                                   cep_origem='1', endereco_destino='B', cep_destino='2',
+                                   capacidade_necessaria=1, valor_frete=1)
+            return resultado
+
+        conteudo = self.CABECALHO + self.linha('IMP001') + self.linha('IMP002') + self.linha('IMP003')
+        with mock.patch('logistica.importacao.validar_entregas', validar_e_concorrer):
+            resposta = self.enviar(conteudo)
+        self.assertEqual(resposta.status_code, 200)
+        resumo = resposta.json()
+        self.assertEqual((resumo['importadas'], resumo['rejeitadas']), (2, 1))
+        self.assertEqual(resumo['rejeitados'][0]['linha'], 3)
+        self.assertEqual(Entrega.objects.filter(codigo_rastreio__startswith='IMP').count(), 3)
+
+
+class ExportacaoTest(TestCase):
+    """Exportação -> leitura devolve os mesmos valores em cada formato, com nulos, decimais e datas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin_exportacao', password='senha', is_staff=True)
+        cliente = Cliente.objects.create(nome='Cliente', email='exporta@teste.com', telefone='11')
+        motorista = Motorista.objects.create(nome='Exporta', cpf='060.000.000-00', cnh='B', telefone='11')
+        veiculo = Veiculo.objects.create(placa='EXP0001', modelo='Van', tipo='van', capacidade_maxima=500)
+        rota = Rota.objects.create(nome='Rota "aspas", vírgula', motorista=motorista, veiculo=veiculo,
+                                   data_rota=date(2024, 2, 29))
+        entregas = criar_entregas(cliente, 5)
+        Entrega.objects.filter(pk=entregas[0].pk).update(
+            valor_frete=Decimal('1234.56'), capacidade_necessaria=0.125, motorista=motorista, rota=rota,
+            data_entrega_prevista=date(2024, 3, 1), data_entrega_real=date(1970, 1, 1), ordem_parada=1)
+        Entrega.objects.filter(pk=entregas[1].pk).update(valor_frete=Decimal('0.01'), status='em_transito')
+        recalcular_totais_rotas()
+
+    def esperado(self, tipo):
+        modelo = Entrega if tipo == 'entrega' else Rota
+        nomes = [nome for nome, _ in COLUNAS[tipo]]
+        return [dict(zip(nomes, linha)) for linha in modelo.objects.order_by('id').values_list(*nomes)]
+
+    def exportar(self, tipo, formato):
+        modelo = Entrega if tipo == 'entrega' else Rota
+        # Chunks de 2 linhas: vários blocos no CSV e no colunar
+        return exportar(modelo.objects.all(), tipo, formato, tamanho_chunk=2)
+
+    def test_colunar_ida_e_volta(self):
+        for tipo in COLUNAS:
+            with self.subTest(tipo=tipo):
+                conteudo = b''.join(self.exportar(tipo, 'colunar'))
+                self.assertEqual(list(ler_colunar(io.BytesIO(conteudo))), self.esperado(tipo))
+        with self.assertRaises(ValueError):
+            list(ler_colunar(io.BytesIO(b'CSV,')))
+
+    def test_csv_e_ndjson_ida_e_volta(self):
+        for tipo in COLUNAS:
+            # Texto: nulo vira vazio no CSV e null no NDJSON; decimais e datas vão como texto
+            texto = [{nome: '' if valor is None else str(valor) for nome, valor in linha.items()}
+                     for linha in self.esperado(tipo)]
+            with self.subTest(tipo=tipo, formato='csv'):
+                lidas = list(csv.DictReader(io.StringIO(''.join(self.exportar(tipo, 'csv')))))
+                self.assertEqual(lidas, texto)
+            with self.subTest(tipo=tipo, formato='ndjson'):
+                lidas = [json.loads(linha) for linha in ''.join(self.exportar(tipo, 'ndjson')).splitlines()]
+                normalizadas = [{nome: '' if valor is None else str(valor) for nome, valor in linha.items()}
+                                for linha in lidas]
+                self.assertEqual(normalizadas, texto)
+                if tipo == 'entrega':
+                    self.assertIsNone(lidas[-1]['data_entrega_real'])  # null, não a string "None"
+
+    def test_endpoint_em_streaming(self):
+        api = APIClient()
+        api.force_authenticate(self.admin)
+        resposta = api.get('/api/entregas/exportar/?formato=colunar&status=em_transito')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.streaming)
+        self.assertEqual(resposta['Content-Disposition'], 'attachment; filename="entregas.logc"')
+        linhas = list(ler_colunar(io.BytesIO(b''.join(resposta.streaming_content))))
+        self.assertEqual([linha['valor_frete'] for linha in linhas], [Decimal('0.01')])
+
+        resposta = api.get('/api/rotas/exportar/?formato=csv')
+        self.assertEqual(resposta['Content-Type'], CONTENT_TYPES['csv'])
+        lidas = list(csv.DictReader(io.StringIO(b''.join(resposta.streaming_content).decode())))
+        self.assertEqual(lidas[0]['nome'], 'Rota "aspas", vírgula')
+        self.assertEqual(api.get('/api/rotas/exportar/?formato=xml').status_code, 400)
+
+
+class MotoristaFormTest(TestCase):
+    """Salvar o MotoristaForm cria o motorista e, marcado criar_usuario, o acesso dele"""
+
+    DADOS = {'nome': 'Novo Motorista', 'cpf': '070.000.000-00', 'cnh': 'B', 'telefone': '11',
+             'status': 'disponivel'}
+
+    def test_cria_motorista_com_usuario(self):
+        form = MotoristaForm(dict(self.DADOS, criar_usuario='on', email='novo@teste.com'))
+        self.assertTrue(form.is_valid(), form.errors)
+        with self.assertLogs('logistica.forms', 'INFO'):
+            motorista = form.save()
+        self.assertEqual(motorista.user.username, '07000000000')
+        self.assertEqual(motorista.user.email, 'novo@teste.com')
+        self.assertTrue(motorista.user.check_password(form.senha_gerada))
+        self.assertTrue(motorista.user.groups.filter(name='Motoristas').exists())
+
+    def test_sem_usuario_e_erro_ao_criar(self):
+        motorista = MotoristaForm(self.DADOS).save()
+        self.assertIsNone(motorista.user)
+
+        form = MotoristaForm(dict(self.DADOS, criar_usuario='on'), instance=motorista)
+        self.assertTrue(form.is_valid(), form.errors)
+        with mock.patch.object(Motorista, 'criar_usuario', side_effect=RuntimeError('falhou')), \
+                self.assertLogs('logistica.forms', 'WARNING'):
+            form.save()  # sem request no form: só registra o erro
+        self.assertTrue(Motorista.objects.filter(pk=motorista.pk, user__isnull=True).exists())
+
+
+class ApiPaginacaoTest(TestCase):
+    """A API pagina por cursor e o número de consultas não depende do tamanho da página"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin_api', password='senha', is_staff=True)
+        cls.cliente = Cliente.objects.create(nome='Cliente', email='cliente@teste.com', telefone='11999999999')
+        motorista = Motorista.objects.create(nome='Motorista', cpf='123.456.789-00', cnh='B', telefone='11988888888')
+        veiculo = Veiculo.objects.create(placa='ABC1D23', modelo='Van', tipo='van', capacidade_maxima=5000)
+        cls.rota = Rota.objects.create(nome='Rota 1', motorista=motorista, veiculo=veiculo, data_rota=date.today())
+        criar_entregas(cls.cliente, 60)
+        Entrega.objects.filter(pk__in=Entrega.objects.order_by('id').values('pk')[:20]).update(
+            status='entregue', rota=cls.rota)
+        Rota.objects.bulk_create([
+            Rota(nome=f'Rota {i}', motorista=motorista, veiculo=veiculo, data_rota=date(2024, 1, 1 + i % 28))
+            for i in range(2, 40)
+        ])
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    def contar_consultas(self, url):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.api.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        return len(consultas), resposta.json()
+
+    def test_consultas_constantes_por_tamanho_de_pagina(self):
+        for recurso in ('clientes', 'motoristas', 'veiculos', 'entregas', 'rotas'):
+            with self.subTest(recurso=recurso):
+                pequena, _ = self.contar_consultas(f'/api/{recurso}/?page_size=2')
+                grande, _ = self.contar_consultas(f'/api/{recurso}/?page_size=50')
+                self.assertEqual(pequena, grande)
+
+    def test_percorre_todas_as_entregas_pelo_cursor(self):
+        url = '/api/entregas/?page_size=25'
+        ids = []
+        while url:
+            resposta = self.api.get(url).json()
+            self.assertLessEqual(len(resposta['results']), 25)
+            ids += [e['id'] for e in resposta['results']]
+            url = resposta['next']
+        self.assertEqual(len(ids), 60)
+        self.assertEqual(len(set(ids)), 60)
+
+    def test_cursor_por_chave_com_datas_repetidas(self):
+        # As 60 entregas têm a mesma data_solicitacao e 20 rotas caem em 2024-01-01..01-28 repetidas
+        for recurso, total in (('entregas', 60), ('rotas', 39)):
+            with self.subTest(recurso=recurso):
+                url = f'/api/{recurso}/?page_size=7'
+                ids = []
+                with CaptureQueriesContext(connection) as consultas:
+                    while url:
+                        resposta = self.api.get(url).json()
+                        ids += [item['id'] for item in resposta['results']]
+                        anterior, url = resposta['previous'], resposta['next']
+                self.assertEqual(len(ids), total)
+                self.assertEqual(len(set(ids)), total)
+                self.assertFalse([c['sql'] for c in consultas if 'OFFSET' in c['sql']])
+
+                # A anterior da última página é a penúltima
+                voltando = self.api.get(anterior).json()
+                self.assertEqual([item['id'] for item in voltando['results']], ids[-7 - total % 7:-(total % 7)])
+
+    def test_filtros(self):
+        _, dados = self.contar_consultas('/api/entregas/?status=entregue&page_size=100')
+        self.assertEqual(len(dados['results']), 20)
+        _, dados = self.contar_consultas('/api/entregas/?rota__isnull=true&page_size=100')
+        self.assertEqual(len(dados['results']), 40)
+        _, dados = self.contar_consultas(f'/api/entregas/?rota={self.rota.id}&status__in=pendente,entregue')
+        self.assertEqual(len(dados['results']), 20)
+        _, dados = self.contar_consultas('/api/rotas/?data_rota__gte=2024-01-01&data_rota__lte=2024-01-31')
+        self.assertEqual(len(dados['results']), 38)
+
+
+class ApiLoteEntregasTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin_lote', password='senha', is_staff=True)
+        cls.cliente = Cliente.objects.create(nome='Cliente', email='lote@teste.com', telefone='11999999999')
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    def item(self, codigo, **extra):
+        return dict({
+            'codigo_rastreio': codigo,
+            'cliente': self.cliente.id,
+            'endereco_origem': 'Rua A, 1',
+            'cep_origem': '01310-100',
+            'endereco_destino': 'Rua B, 2',
+            'cep_destino': '04538-133',
+            'capacidade_necessaria': 5,
+            'valor_frete': '30.00',
+        }, **extra)
+
+    def test_cria_validos_e_devolve_erros_por_item(self):
+        itens = [self.item(f'lt{i}') for i in range(10)]
+        itens[3]['capacidade_necessaria'] = 0
+        itens[4]['codigo_rastreio'] = 'LT5'
+        itens[7]['cliente'] = 0
+
+        resposta = self.api.post('/api/entregas/lote/', {'entregas': itens}, format='json')
+
+        self.assertEqual(resposta.status_code, 201)
+        dados = resposta.json()
+        self.assertEqual([erro['indice'] for erro in dados['erros']], [3, 5, 7])
+        self.assertEqual(len(dados['criadas']), 7)
+        self.assertTrue(Entrega.objects.filter(codigo_rastreio='LT0').exists())
+
+    def test_consultas_nao_crescem_com_o_lote(self):
+        with CaptureQueriesContext(connection) as pequeno:
+            self.api.post('/api/entregas/lote/', {'entregas': [self.item(f'p{i}') for i in range(5)]}, format='json')
+        with CaptureQueriesContext(connection) as grande:
+            self.api.post('/api/entregas/lote/', {'entregas': [self.item(f'g{i}') for i in range(40)]}, format='json')
+        self.assertEqual(len(pequeno), len(grande))
+
+    def test_status_em_lote(self):
+        criadas = criar_entregas(self.cliente, 3)
+        ids = [e.id for e in criadas]
+        resposta = self.api.post('/api/entregas/lote/status/', {'entregas': ids + [0], 'status': 'entregue'},
+                                 format='json')
+        self.assertEqual(resposta.json(), {'atualizadas': 3, 'nao_encontradas': [0]})
+        self.assertFalse(Entrega.objects.filter(pk__in=ids, data_entrega_real__isnull=True).exists())
+
+
+class IdentidadeTest(TestCase):
+    """A identidade (motorista, perfil e grupos) é resolvida uma vez e guardada na sessão"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('motorista_id', password='senha')
+        cls.motorista = Motorista.objects.create(
+            nome='Motorista', cpf='987.654.321-00', cnh='B', telefone='11977777777', user=cls.user)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def consultas_de_identidade(self, url='/entregas/'):
+        with CaptureQueriesContext(connection) as consultas:
+            resposta = self.client.get(url)
+        self.assertEqual(resposta.status_code, 200)
+        return [
+            q['sql'] for q in consultas
+            if 'auth_user_groups' in q['sql'] or 'logistica_perfilusuario' in q['sql']
+        ]
+
+    def test_corrige_perfil_e_grupo_e_depois_nao_consulta(self):
+        self.client.get('/entregas/')
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.perfil.motorista, self.motorista)
+        self.assertTrue(self.user.groups.filter(name='Motoristas').exists())
+
+        self.consultas_de_identidade()
+        self.assertEqual(self.consultas_de_identidade(), [])
+        self.assertIn('_logistica_perfil_verificado', self.client.session)
+
+    def test_sessao_verificada_nao_consulta_nada(self):
+        self.client.get('/entregas/')
+        self.client.get('/logout/')
+        self.client.force_login(self.user)
+        self.client.get('/buscar_entrega/')
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get('/buscar_entrega/')
+        # Sessão, usuário e o motorista usado no menu; nada de perfil ou grupos
+        self.assertEqual(len(consultas), 3, [q['sql'] for q in consultas])
+
+    def test_mudanca_de_grupo_invalida_a_sessao(self):
+        self.client.get('/entregas/')
+        self.consultas_de_identidade()
+        self.user.groups.add(Group.objects.create(name='Supervisores'))
+
+        self.assertEqual(len(self.consultas_de_identidade()), 1)
+        self.assertEqual(self.client.session['_logistica_identidade']['grupos'], ['Motoristas', 'Supervisores'])
+
+    def test_invalidacao_em_outro_processo_vence_pelo_ttl(self):
+        self.client.get('/entregas/')
+        self.consultas_de_identidade()
+        # A mudança acontece em outro worker, com o próprio LocMemCache
+        with mock.patch('logistica.identidade.cache', LocMemCache('outro-processo', {})):
+            self.user.groups.add(Group.objects.create(name='Supervisores'))
+
+        # Este processo não viu a nova versão: a sessão vale até o TTL
+        self.assertEqual(self.consultas_de_identidade(), [])
+        with mock.patch('logistica.identidade.time.time', return_value=time.time() + IDENTIDADE_TTL + 1):
+            self.assertEqual(len(self.consultas_de_identidade()), 1)
+        self.assertEqual(self.client.session['_logistica_identidade']['grupos'], ['Motoristas', 'Supervisores'])
+
+
+class CredenciamentoTest(TestCase):
+    """Credenciamento em lote: usuários, perfis e grupo com consultas constantes e CSV para download"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin_cred', password='senha', is_staff=True)
+        User.objects.create_user('11122233311', password='senha')
+        Group.objects.create(name='Motoristas')
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    def motoristas(self, quantidade, inicio=0):
+        return Motorista.objects.bulk_create([
+            Motorista(nome=f'Motorista Cred {i}', cpf=f'{i:03d}.222.333-{i % 100:02d}', cnh='B', telefone='11')
+            for i in range(inicio, inicio + quantidade)
+        ])
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_api_devolve_csv_e_vincula_perfil_e_grupo(self):
+        novos = self.motoristas(2, inicio=111)
+        com_usuario = Motorista.objects.create(nome='Já Tem', cpf='999.999.999-99', cnh='B', telefone='11',
+                                               user=User.objects.create_user('ja_tem'))
+        ids = [m.id for m in novos] + [com_usuario.id]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resposta = self.api.post('/api/motoristas/credenciar/', {'motoristas': ids}, format='json')
+
+        self.assertEqual(resposta.status_code, 201)
+        self.assertIn('attachment', resposta['Content-Disposition'])
+        self.assertEqual(resposta['X-Motoristas-Ignorados'], str(com_usuario.id))
+        linhas = resposta.content.decode().splitlines()
+        self.assertEqual(linhas[0], 'motorista_id,nome,cpf,username,senha')
+        self.assertEqual(len(linhas), 3)
+
+        # O CPF 111.222.333-11 já é username de outro usuário: ganha o id do motorista
+        _, _, _, username, senha = linhas[1].split(',')
+        self.assertEqual(username, f'11122233311_{novos[0].id}')
+        usuario = User.objects.select_related('perfil', 'motorista_profile').get(username=username)
+        self.assertTrue(check_password(senha, usuario.password))
+        self.assertEqual(usuario.motorista_profile, novos[0])
+        self.assertEqual(usuario.perfil.motorista, novos[0])
+        self.assertEqual(usuario.perfil.tipo_usuario, 'motorista')
+        self.assertEqual(list(usuario.groups.values_list('name', flat=True)), ['Motoristas'])
+        self.assertEqual(usuario.first_name, 'Motorista')
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_consultas_nao_crescem_com_o_lote(self):
+        pequeno_ids = [m.id for m in self.motoristas(2)]
+        grande_ids = [m.id for m in self.motoristas(20, inicio=2)]
+        with CaptureQueriesContext(connection) as pequeno:
+            self.api.post('/api/motoristas/credenciar/', {'motoristas': pequeno_ids}, format='json')
+        with CaptureQueriesContext(connection) as grande:
+            self.api.post('/api/motoristas/credenciar/', {'motoristas': grande_ids}, format='json')
+        self.assertEqual(len(pequeno), len(grande))
+        self.assertEqual(Motorista.objects.filter(user__isnull=True).count(), 0)
+
+    def test_hashes_no_pool_de_processos(self):
+        senhas = ['1234@Motorista', '1234@Motorista', '9876@Motorista']
+        with mock.patch('logistica.credenciamento.MINIMO_PARA_POOL', 2):
+            hashes = gerar_hashes(senhas, processos=2)
+        # Cada hash tem o próprio salt, mesmo com senhas iguais
+        self.assertEqual(len(set(hashes)), 3)
+        self.assertTrue(all(check_password(senha, h) for senha, h in zip(senhas, hashes)))
+
+
+class RastreiaAlteracoesTest(TestCase):
+    """save() grava só os campos alterados e os receivers pulam o que não mudou"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('motorista_dirty', first_name='Ana', last_name='Silva')
+        cls.motorista = Motorista.objects.create(
+            nome='Ana Silva', cpf='555.444.333-22', cnh='B', telefone='11966666666', user=cls.user)
+        cls.veiculo = Veiculo.objects.create(placa='DRT0001', modelo='Van', tipo='van', capacidade_maxima=100)
+        cls.rota = Rota.objects.create(nome='Rota', motorista=cls.motorista, veiculo=cls.veiculo,
+                                       data_rota=date(2024, 6, 1))
+
+    def escritas(self, funcao):
+        with CaptureQueriesContext(connection) as consultas:
+            funcao()
+        return [q['sql'] for q in consultas if q['sql'].startswith(('UPDATE', 'INSERT'))]
+
+    def test_mudanca_de_status_grava_uma_coluna_e_nao_toca_no_usuario(self):
+        motorista = Motorista.objects.get(pk=self.motorista.pk)
+        motorista.status = 'em_rota'
+        escritas = self.escritas(motorista.save)
+        self.assertEqual(len(escritas), 1, escritas)
+        self.assertIn('"status"', escritas[0])
+        self.assertNotIn('"nome"', escritas[0])
+
+    def test_sem_alteracao_nao_grava(self):
+        motorista = Motorista.objects.get(pk=self.motorista.pk)
+        self.assertEqual(self.escritas(motorista.save), [])
+
+    def test_mudanca_de_nome_atualiza_so_o_nome_do_usuario(self):
+        motorista = Motorista.objects.get(pk=self.motorista.pk)
+        motorista.nome = 'Ana Souza'
+        escritas = self.escritas(motorista.save)
+        self.assertEqual(len(escritas), 2, escritas)
+        self.assertIn('"last_name"', escritas[1])
+        self.assertNotIn('"first_name"', escritas[1])
+        self.assertEqual(User.objects.get(pk=self.user.pk).last_name, 'Souza')
+
+    def test_salvar_rota_nao_sobrescreve_totais(self):
+        rota = Rota.objects.get(pk=self.rota.pk)
+        cliente = Cliente.objects.create(nome='Cliente', email='dirty@teste.com', telefone='11')
+        criar_entregas(cliente, 2, rota=self.rota)
+        recalcular_totais_rotas(Rota.objects.filter(pk=self.rota.pk))
+
+        # A instância carregada antes ainda tem total_entregas=0
+        rota.status = 'em_andamento'
+        rota.save()
+        self.assertEqual(Rota.objects.get(pk=self.rota.pk).total_entregas, 2)
+
+
+class ReconciliacaoGruposTest(TestCase):
+    """Associações ao grupo Motoristas calculadas por anti-join e gravadas de uma vez"""
+
+    def test_adiciona_so_quem_falta_com_consultas_constantes(self):
+        grupo = Group.objects.create(name='Motoristas')
+        usuarios = User.objects.bulk_create([User(username=f'rec{i}') for i in range(30)])
+        Motorista.objects.bulk_create([
+            Motorista(nome=f'Rec {i}', cpf=f'777.000.{i:03d}-00', cnh='B', telefone='11', user=usuario)
+            for i, usuario in enumerate(usuarios)
+        ])
+        grupo.user_set.add(*usuarios[:10])
+
+        simulado = reconciliar_grupo_motoristas(simular=True)
+        self.assertEqual(len(simulado['adicionados']), 20)
+        self.assertEqual(grupo.user_set.count(), 10)
+
+        with CaptureQueriesContext(connection) as consultas:
+            relatorio = reconciliar_grupo_motoristas()
+        self.assertLessEqual(len(consultas), 8)
+        self.assertEqual((relatorio['com_usuario'], relatorio['ja_no_grupo'], relatorio['total_no_grupo']),
+                         (30, 10, 30))
+        self.assertEqual(sorted(relatorio['adicionados']), sorted(u.username for u in usuarios[10:]))
+        self.assertEqual(reconciliar_grupo_motoristas()['adicionados'], [])
+
+
+class CicloRotasTest(TestCase):
+    """Transições de rotas em lote com UPDATEs por conjunto"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nome='Cliente', email='ciclo@teste.com', telefone='11')
+
+    def rotas(self, quantidade):
+        indices = range(Motorista.objects.count(), Motorista.objects.count() + quantidade)
+        motoristas = Motorista.objects.bulk_create([
+            Motorista(nome=f'Ciclo {i}', cpf=f'888.{i:03d}.000-00', cnh='B', telefone='11') for i in indices
+        ])
+        veiculos = Veiculo.objects.bulk_create([
+            Veiculo(placa=f'CIC{i:04d}', modelo='Van', tipo='van', capacidade_maxima=500) for i in indices
+        ])
+        rotas = Rota.objects.bulk_create([
+            Rota(nome=f'Rota {i}', motorista=m, veiculo=v, data_rota=date(2024, 6, 1))
+            for i, (m, v) in enumerate(zip(motoristas, veiculos))
+        ])
+        Entrega.objects.bulk_create([
+            Entrega(codigo_rastreio=f'CIC{r.id:04d}{j}', cliente=self.cliente, endereco_origem='A', cep_origem='1',
+                    endereco_destino='B', cep_destino='2', capacidade_necessaria=10, valor_frete=20, rota=r,
+                    motorista=r.motorista, ordem_parada=j + 1)
+            for r in rotas for j in range(3)
+        ])
+        recalcular_totais_rotas(Rota.objects.filter(pk__in=[r.id for r in rotas]))
+        return rotas
+
+    def test_iniciar_e_concluir_o_dia(self):
+        rotas = self.rotas(4)
+        iniciar_rotas(Rota.objects.filter(data_rota=date(2024, 6, 1)))
+        self.assertEqual(Entrega.objects.filter(status='em_transito').count(), 12)
+        self.assertEqual(set(Veiculo.objects.values_list('status', flat=True)), {'em_uso'})
+        self.assertEqual(set(Motorista.objects.values_list('status', flat=True)), {'em_rota'})
+
+        # Uma entrega não saiu: volta para a fila na conclusão
+        Entrega.objects.filter(codigo_rastreio=f'CIC{rotas[0].id:04d}0').update(status='pendente')
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = concluir_rotas([r.id for r in rotas], data=date(2024, 6, 2))
+
+        self.assertEqual((resultado['rotas'], resultado['entregas'], resultado['desvinculadas']), (4, 11, 1))
+        self.assertEqual(Entrega.objects.filter(status='entregue', data_entrega_real=date(2024, 6, 2)).count(), 11)
+        self.assertEqual(Rota.objects.get(pk=rotas[0].id).total_entregas, 2)
+        self.assertEqual(set(Veiculo.objects.values_list('status', flat=True)), {'disponivel'})
+        self.assertEqual(concluir_rotas([rotas[0].id])['ignoradas'], [rotas[0].id])
+
+    def test_consultas_nao_crescem_com_o_lote(self):
+        pequeno = [r.id for r in self.rotas(2)]
+        grande = [r.id for r in self.rotas(30)]
+        for transicao in (iniciar_rotas, cancelar_rotas):
+            with CaptureQueriesContext(connection) as consultas_pequeno:
+                transicao(pequeno)
+            with CaptureQueriesContext(connection) as consultas_grande:
+                transicao(grande)
+            self.assertEqual(len(consultas_pequeno), len(consultas_grande))
+        self.assertFalse(Entrega.objects.filter(rota__isnull=False).exists())
+        self.assertEqual(set(Entrega.objects.values_list('status', flat=True)), {'pendente'})
+
+    def test_deletar_libera_entregas_e_recursos(self):
+        rota, outra = self.rotas(2)
+        iniciar_rotas([rota.id, outra.id])
+        Rota.objects.filter(pk=outra.id).update(veiculo=rota.veiculo)
+
+        resultado = deletar_rotas([rota.id])
+        self.assertEqual(resultado['rotas'], 1)
+        self.assertEqual(Entrega.objects.filter(rota__isnull=True, status='pendente').count(), 3)
+        # O veículo segue em uso pela outra rota em andamento; o motorista é liberado
+        self.assertEqual(Veiculo.objects.get(pk=rota.veiculo_id).status, 'em_uso')
+        self.assertEqual(Motorista.objects.get(pk=rota.motorista_id).status, 'disponivel')
+
+    def test_api_passa_pelo_ciclo_de_vida(self):
+        rota, outra = self.rotas(2)
+        iniciar_rotas([rota.id, outra.id])
+        api = APIClient()
+        api.force_authenticate(User.objects.create_user('ciclo_api', password='x', is_staff=True))
+
+        resposta = api.patch(f'/api/rotas/{rota.id}/', {'status': 'concluida', 'nome': 'Concluída'}, format='json')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual((resposta.json()['status'], resposta.json()['nome']), ('concluida', 'Concluída'))
+        self.assertEqual(Entrega.objects.filter(rota=rota, status='entregue').count(), 3)
+        self.assertEqual(Motorista.objects.get(pk=rota.motorista_id).status, 'disponivel')
+        self.assertEqual(EntregaEvento.objects.filter(entrega__rota=rota, status='entregue').count(), 3)
+
+        resposta = api.patch(f'/api/rotas/{rota.id}/', {'status': 'em_andamento'}, format='json')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertEqual(Rota.objects.get(pk=rota.id).status, 'concluida')
+
+        self.assertEqual(api.delete(f'/api/rotas/{outra.id}/').status_code, 204)
+        self.assertEqual(Entrega.objects.filter(rota__isnull=True, status='pendente').count(), 3)
+        self.assertEqual(Veiculo.objects.get(pk=outra.veiculo_id).status, 'disponivel')
+
+
+class RastreamentoTest(TestCase):
+    """Rastreamento público servido do cache, com ETag e cache negativo"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nome='Cliente', email='rastreio@teste.com', telefone='11')
+        cls.entrega = criar_entregas(cls.cliente, 1)[0]
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('rastreio_entrega_json', args=[self.entrega.codigo_rastreio])
+
+    def test_cache_quente_nao_consulta_o_banco(self):
+        self.client.get(self.url)
+        for url in (self.url, reverse('rastreio_entrega', args=[self.entrega.codigo_rastreio])):
+            with self.assertNumQueries(0):
+                resposta = self.client.get(url)
+            self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(self.client.get(self.url).json()['status'], 'pendente')
+
+    def test_etag_devolve_304(self):
+        resposta = self.client.get(self.url)
+        self.assertIn('Last-Modified', resposta)
+        self.assertIn('public', resposta['Cache-Control'])
+        repetida = self.client.get(self.url, HTTP_IF_NONE_MATCH=resposta['ETag'])
+        self.assertEqual(repetida.status_code, 304)
+
+    def test_mudanca_de_status_invalida(self):
+        etag = self.client.get(self.url)['ETag']
+        entrega = Entrega.objects.get(pk=self.entrega.pk)
+        entrega.status = 'em_transito'
+        entrega.save()
+        resposta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['status'], 'em_transito')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            alterar_status([self.entrega.pk], 'entregue')
+        self.assertEqual(self.client.get(self.url).json()['status'], 'entregue')
+
+    def test_codigo_desconhecido_fica_no_cache_negativo(self):
+        url = reverse('rastreio_entrega_json', args=['NAOEXISTE'])
+        self.assertEqual(self.client.get(url).status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+        Entrega.objects.create(codigo_rastreio='NAOEXISTE', cliente=self.cliente, endereco_origem='A',
+                               cep_origem='1', endereco_destino='B', cep_destino='2', capacidade_necessaria=1,
+                               valor_frete=1)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_invalidacao_em_outro_processo_vence_pelo_max_age(self):
+        processo, outro = LocMemCache('processo', {}), LocMemCache('outro-processo', {})
+        with mock.patch('logistica.rastreamento.cache', processo):
+            self.assertEqual(self.client.get(self.url).json()['status'], 'pendente')
+        # O status muda em outro worker, que invalida só o próprio cache
+        with mock.patch('logistica.rastreamento.cache', outro):
+            entrega = Entrega.objects.get(pk=self.entrega.pk)
+            entrega.status = 'em_transito'
+            entrega.save()
+
+        with mock.patch('logistica.rastreamento.cache', processo):
+            self.assertEqual(self.client.get(self.url).json()['status'], 'pendente')
+            with mock.patch('time.time', return_value=time.time() + RASTREIO_MAX_AGE + 1):
+                self.assertEqual(self.client.get(self.url).json()['status'], 'em_transito')
+
+    def test_ttl_longo_so_com_cache_compartilhado(self):
+        self.assertEqual(rastreamento._timeouts()[0], RASTREIO_MAX_AGE)
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost'}}):
+            self.assertEqual(rastreamento._timeouts(), (RASTREIO_TIMEOUT, RASTREIO_NEGATIVO_TIMEOUT))
+
+
+@override_settings(LIMITES_REQUISICOES={'REGRAS': {
+    'rastreio': {'caminhos': ('/buscar_entrega/', '/rastreio/'), 'taxa': 0.001, 'capacidade': 2},
+    'api': {'caminhos': ('/api/',), 'taxa': 0.001, 'capacidade': 2},
+}})
+class LimiteRequisicoesTest(TestCase):
+    """Token bucket do rastreamento público e da API"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nome='Cliente', email='limite@teste.com', telefone='11')
+        cls.entrega = criar_entregas(cls.cliente, 1)[0]
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('rastreio_entrega_json', args=[self.entrega.codigo_rastreio])
+
+    def test_excesso_recebe_429_sem_consultar_o_banco(self):
+        for _ in range(2):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        with self.assertNumQueries(0):
+            resposta = self.client.get(self.url)
+        self.assertEqual(resposta.status_code, 429)
+        self.assertGreaterEqual(int(resposta['Retry-After']), 1)
+
+        # Outro IP tem o próprio balde
+        self.assertEqual(self.client.get(self.url, REMOTE_ADDR='10.0.0.2').status_code, 200)
+        # X-Forwarded-For só vale quando configurado
+        self.assertEqual(self.client.get(self.url, HTTP_X_FORWARDED_FOR='10.0.0.3').status_code, 429)
+
+    def test_formulario_de_busca_vazio_nao_conta(self):
+        usuario = User.objects.create_user('limite', password='x')
+        self.client.force_login(usuario)
+        for _ in range(4):
+            self.assertEqual(self.client.get(reverse('buscar_entrega')).status_code, 200)
+        url = reverse('buscar_entrega') + '?pesquisa=' + self.entrega.codigo_rastreio
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(self.client.get(url).status_code, 429)
+
+    def test_api_por_token_e_por_ip(self):
+        url = '/api/entregas/'
+        # Um cliente só: cada client de teste monta o próprio middleware (e os próprios baldes locais)
+        api = APIClient()
+        for _ in range(2):
+            api.get(url)
+        resposta = api.get(url)
+        self.assertEqual(resposta.status_code, 429)
+        self.assertEqual(resposta['Content-Type'], 'application/json')
+
+        # Tokens não são verificados no limite: trocá-los não escapa do balde do IP
+        for token in ('a' * 40, 'b' * 40):
+            api.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+            self.assertEqual(api.get(url).status_code, 429)
+
+        # De outro IP, o token ainda tem um balde próprio além do IP
+        api.credentials(HTTP_AUTHORIZATION='Token ' + 'c' * 40)
+        for _ in range(2):
+            self.assertNotEqual(api.get(url, REMOTE_ADDR='10.0.0.2').status_code, 429)
+        self.assertEqual(api.get(url, REMOTE_ADDR='10.0.0.3').status_code, 429)
+
+    def test_cache_compartilhado_usa_gcra(self):
+        baldes = limites.BaldesCache(cache)
+        self.assertEqual([baldes.consumir('k', 1.0, 3)[0] for _ in range(4)], [True, True, True, False])
+        self.assertGreater(baldes.consumir('k', 1.0, 3)[1], 0)
+
+        locais = limites.criar_baldes(limites.configuracao())
+        self.assertIsInstance(locais, limites.BaldesLocais)
+        with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost'}}):
+            self.assertIsInstance(limites.criar_baldes(limites.configuracao()), limites.BaldesCache)
+
+    def test_baldes_locais_limitam_o_numero_de_chaves(self):
+        baldes = limites.BaldesLocais(max_chaves=3)
+        for i in range(10):
+            baldes.consumir(f'ip:{i}', 1.0, 1)
+        self.assertEqual(list(baldes.baldes), ['ip:7', 'ip:8', 'ip:9'])
+
+
+class EntregaEventoTest(TestCase):
+    """Linha do tempo das entregas: um evento por mudança de status, rota ou motorista"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nome='Cliente', email='eventos@teste.com', telefone='11')
+        cls.motorista = Motorista.objects.create(nome='Evento', cpf='777.000.000-00', cnh='B', telefone='11')
+        veiculo = Veiculo.objects.create(placa='EVT0001', modelo='Van', tipo='van', capacidade_maxima=500)
+        cls.rota = Rota.objects.create(nome='Rota', motorista=cls.motorista, veiculo=veiculo, data_rota=date.today())
+
+    def nova_entrega(self, codigo='EVT1'):
+        return Entrega.objects.create(codigo_rastreio=codigo, cliente=self.cliente, endereco_origem='A',
+                                      cep_origem='1', endereco_destino='B', cep_destino='2',
+                                      capacidade_necessaria=10, valor_frete=20)
+
+    def test_save_registra_so_as_mudancas(self):
+        entrega = self.nova_entrega()
+        entrega.obs = 'Portão azul'
+        entrega.save()
+        entrega.motorista = self.motorista
+        entrega.save()
+        entrega.status = 'em_transito'
+        entrega.save()
+
+        linha = linha_do_tempo(entrega)
+        self.assertEqual([(e['status'], e['motorista_id']) for e in linha],
+                         [('pendente', None), ('pendente', self.motorista.id), ('em_transito', self.motorista.id)])
+
+    def test_ciclo_da_rota_em_lote(self):
+        entregas = [self.nova_entrega(f'EVT{i}') for i in range(3)]
+        self.rota.reservar_entregas(entregas)
+        iniciar_rotas([self.rota.id])
+        eventos = EntregaEvento.objects.count()
+        alterar_status([entregas[0].pk], 'em_transito')  # já estava: nenhum evento
+        self.assertEqual(EntregaEvento.objects.count(), eventos)
+        with self.captureOnCommitCallbacks(execute=True):
+            concluir_rotas([self.rota.id])
+
+        linha = linha_do_tempo(entregas[0])
+        self.assertEqual([(e['status'], e['rota_id']) for e in linha],
+                         [('pendente', None), ('pendente', self.rota.id), ('em_transito', self.rota.id),
+                          ('entregue', self.rota.id)])
+        self.assertEqual(EntregaEvento.objects.count(), 12)
+        self.assertEqual(set(permanencia_por_status(linha)), {'pendente', 'em_transito'})
+
+        # O rastreio público mostra só as mudanças de status
+        dados = self.client.get(reverse('rastreio_entrega_json', args=['EVT0'])).json()
+        self.assertEqual([e['status'] for e in dados['historico']], ['pendente', 'em_transito', 'entregue'])
+
+    def test_api_e_remocao_do_motorista(self):
+        entrega = self.nova_entrega()
+        entrega.motorista = self.motorista
+        entrega.save()
+        motorista_id = self.motorista.id
+        self.motorista.delete()
+
+        api = APIClient()
+        api.force_authenticate(User.objects.create_user('eventos_api', password='x', is_staff=True))
+        dados = api.get(f'/api/entregas/{entrega.pk}/eventos/').json()
+        self.assertEqual([e['motorista_id'] for e in dados['eventos']], [None, motorista_id, None])
+        self.assertIn('pendente', dados['permanencia'])
+
+    def test_remocao_da_rota_fora_do_ciclo(self):
+        entrega, outra = self.nova_entrega('EVT1'), self.nova_entrega('EVT2')
+        self.rota.reservar_entregas([entrega, outra])
+        Entrega.objects.filter(pk=outra.pk).update(motorista=self.motorista)
+        self.rota.delete()
+        self.assertEqual([(e['rota_id'], e['motorista_id']) for e in linha_do_tempo(entrega)][-1], (None, None))
+        self.assertEqual([(e['rota_id'], e['motorista_id']) for e in linha_do_tempo(outra)][-1],
+                         (None, self.motorista.id))
+
+    def test_remocao_do_motorista_ou_do_veiculo_leva_as_rotas(self):
+        entrega, outra = self.nova_entrega('EVT1'), self.nova_entrega('EVT2')
+        self.rota.reservar_entregas([entrega, outra])
+        eventos = EntregaEvento.objects.count()
+        self.rota.veiculo.delete()
+        self.assertEqual(EntregaEvento.objects.count(), eventos + 2)
+        self.assertEqual(linha_do_tempo(entrega)[-1]['rota_id'], None)
+
+        rota = Rota.objects.create(nome='Outra', motorista=self.motorista, data_rota=date.today(),
+                                   veiculo=Veiculo.objects.create(placa='EVT0002', modelo='Van', tipo='van',
+                                                                  capacidade_maxima=500))
+        rota.reservar_entregas([entrega])
+        eventos = EntregaEvento.objects.count()
+        Motorista.objects.filter(pk=self.motorista.pk).delete()
+        # Um evento só, já sem rota nem motorista
+        self.assertEqual(EntregaEvento.objects.count(), eventos + 1)
+        self.assertEqual([(e['rota_id'], e['motorista_id']) for e in linha_do_tempo(entrega)][-1], (None, None))
+
+
+class IndicadoresDiariosTest(TestCase):
+    """Indicadores diários somados a partir da linha do tempo e das rotas concluídas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.cliente = Cliente.objects.create(nome='Cliente', email='kpi@teste.com', telefone='11')
+        cls.motorista = Motorista.objects.create(nome='Kpi', cpf='666.000.000-00', cnh='B', telefone='11')
+        cls.veiculo = Veiculo.objects.create(placa='KPI0001', modelo='Van', tipo='van', capacidade_maxima=500)
+        cls.rota = Rota.objects.create(nome='Rota', motorista=cls.motorista, veiculo=cls.veiculo,
+                                       data_rota=date(2024, 6, 1), km_total_estimado=120)
+
+    def dia_completo(self):
+        entregas = criar_entregas(self.cliente, 3)
+        # Os eventos são somados depois do commit de quem os grava
+        with self.captureOnCommitCallbacks(execute=True):
+            # bulk_create do helper não grava eventos; as criações entram pelo save()
+            for entrega in entregas:
+                entrega.obs = 'ok'
+                entrega.status = 'remarcada'
+                entrega.save()
+            self.rota.reservar_entregas(entregas)
+            iniciar_rotas([self.rota.id])
+            concluir_rotas([self.rota.id])
+
+    def test_soma_por_motorista_veiculo_e_cliente(self):
+        self.dia_completo()
+        motorista = indicadores('motorista', self.motorista.id)['totais']
+        self.assertEqual((motorista['em_transito'], motorista['entregues'], motorista['kg_entregues']), (3, 3, 30))
+        self.assertEqual(motorista['valor_entregue'], 150)
+        self.assertEqual((motorista['rotas_concluidas'], motorista['km']), (1, 120))
+
+        cliente = indicadores('cliente', self.cliente.id)
+        self.assertEqual((cliente['totais']['remarcadas'], cliente['totais']['entregues']), (3, 3))
+        self.assertEqual(cliente['totais']['km'], 0)
+        veiculo = indicadores('veiculo', self.veiculo.id, desde=date(2024, 6, 1), ate=date(2024, 6, 1))
+        self.assertEqual([(d['dia'], d['km'], d['entregues']) for d in veiculo['dias']], [(date(2024, 6, 1), 120, 0)])
+
+    def test_incremental_igual_ao_recalculo(self):
+        self.dia_completo()
+        campos = ('dimensao', 'referencia_id', 'dia', 'entregues', 'kg_entregues', 'valor_entregue', 'km')
+        incremental = list(IndicadorDiario.objects.order_by('dimensao', 'referencia_id', 'dia').values_list(*campos))
+        recalcular_indicadores()
+        self.assertEqual(
+            list(IndicadorDiario.objects.order_by('dimensao', 'referencia_id', 'dia').values_list(*campos)),
+            incremental)
+
+        # A leitura são as linhas do período e o marco, sem escrita
+        with self.assertNumQueries(2):
+            indicadores('motorista', self.motorista.id)
+
+    def test_escrita_soma_no_commit_e_leitura_nao_soma(self):
+        self.dia_completo()
+        with self.captureOnCommitCallbacks(execute=True):
+            entrega = Entrega.objects.create(codigo_rastreio='KPI0001', cliente=self.cliente, endereco_origem='A',
+                                             cep_origem='1', endereco_destino='B', cep_destino='2',
+                                             capacidade_necessaria=1, valor_frete=1)
+        self.assertEqual(indicadores('cliente', self.cliente.id)['atualizado_ate'],
+                         EntregaEvento.objects.latest('pk').momento)
+
+        # Sem o commit (callbacks descartados), a leitura não soma o evento novo
+        entrega.status = 'cancelada'
+        entrega.save()
+        self.assertEqual(indicadores('cliente', self.cliente.id)['totais']['canceladas'], 0)
+        self.assertEqual(atualizar_indicadores(), 1)
+        self.assertEqual(indicadores('cliente', self.cliente.id)['totais']['canceladas'], 1)
+
+    def test_trava_do_marco_escreve_antes_de_ler(self):
+        if connection.features.has_select_for_update:
+            self.skipTest('Com FOR UPDATE a trava é a própria leitura')
+        with transaction.atomic(), CaptureQueriesContext(connection) as consultas:
+            _travar_marco()
+        self.assertTrue(consultas[0]['sql'].startswith('UPDATE'), consultas[0]['sql'])
+
+    def test_pagina_e_api(self):
+        self.dia_completo()
+        admin = User.objects.create_user('kpi_admin', password='x', is_staff=True)
+        Group.objects.get_or_create(name='Administradores')[0].user_set.add(admin)
+        self.client.force_login(admin)
+        resposta = self.client.get(reverse('detalhes_motorista', args=[self.motorista.id]))
+        self.assertEqual(resposta.context['kpis']['km'], 120)
+        self.assertEqual(resposta.context['rotas_concluidas'], 1)
+        self.assertContains(resposta, 'Indicadores atualizados até')
+
+        api = APIClient()
+        api.force_authenticate(admin)
+        url = f'/api/clientes/{self.cliente.id}/indicadores/'
+        self.assertEqual(api.get(url).json()['totais']['entregues'], 3)
+        self.assertEqual(api.get(url + '?desde=ontem').status_code, 400)
+
+
+class ColetorSpans:
+    def __init__(self):
+        self.spans = []
+        self.recebido = threading.Event()
+
+    def exportar(self, spans):
+        self.spans.extend(spans)
+        self.recebido.set()
+
+
+@override_settings(TELEMETRIA={'AMOSTRAGEM': 1.0})
+class TelemetriaTest(TestCase):
+    def setUp(self):
+        self.coletor = ColetorSpans()
+        telemetria.instrumentar_templates()
+        telemetria.configurar_exportador(self.coletor, lote=1)
+        self.addCleanup(telemetria.configurar_exportador, None)
+        self.admin = User.objects.create_user('admin_tel', password='senha', is_staff=True)
+        self.client.force_login(self.admin)
+
+    def test_span_da_requisicao(self):
+        resposta = self.client.get('/entregas/')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(self.coletor.recebido.wait(5))
+
+        span = self.coletor.spans[0]
+        self.assertEqual(span['nome'], 'list_entrega')
+        self.assertEqual(span['atributos']['http.status'], 200)
+        self.assertGreater(span['consultas'], 0)
+        self.assertGreater(span['template_ms'], 0)
+
+    def test_payload_otlp(self):
+        self.client.get('/entregas/')
+        self.assertTrue(self.coletor.recebido.wait(5))
+        payload = telemetria.ExportadorOtlp('http://coletor', 'teste').payload(self.coletor.spans)
+        span = payload['resourceSpans'][0]['scopeSpans'][0]['spans'][0]
+        self.assertEqual(len(span['traceId']), 32)
+        self.assertIn({'key': 'http.status', 'value': {'intValue': '200'}}, span['attributes'])
+
+    def test_log_em_fila_leva_o_trace_id(self):
+        saida = io.StringIO()
+        handler = telemetria.HandlerFila(saida)
+        handler.setFormatter(telemetria.FormatadorJson())
+        span = telemetria.Span('teste')
+        token = telemetria._span_atual.set(span)
+        try:
+            handler.handle(logging.makeLogRecord({
+                'name': 'logistica', 'levelno': logging.INFO, 'levelname': 'INFO',
+                'msg': 'rota %s', 'args': (7,)}))
+        finally:
+            telemetria._span_atual.reset(token)
+        # O listener formata na própria thread; close espera a fila esvaziar
+        handler.close()
+        registro = json.loads(saida.getvalue())
+        self.assertEqual((registro['mensagem'], registro['trace_id']), ('rota 7', span.trace_id))
+
+
+# ---- Orçamento de consultas e de tempo por endpoint ----
+#
+# Chama todas as URLs do projeto (HTML e API) como admin, motorista e anônimo
+# sobre uma base realista, mais os POSTs de criação e edição, e compara o
+# número de consultas com os orçamentos abaixo. Cada chamada roda dentro de uma
+# transação desfeita em seguida, então as views que alteram dados (deletar,
+# remover da rota, criar) são medidas sempre sobre o mesmo estado.
+# O tempo só é conferido com LOGISTICA_ORCAMENTO_MS=<ms>, contra o p95 das
+# repetições (por posto mais próximo: com poucas repetições é o máximo);
+# sem ela vai apenas para o relatório, porque em CI lento um teto de relógio
+# falha à toa. Com LOGISTICA_RELATORIO_ORCAMENTO=<arquivo> o resultado é
+# gravado em JSON para comparar entre commits.
+
+REPETICOES_ORCAMENTO = int(os.environ.get('LOGISTICA_REPETICOES_ORCAMENTO', '5'))
+
+ORCAMENTO_CONSULTAS_PADRAO = 12
+ORCAMENTO_CONSULTAS = {
+    # Constante: entregas, veículo e motorista em UPDATEs por conjunto, mais a
+    # leitura das entregas e o INSERT dos eventos da linha do tempo
+    'deletar_rota': 18,
+    # Cria usuário, perfil e grupo; os signals do perfil ainda regravam a linha
+    # a cada save do usuário
+    'criar_motorista': 21,
+    # O formulário confere cada FK e o código de rastreio (no clean e no
+    # validate_unique) antes do UPDATE só dos campos alterados
+    'atualizar_entrega': 15,
+}
+
+VERIFICAR_TEMPO = bool(os.environ.get('LOGISTICA_ORCAMENTO_MS'))
+ORCAMENTO_MS_PADRAO = float(os.environ.get('LOGISTICA_ORCAMENTO_MS') or '750')
+ORCAMENTO_MS = {}
+
+RECURSOS_URL = {
+    'motoristas': 'motorista',
+    'clientes': 'cliente',
+    'veiculos': 'veiculo',
+    'entregas': 'entrega',
+    'rotas': 'rota',
+    'rastreio': 'codigo',
+}
+
+
+def rotas_do_projeto(padroes=None, prefixo=''):
+    """(rota, padrão) de todas as URLs nomeadas do projeto, sem admin e api-auth"""
+    if padroes is None:
+        padroes = get_resolver().url_patterns
+    for padrao in padroes:
+        rota = prefixo + str(padrao.pattern).lstrip('^').rstrip('$')
+        if isinstance(padrao, URLResolver):
+            if not rota.startswith(('admin/', 'api-auth/')):
+                yield from rotas_do_projeto(padrao.url_patterns, rota)
+        elif padrao.name and 'format' not in padrao.pattern.regex.groupindex:
+            yield rota, padrao
+
+
+def dados_formulario(form):
+    """Corpo de POST com os valores atuais do formulário, como o navegador reenviaria"""
+    return {campo.html_name: campo.value() for campo in form if campo.value() is not None}
+
+
+class PlanoConsultasTest(TestCase):
+    """As consultas mais frequentes das listagens e do carregamento não podem varrer a tabela"""
+
+    @classmethod
+    def setUpTestData(cls):
+        gerar_base(clientes=20, motoristas=20, veiculos=10, rotas=30, entregas=300, data_base=date(2024, 6, 1))
+
+    def plano(self, consulta):
+        if connection.vendor == 'postgresql':
+            # Tabelas pequenas sempre saem em Seq Scan; desligado, ele só aparece sem índice que sirva
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return consulta.explain()
+
+    def varreduras(self, plano, ordenada):
+        if connection.vendor == 'postgresql':
+            return [linha for linha in plano.splitlines() if 'Seq Scan' in linha]
+        # Listagem com LIMIT pode percorrer o índice da ordenação (SCAN ... USING INDEX);
+        # filtro tem que ir direto às linhas (SEARCH)
+        varredura = r'\bSCAN \w+$' if ordenada else r'\bSCAN \w+'
+        return [linha for linha in plano.splitlines() if re.search(varredura, linha.strip())]
+
+    def assertSemVarredura(self, consulta, ordenada=False):
+        plano = self.plano(consulta)
+        self.assertEqual(self.varreduras(plano, ordenada), [], plano)
+        if ordenada and connection.vendor == 'sqlite':
+            # O índice já entrega as linhas na ordem da listagem
+            self.assertNotIn('TEMP B-TREE', plano)
+
+    def test_listagens_paginadas(self):
+        motorista_id = Motorista.objects.values_list('id', flat=True).first()
+        consultas = {
+            'entregas': Entrega.objects.order_by('-data_solicitacao', '-id'),
+            'entregas por status': Entrega.objects.filter(status='pendente').order_by('-data_solicitacao', '-id'),
+            'entregas do motorista': Entrega.objects.filter(motorista_id=motorista_id).order_by(
+                '-data_solicitacao', '-id'),
+            'rotas': Rota.objects.order_by('-data_rota', '-id'),
+            'rotas do motorista': Rota.objects.filter(motorista_id=motorista_id).order_by('-data_rota', '-id'),
+            'motoristas': Motorista.objects.order_by('nome', 'id'),
+            'clientes': Cliente.objects.order_by('nome', 'id'),
+        }
+        for nome, consulta in consultas.items():
+            with self.subTest(nome):
+                self.assertSemVarredura(consulta[:25], ordenada=True)
+
+    def test_filtros_frequentes(self):
+        consultas = {
+            'fila do carregamento': Entrega.objects.filter(status='pendente', rota__isnull=True).order_by(
+                '-capacidade_necessaria', 'id'),
+            'entregas disponíveis para a rota': Entrega.objects.filter(rota__isnull=True, status='pendente'),
+            'entregas do cliente': Entrega.objects.filter(cliente_id=Cliente.objects.first().id),
+            'rotas planejadas do dia': Rota.objects.filter(data_rota=date(2024, 6, 1), status='planejada').order_by(
+                'id'),
+            'rotas abertas': Rota.objects.filter(status__in=['planejada', 'em_andamento']),
+            'motoristas disponíveis': Motorista.objects.filter(status='disponivel'),
+            'veículos disponíveis': Veiculo.objects.filter(status='disponivel'),
+        }
+        for nome, consulta in consultas.items():
+            with self.subTest(nome):
+                self.assertSemVarredura(consulta)
+
+    def test_fila_usa_indice_parcial(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Nome do índice conferido só no plano do SQLite')
+        plano = self.plano(Entrega.objects.filter(status='pendente', rota__isnull=True).order_by(
+            '-capacidade_necessaria', 'id'))
+        self.assertIn('entrega_fila_idx', plano)
+        self.assertNotIn('TEMP B-TREE', plano)
+
+
+class OrcamentoEndpointsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        gerar_base(clientes=200, motoristas=200, veiculos=100, rotas=300, entregas=3000, data_base=date(2024, 6, 1))
+        cls.admin = User.objects.create_user('admin_orcamento', password='senha', is_staff=True)
+        Group.objects.get_or_create(name='Administradores')[0].user_set.add(cls.admin)
+        cls.usuario_motorista = User.objects.create_user('motorista_orcamento', password='senha')
+        cls.motorista = Motorista.objects.create(nome='Motorista Orçamento', cpf='999.999.999-99', cnh='B',
+                                                 telefone='11977777777', user=cls.usuario_motorista)
+        cls.rota = Rota.objects.create(nome='Rota Orçamento', motorista=cls.motorista,
+                                       veiculo=Veiculo.objects.first(), data_rota=date.today())
+        Entrega.objects.filter(pk__in=Entrega.objects.order_by('id').values('pk')[:30]).update(
+            motorista=cls.motorista, rota=cls.rota)
+        recalcular_totais_rotas(Rota.objects.filter(pk=cls.rota.id))
+        # Indicadores em dia, como numa base em uso: mede-se a leitura, não a carga inicial
+        recalcular_indicadores()
+        cls.objetos = {
+            'motorista': cls.motorista.id,
+            'cliente': Cliente.objects.first().id,
+            'veiculo': Veiculo.objects.first().id,
+            'entrega': Entrega.objects.filter(rota=cls.rota).first().id,
+            'rota': cls.rota.id,
+            'codigo': Entrega.objects.filter(rota=cls.rota).first().codigo_rastreio,
+        }
+
+    def url(self, rota, padrao):
+        recurso = re.search('|'.join(RECURSOS_URL), rota)
+        kwargs = {nome: self.objetos[RECURSOS_URL[recurso.group()]] for nome in padrao.pattern.regex.groupindex}
+        return reverse(padrao.name, kwargs=kwargs)
+
+    def escritas(self):
+        """(endpoint, url, argumentos do client.post/patch, status esperado) dos formulários e da API"""
+        motorista = Motorista.objects.get(pk=self.motorista.id)
+        cliente = Cliente.objects.get(pk=self.objetos['cliente'])
+        veiculo = Veiculo.objects.get(pk=self.objetos['veiculo'])
+        entrega = Entrega.objects.get(pk=self.objetos['entrega'])
+        rota = Rota.objects.get(pk=self.rota.id)
+        nova_entrega = {**dados_formulario(EntregaForm(instance=entrega)), 'codigo_rastreio': 'ORC00001',
+                        'rota': '', 'motorista': ''}
+        entrega_api = {**EntregaSerializer(entrega).data, 'codigo_rastreio': 'ORC00002', 'rota': None}
+        del entrega_api['id']
+        json_api = {'content_type': 'application/json'}
+        return [
+            ('criar_motorista', reverse('criar_motorista'), {
+                'data': {'nome': 'Motorista Novo', 'cpf': '888.888.888-88', 'cnh': 'B', 'telefone': '11966666666',
+                         'status': 'disponivel', 'criar_usuario': 'on', 'email': 'novo@orcamento.com'}}, 302),
+            ('atualizar_motorista', reverse('atualizar_motorista', args=[motorista.id]),
+             {'data': dados_formulario(MotoristaForm(instance=motorista))}, 302),
+            ('criar_cliente', reverse('criar_cliente'),
+             {'data': {**dados_formulario(ClienteForm(instance=cliente)), 'email': 'novo@orcamento.com'}}, 302),
+            ('atualizar_cliente', reverse('atualizar_cliente', args=[cliente.id]),
+             {'data': dados_formulario(ClienteForm(instance=cliente))}, 302),
+            ('criar_veiculo', reverse('criar_veiculo'), {
+                'data': {**dados_formulario(VeiculoForm(instance=veiculo)), 'placa': 'ORC1234', 'motorista': ''}},
+             302),
+            ('atualizar_veiculo', reverse('atualizar_veiculo', args=[veiculo.id]),
+             {'data': dados_formulario(VeiculoForm(instance=veiculo))}, 302),
+            ('criar_entrega', reverse('criar_entrega'), {'data': nova_entrega}, 302),
+            ('atualizar_entrega', reverse('atualizar_entrega', args=[entrega.id]),
+             {'data': dados_formulario(EntregaForm(instance=entrega))}, 302),
+            ('criar_rota', reverse('criar_rota'), {'data': {
+                **dados_formulario(RotaForm(instance=rota)), 'nome': 'Rota Nova',
+                'motorista': Motorista.objects.filter(status='disponivel').values_list('id', flat=True).first(),
+                'veiculo': Veiculo.objects.filter(status='disponivel').values_list('id', flat=True).first(),
+                'status': 'planejada'}}, 302),
+            ('atualizar_rota', reverse('atualizar_rota', args=[rota.id]),
+             {'data': dados_formulario(RotaForm(instance=rota))}, 302),
+            ('entrega-list', reverse('entrega-list'), {'data': json.dumps(entrega_api), **json_api}, 201),
+            ('entrega-detail', reverse('entrega-detail', args=[entrega.id]),
+             {'data': json.dumps({'obs': 'Portão lateral'}), 'metodo': 'patch', **json_api}, 200),
+        ]
+
+    def medir(self, client, url, metodo='get', **argumentos):
+        tempos, consultas, status_code = [], 0, None
+        cookies = copy.deepcopy(client.cookies)
+        for _ in range(REPETICOES_ORCAMENTO):
+            # logout troca o cookie de sessão; o banco volta no rollback e o cookie aqui
+            client.cookies = copy.deepcopy(cookies)
+            # Deixa identidade e verificação de perfil gravadas na sessão (fora do
+            # rollback), como numa sessão em uso; só o endpoint é medido
+            client.get(reverse('buscar_entrega'))
+            # O log de consultas da conexão tem limite; zera para a contagem não saturar
+            reset_queries()
+            with transaction.atomic():
+                with CaptureQueriesContext(connection) as capturadas:
+                    inicio = time.perf_counter()
+                    resposta = getattr(client, metodo)(url, **argumentos)
+                    if resposta.streaming:
+                        b''.join(resposta.streaming_content)
+                    tempos.append((time.perf_counter() - inicio) * 1000)
+                consultas = max(consultas, len(capturadas))
+                status_code = resposta.status_code
+                transaction.set_rollback(True)
+        client.cookies = cookies
+        tempos.sort()
+        return {
+            'status': status_code,
+            'consultas': consultas,
+            'p50_ms': round(tempos[len(tempos) // 2], 2),
+            'p95_ms': round(tempos[min(len(tempos), math.ceil(len(tempos) * 0.95)) - 1], 2),
+            'max_ms': round(tempos[-1], 2),
+        }
+
+    def orcamentos(self, endpoint):
+        return {
+            'orcamento_consultas': ORCAMENTO_CONSULTAS.get(endpoint, ORCAMENTO_CONSULTAS_PADRAO),
+            'orcamento_ms': ORCAMENTO_MS.get(endpoint, ORCAMENTO_MS_PADRAO),
+        }
+
+    def test_orcamento_por_endpoint(self):
+        clientes = {'anonimo': self.client_class(), 'admin': self.client_class(),
+                    'motorista': self.client_class()}
+        clientes['admin'].force_login(self.admin)
+        clientes['motorista'].force_login(self.usuario_motorista)
+
+        resultados = []
+        for rota, padrao in rotas_do_projeto():
+            url = self.url(rota, padrao)
+            for perfil, client in clientes.items():
+                medida = self.medir(client, url)
+                medida.update({'endpoint': padrao.name, 'url': url, 'perfil': perfil, 'metodo': 'GET'},
+                              **self.orcamentos(padrao.name))
+                resultados.append(medida)
+
+        # Escritas só como admin: o que se mede é o caminho de sucesso, que o GET não exercita
+        for endpoint, url, argumentos, esperado in self.escritas():
+            argumentos = {'metodo': 'post', **argumentos}
+            medida = self.medir(clientes['admin'], url, **argumentos)
+            medida.update({'endpoint': endpoint, 'url': url, 'perfil': 'admin',
+                           'metodo': argumentos['metodo'].upper(), 'esperado': esperado},
+                          **self.orcamentos(endpoint))
+            resultados.append(medida)
+
+        caminho = os.environ.get('LOGISTICA_RELATORIO_ORCAMENTO')
+        if caminho:
+            with open(caminho, 'w', encoding='utf-8') as arquivo:
+                json.dump({'repeticoes': REPETICOES_ORCAMENTO, 'endpoints': resultados}, arquivo, indent=2)
+
+        for medida in resultados:
+            with self.subTest(endpoint=medida['endpoint'], perfil=medida['perfil'], metodo=medida['metodo']):
+                self.assertNotEqual(medida['status'], 500)
+                if 'esperado' in medida:
+                    self.assertEqual(medida['status'], medida['esperado'])
+                self.assertLessEqual(medida['consultas'], medida['orcamento_consultas'])
+                if VERIFICAR_TEMPO:
+                    self.assertLessEqual(medida['p95_ms'], medida['orcamento_ms'])
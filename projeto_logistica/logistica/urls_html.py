@@ -18,6 +18,8 @@ urlpatterns = [
     path('logout/', views.custom_logout, name='logout'),
     path('redirecionar-perfil/', views.redirecionar_por_perfil, name='redirecionar_perfil'),
     path('buscar_entrega/', views.buscar_entrega, name='buscar_entrega'),
+    path('rastreio/<str:codigo>/', views.rastreio_entrega, name='rastreio_entrega'),
+    path('rastreio/<str:codigo>/json/', views.rastreio_entrega_json, name='rastreio_entrega_json'),
 
     path('motoristas/', views.list_motorista, name='list_motorista'),
     path('motoristas/criar/', views.criar_motorista, name='criar_motorista'),
@@ -37,6 +39,12 @@ urlpatterns = [
         name='criar_usuario_motorista'
     ),
 
+    path(
+        'motoristas/credenciar/',
+        views.credenciar_motoristas_lote,
+        name='credenciar_motoristas_lote'
+    ),
+
     path(
         'motoristas/verificar-grupos/',
         views.verificar_grupos_motoristas,
@@ -67,6 +75,11 @@ urlpatterns = [
 
     path('rotas/', views.list_rota, name='list_rota'),
     path('rotas/criar/', views.criar_rota, name='criar_rota'),
+    path(
+        'rotas/carregamento-automatico/',
+        views.carregamento_automatico,
+        name='carregamento_automatico'
+    ),
     path('rotas/<int:id>/editar/', views.atualizar_rota, name='atualizar_rota'),
     path('rotas/<int:id>/deletar/', views.deletar_rota, name='deletar_rota'),
 
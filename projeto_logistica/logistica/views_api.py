@@ -1,10 +1,28 @@
-from rest_framework import viewsets
+import gzip
+import io
+
+from rest_framework import serializers, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date
 
 from .models import Motorista, Cliente, Veiculo, Entrega, Rota
+from .carregamento import ESTRATEGIAS, executar_carregamento
+from .ciclo_rotas import ACOES as ACOES_ROTA, DESTINOS as DESTINOS_ROTA, ORIGENS as ORIGENS_ROTA, TRANSICOES, deletar_rotas
+from .roteirizacao import agendar_otimizacao, otimizar_rota
+from .lotes import LIMITE_LOTE, criar_entregas, atualizar_entregas, alterar_status
+from .eventos import linha_do_tempo, permanencia_por_status
+from .indicadores import indicadores
+from .credenciamento import credenciar_motoristas, credenciais_csv
+from .importacao import detectar_formato, importar
+from .exportacao import CONTENT_TYPES, EXTENSOES, FORMATOS as FORMATOS_EXPORTACAO, exportar
 from .serializers import *
+from .filtros import ClienteFilter, MotoristaFilter, VeiculoFilter, EntregaFilter, RotaFilter
 from .permissions import *
 
 
@@ -12,33 +30,90 @@ from .permissions import *
 # CRUD BÁSICO
 # =====================
 
+# Paginação por cursor, filtros e ordenação vêm de REST_FRAMEWORK (settings).
+# Os serializers expõem as FKs só como IDs, então as listagens não precisam
+# de joins; select_related fica onde as actions usam os objetos relacionados.
+
 class ClienteViewSet(viewsets.ModelViewSet):
     queryset = Cliente.objects.all()
     serializer_class = ClienteSerializer
     permission_classes = [IsAuthenticated]
+    filterset_class = ClienteFilter
+    ordering_fields = ['nome', 'id']
+    ordering = ['nome', 'id']
+
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser],
+            permission_classes=[IsAuthenticated, IsAdminUser])
+    def importar(self, request):
+        """Upload multipart de clientes em CSV/NDJSON no campo arquivo"""
+        return _importar_upload(request, 'cliente')
+
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated, IsAdminUser])
+    def indicadores(self, request, pk=None):
+        """GET ?desde=AAAA-MM-DD&ate=AAAA-MM-DD -> indicadores diários e totais"""
+        return _resposta_indicadores(self, request, 'cliente')
 
 
 class MotoristaViewSet(viewsets.ModelViewSet):
     queryset = Motorista.objects.all()
     serializer_class = MotoristaSerializer
     permission_classes = [IsAuthenticated]
+    filterset_class = MotoristaFilter
+    ordering_fields = ['nome', 'status', 'id']
+    ordering = ['nome', 'id']
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsAdminUser])
+    def credenciar(self, request):
+        """POST {"motoristas": [ids]} -> CSV com usuário e senha dos motoristas sem acesso"""
+        ids, erro = _itens_do_lote(request.data, "motoristas")
+        if erro:
+            return erro
+        if not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            return Response({"erro": '"motoristas" deve conter apenas ids.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        credenciais, ignorados = credenciar_motoristas(ids)
+        if not credenciais:
+            return Response({"erro": "Nenhum motorista sem usuário entre os informados.", "ignorados": ignorados},
+                            status=status.HTTP_400_BAD_REQUEST)
+        resposta = HttpResponse(credenciais_csv(credenciais), content_type="text/csv; charset=utf-8",
+                                status=status.HTTP_201_CREATED)
+        resposta["Content-Disposition"] = 'attachment; filename="credenciais_motoristas.csv"'
+        resposta["X-Motoristas-Ignorados"] = ",".join(map(str, ignorados))
+        return resposta
+
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated, IsAdminUser])
+    def indicadores(self, request, pk=None):
+        """GET ?desde=AAAA-MM-DD&ate=AAAA-MM-DD -> indicadores diários e totais"""
+        return _resposta_indicadores(self, request, 'motorista')
 
 
 class VeiculoViewSet(viewsets.ModelViewSet):
     queryset = Veiculo.objects.all()
     serializer_class = VeiculoSerializer
     permission_classes = [IsAuthenticated]
+    filterset_class = VeiculoFilter
+    ordering_fields = ['placa', 'capacidade_maxima', 'km_atual', 'id']
+    ordering = ['placa', 'id']
 
     @action(detail=False, methods=['get'])
     def disponiveis(self, request):
-        qs = Veiculo.objects.filter(status='disponivel')
-        return Response(VeiculoSerializer(qs, many=True).data)
+        qs = self.filter_queryset(self.get_queryset().filter(status='disponivel'))
+        pagina = self.paginate_queryset(qs)
+        return self.get_paginated_response(VeiculoSerializer(pagina, many=True).data)
+
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated, IsAdminUser])
+    def indicadores(self, request, pk=None):
+        """GET ?desde=AAAA-MM-DD&ate=AAAA-MM-DD -> indicadores diários e totais"""
+        return _resposta_indicadores(self, request, 'veiculo')
 
 
 class EntregaViewSet(viewsets.ModelViewSet):
     queryset = Entrega.objects.all()
     serializer_class = EntregaSerializer
     permission_classes = [IsAuthenticated]
+    filterset_class = EntregaFilter
+    ordering_fields = ['data_solicitacao', 'data_entrega_prevista', 'id']
+    ordering = ['-data_solicitacao', '-id']
 
     @action(detail=True, methods=['post'])
     def atribuir_motorista(self, request, pk=None):
@@ -47,26 +122,271 @@ class EntregaViewSet(viewsets.ModelViewSet):
         entrega.save()
         return Response({"status": "motorista atribuído"})
 
+    @action(detail=True, methods=['get'])
+    def eventos(self, request, pk=None):
+        """Linha do tempo: eventos de status/rota/motorista e segundos em cada status"""
+        entrega = self.get_object()
+        linha = linha_do_tempo(entrega)
+        return Response({
+            "entrega": entrega.pk,
+            "codigo_rastreio": entrega.codigo_rastreio,
+            "eventos": linha,
+            "permanencia": permanencia_por_status(linha),
+        })
+
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser],
+            permission_classes=[IsAuthenticated, IsAdminUser])
+    def importar(self, request):
+        """Upload multipart de entregas em CSV/NDJSON no campo arquivo"""
+        return _importar_upload(request, 'entrega')
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsAdminUser])
+    def exportar(self, request):
+        """GET ?formato=csv|ndjson|colunar (+ filtros da listagem), em streaming"""
+        return _exportar_streaming(self, request, 'entrega')
+
+    # ---- Operações em lote (até LIMITE_LOTE itens por requisição) ----
+
+    @action(detail=False, methods=['post'], url_path='lote')
+    def criar_lote(self, request):
+        """POST {"entregas": [{...}, ...]} -> cria as válidas e devolve erros por item"""
+        itens, erro = _itens_do_lote(request.data, "entregas")
+        if erro:
+            return erro
+        try:
+            resultado = criar_entregas(itens)
+        except IntegrityError:
+            # Outro processo gravou o mesmo código entre a validação e o insert
+            return Response({"erro": "Conflito ao gravar o lote; reenvie os itens."},
+                            status=status.HTTP_409_CONFLICT)
+        codigo = status.HTTP_201_CREATED if resultado["criadas"] else status.HTTP_400_BAD_REQUEST
+        return Response(resultado, status=codigo)
+
+    @action(detail=False, methods=['post'], url_path='lote/atualizar')
+    def atualizar_lote(self, request):
+        """POST {"entregas": [{"id": 1, "status": "em_transito", "motorista": 2}, ...]}"""
+        itens, erro = _itens_do_lote(request.data, "entregas")
+        if erro:
+            return erro
+        resultado = atualizar_entregas(itens)
+        codigo = status.HTTP_200_OK if resultado["atualizadas"] else status.HTTP_400_BAD_REQUEST
+        return Response(resultado, status=codigo)
+
+    @action(detail=False, methods=['post'], url_path='lote/status')
+    def status_lote(self, request):
+        """POST {"entregas": [1, 2, 3], "status": "entregue"} -> um único UPDATE"""
+        ids, erro = _itens_do_lote(request.data, "entregas")
+        if erro:
+            return erro
+        try:
+            resultado = alterar_status([int(i) for i in ids], request.data.get("status"))
+        except (TypeError, ValueError) as e:
+            return Response({"erro": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(resultado)
+
+
+def _exportar_streaming(viewset, request, tipo):
+    """Exporta o queryset filtrado sem montar a resposta inteira em memória"""
+    formato = request.query_params.get("formato", "csv")
+    if formato not in FORMATOS_EXPORTACAO:
+        return Response({"erro": f"formato deve ser um de {FORMATOS_EXPORTACAO}"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    queryset = viewset.filter_queryset(viewset.get_queryset())
+    resposta = StreamingHttpResponse(exportar(queryset, tipo, formato), content_type=CONTENT_TYPES[formato])
+    resposta["Content-Disposition"] = f'attachment; filename="{tipo}s.{EXTENSOES[formato]}"'
+    return resposta
+
+
+# Quantos registros recusados voltam na resposta do upload
+LIMITE_REJEITADOS_RESPOSTA = 100
+
+
+def _importar_upload(request, tipo):
+    """Roda o pipeline de importação sobre o arquivo enviado, sem carregá-lo inteiro"""
+    upload = request.FILES.get("arquivo")
+    if upload is None:
+        return Response({"erro": 'Envie o arquivo no campo "arquivo".'}, status=status.HTTP_400_BAD_REQUEST)
+    formato = request.data.get("formato") or detectar_formato(upload.name)
+
+    # .gz é descompactado em streaming, como no comando importar_registros
+    bruto = upload.file
+    if upload.name.lower().endswith(".gz"):
+        bruto = gzip.GzipFile(fileobj=upload.file, mode="rb")
+
+    rejeitados = []
+
+    def rejeitar(linha, registro, erros):
+        if len(rejeitados) < LIMITE_REJEITADOS_RESPOSTA:
+            rejeitados.append({"linha": linha, "erros": erros, "registro": registro})
+
+    arquivo = io.TextIOWrapper(bruto, encoding="utf-8-sig", newline="")
+    try:
+        resumo = importar(arquivo, tipo, formato, rejeitar=rejeitar)
+    except (ValueError, UnicodeDecodeError, EOFError, gzip.BadGzipFile) as e:
+        return Response({"erro": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    finally:
+        arquivo.detach()
+
+    resumo["rejeitados"] = rejeitados
+    return Response(resumo)
+
+
+def _itens_do_lote(dados, chave):
+    """Extrai a lista do corpo e confere o limite; retorna (itens, resposta de erro)"""
+    itens = dados.get(chave) if isinstance(dados, dict) else dados
+    if not isinstance(itens, list) or not itens:
+        return None, Response({"erro": f'Envie uma lista não vazia em "{chave}".'},
+                              status=status.HTTP_400_BAD_REQUEST)
+    if len(itens) > LIMITE_LOTE:
+        return None, Response({"erro": f"Máximo de {LIMITE_LOTE} itens por lote."},
+                              status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    return itens, None
+
+
+def _flag(dados, campo):
+    """Lê um booleano do corpo (true/false, 1/0, "true"/"false"); retorna (valor, resposta de erro)"""
+    try:
+        return serializers.BooleanField().to_internal_value(dados.get(campo, False)), None
+    except serializers.ValidationError:
+        return None, Response({"erro": f'"{campo}" deve ser true ou false.'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def _resposta_indicadores(viewset, request, dimensao):
+    """Indicadores diários do objeto da URL no período de ?desde e ?ate"""
+    objeto = viewset.get_object()
+    periodo = {}
+    for campo in ("desde", "ate"):
+        valor = request.query_params.get(campo)
+        if valor:
+            periodo[campo] = parse_date(valor)
+            if periodo[campo] is None:
+                return Response({"erro": f'"{campo}" deve estar no formato AAAA-MM-DD.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+    return Response({dimensao: objeto.pk, **indicadores(dimensao, objeto.pk, **periodo)})
+
 
 class RotaViewSet(viewsets.ModelViewSet):
-    queryset = Rota.objects.all()
+    queryset = Rota.objects.select_related('motorista', 'veiculo')
     serializer_class = RotaSerializer
     permission_classes = [IsAuthenticated]
+    filterset_class = RotaFilter
+    ordering_fields = ['data_rota', 'id']
+    ordering = ['-data_rota', '-id']
+
+    def perform_update(self, serializer):
+        # A mudança de status passa pelo ciclo de vida (entregas, veículo e motorista), como na tela
+        rota = serializer.instance
+        status_anterior = rota.status
+        novo_status = serializer.validated_data.pop("status", status_anterior)
+        acao = next((acao for acao, destino in DESTINOS_ROTA.items() if destino == novo_status), None)
+        if novo_status != status_anterior and (acao is None or status_anterior not in ORIGENS_ROTA[acao]):
+            raise serializers.ValidationError(
+                {"status": [f'A rota não pode passar de "{status_anterior}" para "{novo_status}".']})
+        with transaction.atomic():
+            serializer.save()
+            if novo_status != status_anterior:
+                TRANSICOES[acao]([rota.id])
+                rota.refresh_from_db()
+
+    def perform_destroy(self, instance):
+        deletar_rotas([instance.pk])
 
     @action(detail=True, methods=['get'])
     def entregas(self, request, pk=None):
+        # Limitada pela capacidade do veículo, então não é paginada
         rota = self.get_object()
-        return Response(EntregaSerializer(rota.entregas.all(), many=True).data)
+        entregas = rota.entregas.order_by(F('ordem_parada').asc(nulls_last=True), 'id')
+        return Response(EntregaSerializer(entregas, many=True).data)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsAdminUser])
+    def exportar(self, request):
+        """GET ?formato=csv|ndjson|colunar (+ filtros da listagem), em streaming"""
+        return _exportar_streaming(self, request, 'rota')
 
     @action(detail=True, methods=['get'])
     def capacidade(self, request, pk=None):
         rota = self.get_object()
-        usada = rota.capacidade_total_utilizada()
         return Response({
-            "utilizada": usada,
-            "disponivel": rota.veiculo.capacidade_maxima - usada
+            "utilizada": rota.capacidade_utilizada,
+            "disponivel": rota.capacidade_disponivel()
         })
 
+    @action(detail=True, methods=['post'])
+    def reservar(self, request, pk=None):
+        rota = self.get_object()
+        entregas = request.data.get("entregas") or []
+        if not isinstance(entregas, list):
+            entregas = [entregas]
+        mover, erro = _flag(request.data, "mover")
+        if erro:
+            return erro
+        try:
+            resultados = rota.reservar_entregas(entregas, mover=mover)
+        except (TypeError, ValueError):
+            return Response({"erro": "IDs de entrega inválidos"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "reservadas": sum(1 for r in resultados if r["reservada"]),
+            "rejeitadas": sum(1 for r in resultados if not r["reservada"]),
+            "capacidade_disponivel": rota.capacidade_disponivel(),
+            "resultados": resultados,
+        })
+
+    @action(detail=True, methods=['post'])
+    def otimizar(self, request, pk=None):
+        rota = self.get_object()
+        aguardar, erro = _flag(request.data, "aguardar")
+        if erro:
+            return erro
+        if aguardar:
+            return Response(otimizar_rota(rota.id))
+        agendar_otimizacao(rota.id)
+        return Response({"rota_id": rota.id, "status": "agendada"}, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['post'], url_path='carregamento-automatico',
+            permission_classes=[IsAuthenticated, IsAdminUser])
+    def carregamento_automatico(self, request):
+        try:
+            data_rota = parse_date(str(request.data.get("data_rota", "")))
+        except ValueError:
+            data_rota = None
+        if data_rota is None:
+            return Response({"erro": "data_rota obrigatória (AAAA-MM-DD)"}, status=status.HTTP_400_BAD_REQUEST)
+        estrategia = request.data.get("estrategia", "best_fit")
+        if estrategia not in ESTRATEGIAS:
+            return Response({"erro": f"estrategia deve ser uma de {ESTRATEGIAS}"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run, erro = _flag(request.data, "dry_run")
+        if erro:
+            return erro
+        plano = executar_carregamento(data_rota, estrategia, dry_run=dry_run)
+        return Response(plano)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsAdminUser])
+    def transicao(self, request):
+        """POST {"acao": "iniciar|concluir|cancelar", "rotas": [ids]} ou {"acao": ..., "data_rota": "AAAA-MM-DD"}"""
+        acao = request.data.get("acao")
+        if acao not in ACOES_ROTA:
+            return Response({"erro": f"acao deve ser uma de {ACOES_ROTA}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if "data_rota" in request.data:
+            try:
+                data_rota = parse_date(str(request.data["data_rota"]))
+            except ValueError:
+                data_rota = None
+            if data_rota is None:
+                return Response({"erro": "data_rota inválida (AAAA-MM-DD)"}, status=status.HTTP_400_BAD_REQUEST)
+            rotas = Rota.objects.filter(data_rota=data_rota)
+        else:
+            rotas, erro = _itens_do_lote(request.data, "rotas")
+            if erro:
+                return erro
+            if not all(isinstance(i, int) and not isinstance(i, bool) for i in rotas):
+                return Response({"erro": '"rotas" deve conter apenas ids.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(TRANSICOES[acao](rotas))
+
     @action(detail=True, methods=['get'])
     def dashboard(self, request, pk=None):
         rota = self.get_object()
@@ -74,5 +394,7 @@ class RotaViewSet(viewsets.ModelViewSet):
             "rota": RotaSerializer(rota).data,
             "motorista": MotoristaSerializer(rota.motorista).data,
             "veiculo": VeiculoSerializer(rota.veiculo).data,
-            "entregas": EntregaSerializer(rota.entregas.all(), many=True).data
+            "entregas": EntregaSerializer(
+                rota.entregas.order_by(F('ordem_parada').asc(nulls_last=True), 'id'), many=True
+            ).data
         })
\ No newline at end of file
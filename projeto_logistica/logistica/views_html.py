@@ -1,20 +1,39 @@
+import logging
+
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import Group
 from django.core.mail import send_mail
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, Http404, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from django.contrib.auth import logout, authenticate, login
-from django.db.models import Q, Sum
+from django.db.models import F, Q, Sum
 from .forms import MotoristaForm, ClienteForm, VeiculoForm, EntregaForm, RotaForm, GerenciarAcessoMotoristaForm, \
     CriarUsuarioMotoristaForm
 from .models import Motorista, Cliente, Veiculo, Entrega, Rota
+from .estatisticas import estatisticas_admin, estatisticas_motorista
+from .indicadores import DIAS_DETALHE, indicadores
+from .carregamento import ESTRATEGIAS, executar_carregamento
+from .ciclo_rotas import DESTINOS as DESTINOS_ROTA, TRANSICOES, deletar_rotas
+from .credenciamento import credenciar_motoristas, credenciais_csv
+from .rastreamento import RASTREIO_MAX_AGE, obter_rastreio
+from .reconciliacao import reconciliar_grupo_motoristas
+from .lotes import LIMITE_LOTE
+from .roteirizacao import agendar_otimizacao
+from .paginacao import paginar_keyset
 from .permissions import *  # Importa TODAS as funções de permissão
 from django.contrib.auth.decorators import user_passes_test
+from django.utils.dateparse import parse_date
+from datetime import date
 from functools import wraps
 
 
+logger = logging.getLogger(__name__)
+
+
 # ============================================
 # FUNÇÕES AUXILIARES PARA VERIFICAÇÃO DE GRUPO
 # ============================================
@@ -23,7 +42,7 @@ def verificar_grupo(grupo_nome):
     """Retorna uma função que verifica se usuário está no grupo"""
 
     def check(user):
-        return user.is_authenticated and user.groups.filter(name=grupo_nome).exists()
+        return pertence_ao_grupo(user, grupo_nome)
 
     return check
 
@@ -38,7 +57,7 @@ def requer_grupo(nome_grupo, login_url='/'):
                 from django.contrib.auth.views import redirect_to_login
                 return redirect_to_login(request.get_full_path())
 
-            if not request.user.groups.filter(name=nome_grupo).exists():
+            if not pertence_ao_grupo(request.user, nome_grupo):
                 messages.error(request, f'Acesso restrito ao grupo: {nome_grupo}')
                 return redirect(login_url)
 
@@ -59,7 +78,7 @@ def grupo_required(grupo_nome):
                 messages.error(request, 'Você precisa estar logado para acessar esta página.')
                 return redirect('login')
 
-            if not request.user.groups.filter(name=grupo_nome).exists():
+            if not pertence_ao_grupo(request.user, grupo_nome):
                 messages.error(request, f'Acesso negado. Permissão requerida: {grupo_nome}')
                 return redirect('home')
 
@@ -72,12 +91,12 @@ def grupo_required(grupo_nome):
 
 def is_in_group(user, group_name):
     """Verifica se usuário está em um grupo específico"""
-    return user.groups.filter(name=group_name).exists()
+    return pertence_ao_grupo(user, group_name)
 
 
 def is_admin_or_in_group(user, group_name):
     """Verifica se usuário é admin ou está em grupo específico"""
-    return user.is_staff or user.groups.filter(name=group_name).exists()
+    return user.is_staff or pertence_ao_grupo(user, group_name)
 
 
 # HOME E AUTENTICAÇÃO -------------------------------------
@@ -88,52 +107,22 @@ def home(request):
     if not request.user.is_authenticated:
         return render(request, 'log/home.html', {})
 
-    print(f"🔍 DEBUG home: Usuário {request.user.username}")
-    print(f"🔍 DEBUG home: hasattr motorista_profile: {hasattr(request.user, 'motorista_profile')}")
-
     # Obter motorista CORRETAMENTE
     motorista = get_motorista_from_user(request.user)
-    if motorista:
-        print(f"✅ Home: Motorista detectado: {motorista.nome}")
+    logger.debug("home: usuário %s, motorista %s", request.user.username, motorista)
 
     # Para usuários autenticados, mostrar dashboard apropriado
     if request.user.is_staff:
-        print(f"👑 Home: É administrador")
-        # Admin vê todas as estatísticas
-        context = {
-            'total_entregas': Entrega.objects.count(),
-            'entregas_pendentes': Entrega.objects.filter(status='pendente').count(),
-            'entregas_em_transito': Entrega.objects.filter(status='em_transito').count(),
-            'entregas_entregues': Entrega.objects.filter(status='entregue').count(),
-            'entregas_sem_rota': Entrega.objects.filter(rota__isnull=True).count(),
-            'total_motoristas': Motorista.objects.count(),
-            'motoristas_disponiveis': Motorista.objects.filter(status='disponivel').count(),
-            'total_veiculos': Veiculo.objects.count(),
-            'veiculos_disponiveis': Veiculo.objects.filter(status='disponivel').count(),
-            'rotas_ativas': Rota.objects.filter(status='em_andamento').count(),
-            'entregas_recentes': Entrega.objects.all().select_related('cliente', 'motorista', 'rota').order_by(
-                '-data_solicitacao')[:10],
-        }
+        # Admin vê todas as estatísticas (snapshot em cache)
+        context = estatisticas_admin()
+        context['entregas_recentes'] = Entrega.objects.all().select_related(
+            'cliente', 'motorista', 'rota').order_by('-data_solicitacao')[:10]
     elif motorista:
-        print(f"🚚 Home: É motorista {motorista.nome}")
         # Motorista vê apenas suas estatísticas
-        context = {
-            'total_entregas': Entrega.objects.filter(motorista=motorista).count(),
-            'entregas_pendentes': Entrega.objects.filter(motorista=motorista, status='pendente').count(),
-            'entregas_em_transito': Entrega.objects.filter(motorista=motorista, status='em_transito').count(),
-            'entregas_entregues': Entrega.objects.filter(motorista=motorista, status='entregue').count(),
-            'entregas_sem_rota': Entrega.objects.filter(motorista=motorista, rota__isnull=True).count(),
-            'total_motoristas': 1,
-            'motoristas_disponiveis': 1 if motorista.status == 'disponivel' else 0,
-            'total_veiculos': Veiculo.objects.filter(motorista=motorista).count(),
-            'veiculos_disponiveis': Veiculo.objects.filter(motorista=motorista, status='disponivel').count(),
-            'rotas_ativas': Rota.objects.filter(motorista=motorista, status='em_andamento').count(),
-            'entregas_recentes': Entrega.objects.filter(motorista=motorista).select_related('cliente', 'motorista',
-                                                                                            'rota').order_by(
-                '-data_solicitacao')[:10],
-        }
+        context = estatisticas_motorista(motorista)
+        context['entregas_recentes'] = Entrega.objects.filter(motorista=motorista).select_related(
+            'cliente', 'motorista', 'rota').order_by('-data_solicitacao')[:10]
     else:
-        print(f"👤 Home: Usuário comum")
         # Usuário comum autenticado (sem perfil específico)
         context = {
             'total_entregas': 0,
@@ -163,16 +152,11 @@ def redirecionar_por_perfil(request):
         return redirect('home')
 
     # Se for motorista
-    print(f"DEBUG: Usuário {request.user.username} fazendo redirecionamento")
-    print(f"DEBUG: is_staff: {request.user.is_staff}")
-
     motorista = get_motorista_from_user(request.user)
+    logger.debug("redirecionar_por_perfil: usuário %s, motorista %s", request.user.username, motorista)
     if motorista:
-        print(f"DEBUG: Encontrado motorista: {motorista.nome}")
         return redirect('list_entrega')
 
-    print(f"DEBUG: Não é motorista")
-
     # Para outros usuários (clientes)
     return redirect('home')
 
@@ -190,12 +174,11 @@ def buscar_entrega(request):
     resultado = None
 
     if buscar:
-        try:
-            resultado = Entrega.objects.select_related('cliente', 'motorista', 'rota').get(codigo_rastreio=buscar)
-        except Entrega.DoesNotExist:
+        rastreio = obter_rastreio(buscar)
+        if rastreio['encontrada']:
+            resultado = rastreio['dados']
+        else:
             messages.error(request, f'Entrega "{buscar}" não encontrada!')
-        except Exception as e:
-            messages.error(request, f'Erro ao buscar entrega: {str(e)}')
 
     context = {
         'resultado': resultado,
@@ -204,24 +187,59 @@ def buscar_entrega(request):
     return render(request, 'log/buscar_entrega.html', context)
 
 
+def _resposta_rastreio(request, codigo, montar):
+    """
+    Resposta pública do rastreamento a partir do snapshot em cache, com ETag,
+    Last-Modified e 304 quando o cliente já tem a versão atual.
+    """
+    rastreio = obter_rastreio(codigo)
+    if not rastreio['encontrada']:
+        response = montar(None)
+        response.status_code = 404
+    else:
+        modificado = int(rastreio['atualizado_em'].timestamp())
+        response = get_conditional_response(request, etag=rastreio['etag'], last_modified=modificado)
+        if response is None:
+            response = montar(rastreio['dados'])
+        response['ETag'] = rastreio['etag']
+        response['Last-Modified'] = http_date(modificado)
+    patch_cache_control(response, public=True, max_age=RASTREIO_MAX_AGE)
+    return response
+
+
+def rastreio_entrega(request, codigo):
+    """Página leve de rastreamento (sem menu nem sessão) - Acesso público"""
+    return _resposta_rastreio(request, codigo, lambda dados: render(
+        request, 'log/rastreio.html', {'codigo': codigo, 'entrega': dados}))
+
+
+def rastreio_entrega_json(request, codigo):
+    """Rastreamento em JSON - Acesso público"""
+    return _resposta_rastreio(request, codigo, lambda dados: JsonResponse(
+        dados if dados is not None else {'erro': f'Entrega "{codigo}" não encontrada.'}))
+
+
 # CRUD MOTORISTA -------------------------------------
 
 @login_required
 @user_passes_test(lambda u: is_admin(u))
 def list_motorista(request):
     """Lista todos os motoristas com informações de acesso - Apenas Administradores"""
-    motoristas = Motorista.objects.all().order_by('nome')
+    motoristas = Motorista.objects.select_related('user').prefetch_related('user__groups')
+    pagina = paginar_keyset(request, motoristas, ('nome', 'id'))
 
     # Adicionar informações de acesso
-    for motorista in motoristas:
+    for motorista in pagina:
         motorista.tem_acesso = motorista.user is not None
         motorista.acesso_ativo = motorista.user.is_active if motorista.user else False
 
+    stats = estatisticas_admin()
     context = {
-        'motoristas': motoristas,
-        'total': motoristas.count(),
-        'total_com_acesso': sum(1 for m in motoristas if m.tem_acesso),
-        'total_ativos': sum(1 for m in motoristas if m.acesso_ativo),
+        'motoristas': pagina,
+        'pagina': pagina,
+        'total': stats['total_motoristas'],
+        'total_com_acesso': stats['motoristas_com_acesso'],
+        'total_ativos': stats['motoristas_acesso_ativo'],
     }
     return render(request, 'log/list_motorista.html', context)
 
@@ -286,17 +304,20 @@ def detalhes_motorista(request, id):
         messages.error(request, 'Acesso negado.')
         return redirect('home')
 
-    # Estatísticas do motorista
-    entregas = Entrega.objects.filter(motorista=motorista)
-    rotas = Rota.objects.filter(motorista=motorista)
+    # Situação atual pelo snapshot em cache; histórico pelos indicadores diários
+    stats = estatisticas_motorista(motorista)
+    kpis = indicadores('motorista', motorista.pk)
 
     context = {
         'motorista': motorista,
-        'total_entregas': entregas.count(),
-        'entregas_pendentes': entregas.filter(status='pendente').count(),
-        'entregas_entregues': entregas.filter(status='entregue').count(),
-        'rotas_ativas': rotas.filter(status='em_andamento').count(),
-        'rotas_concluidas': rotas.filter(status='concluida').count(),
+        'total_entregas': stats['total_entregas'],
+        'entregas_pendentes': stats['entregas_pendentes'],
+        'entregas_entregues': stats['entregas_entregues'],
+        'rotas_ativas': stats['rotas_ativas'],
+        'rotas_concluidas': kpis['totais']['rotas_concluidas'],
+        'kpis': kpis['totais'],
+        'kpis_dias': kpis['dias'][::-1][:DIAS_DETALHE],
+        'kpis_atualizado_ate': kpis['atualizado_ate'],
     }
 
     return render(request, 'log/detalhes_motorista.html', context)
@@ -467,39 +488,46 @@ def criar_usuario_motorista(request, id):
     return render(request, 'log/criar_usuario_motorista.html', context)
 
 
+@login_required
+@user_passes_test(lambda u: is_admin(u))
+def credenciar_motoristas_lote(request):
+    """Cria o acesso dos motoristas sem usuário e baixa as credenciais em CSV - Apenas Administradores"""
+    if request.method != 'POST':
+        return redirect('list_motorista')
+
+    ids = [pk for pk in map(_id_ou_none, request.POST.getlist('motoristas')) if pk]
+    if not ids:
+        ids = list(Motorista.objects.filter(user__isnull=True).order_by('pk')
+                   .values_list('pk', flat=True)[:LIMITE_LOTE])
+
+    credenciais, _ = credenciar_motoristas(ids)
+    if not credenciais:
+        messages.info(request, 'Todos os motoristas já possuem usuário.')
+        return redirect('list_motorista')
+
+    logger.info("%d motorista(s) credenciado(s) em lote", len(credenciais))
+    response = HttpResponse(credenciais_csv(credenciais), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="credenciais_motoristas.csv"'
+    return response
+
+
 @login_required
 @user_passes_test(lambda u: is_admin(u))
 def verificar_grupos_motoristas(request):
     """Verifica e corrige os grupos dos motoristas - Apenas Administradores"""
     try:
-        # Criar/obter grupo Motoristas
-        grupo_motorista, created = Group.objects.get_or_create(name='Motoristas')
+        relatorio = reconciliar_grupo_motoristas()
 
-        if created:
+        if relatorio['grupo_criado']:
             messages.info(request, 'Grupo Motoristas criado automaticamente.')
 
-        # Contadores
-        motoristas_com_usuario = Motorista.objects.filter(user__isnull=False)
-        motoristas_no_grupo = 0
-        motoristas_adicionados = 0
-
-        # Verificar cada motorista
-        for motorista in motoristas_com_usuario:
-            if grupo_motorista in motorista.user.groups.all():
-                motoristas_no_grupo += 1
-            else:
-                # Adicionar ao grupo
-                motorista.user.groups.add(grupo_motorista)
-                motorista.user.save()
-                motoristas_adicionados += 1
-
         messages.success(
             request,
             f'✅ Verificação concluída:<br>'
-            f'• Motoristas com usuário: {motoristas_com_usuario.count()}<br>'
-            f'• Já no grupo Motoristas: {motoristas_no_grupo}<br>'
-            f'• Adicionados ao grupo: {motoristas_adicionados}<br>'
-            f'• Total no grupo agora: {grupo_motorista.user_set.count()}'
+            f'• Motoristas com usuário: {relatorio["com_usuario"]}<br>'
+            f'• Já no grupo Motoristas: {relatorio["ja_no_grupo"]}<br>'
+            f'• Adicionados ao grupo: {len(relatorio["adicionados"])}<br>'
+            f'• Total no grupo agora: {relatorio["total_no_grupo"]}'
         )
 
     except Exception as e:
@@ -600,29 +628,17 @@ def verificar_grupo_usuario(request):
 @user_passes_test(lambda u: u.is_staff)
 def verificar_todos_grupos(request):
     """Ferramenta admin para verificar todos os motoristas"""
-    grupo_motorista, created = Group.objects.get_or_create(name='Motoristas')
+    relatorio = reconciliar_grupo_motoristas()
 
-    if created:
+    if relatorio['grupo_criado']:
         messages.info(request, 'Grupo Motoristas criado automaticamente.')
 
-    motoristas_com_usuario = Motorista.objects.filter(user__isnull=False)
-    corrigidos = 0
-    ja_no_grupo = 0
-
-    for motorista in motoristas_com_usuario:
-        if grupo_motorista in motorista.user.groups.all():
-            ja_no_grupo += 1
-        else:
-            motorista.user.groups.add(grupo_motorista)
-            motorista.user.save()
-            corrigidos += 1
-
     messages.success(request,
                      f'✅ Verificação concluída!<br>'
-                     f'• Motoristas verificados: {motoristas_com_usuario.count()}<br>'
-                     f'• Já no grupo: {ja_no_grupo}<br>'
-                     f'• Corrigidos: {corrigidos}<br>'
-                     f'• Total no grupo: {grupo_motorista.user_set.count()}'
+                     f'• Motoristas verificados: {relatorio["com_usuario"]}<br>'
+                     f'• Já no grupo: {relatorio["ja_no_grupo"]}<br>'
+                     f'• Corrigidos: {len(relatorio["adicionados"])}<br>'
+                     f'• Total no grupo: {relatorio["total_no_grupo"]}'
                      )
 
     return redirect('list_motorista')
@@ -705,10 +721,11 @@ def deletar_motorista(request, id):
 @user_passes_test(lambda u: is_admin_or_motorista(u))
 def list_cliente(request):
     """Lista todos os clientes - Administradores ou Motoristas"""
-    clientes = Cliente.objects.all().order_by('nome')
+    pagina = paginar_keyset(request, Cliente.objects.all(), ('nome', 'id'))
     context = {
-        'clientes': clientes,
-        'total': clientes.count(),
+        'clientes': pagina,
+        'pagina': pagina,
+        'total': estatisticas_admin()['total_clientes'],
     }
     return render(request, 'log/list_cliente.html', context)
 
@@ -773,19 +790,24 @@ def deletar_cliente(request, id):
 @user_passes_test(lambda u: is_admin_or_motorista(u))
 def list_veiculo(request):
     """Lista todos os veículos - Administradores ou Motoristas"""
+    total = 0
     if request.user.is_staff:
-        veiculos = Veiculo.objects.all().select_related('motorista').order_by('placa')
+        veiculos = Veiculo.objects.all().select_related('motorista')
+        total = estatisticas_admin()['total_veiculos']
     else:
         motorista = get_motorista_from_user(request.user)
         if motorista:
             # Motorista vê apenas veículos associados a ele
-            veiculos = Veiculo.objects.filter(motorista=motorista).select_related('motorista').order_by('placa')
+            veiculos = Veiculo.objects.filter(motorista=motorista).select_related('motorista')
+            total = estatisticas_motorista(motorista)['total_veiculos']
         else:
             veiculos = Veiculo.objects.none()
 
+    pagina = paginar_keyset(request, veiculos, ('placa', 'id'))
     context = {
-        'veiculos': veiculos,
-        'total': veiculos.count(),
+        'veiculos': pagina,
+        'pagina': pagina,
+        'total': total,
     }
     return render(request, 'log/list_veiculo.html', context)
 
@@ -846,43 +868,129 @@ def deletar_veiculo(request, id):
 
 # CRUD ENTREGA -------------------------------------
 
+# Opções carregadas em cada select de filtro da listagem
+LIMITE_OPCOES_FILTRO = 100
+
+
+def _id_ou_none(valor):
+    try:
+        valor = int(valor)
+    except (TypeError, ValueError):
+        return None
+    return valor if valor > 0 else None
+
+
+def _opcoes_filtro(queryset, selecionado):
+    """
+    Até LIMITE_OPCOES_FILTRO opções (id, nome) para um select de filtro, sempre
+    com a selecionada, para que a página não carregue a tabela inteira.
+    """
+    opcoes = list(queryset.values('id', 'nome')[:LIMITE_OPCOES_FILTRO])
+    if isinstance(selecionado, int) and all(opcao['id'] != selecionado for opcao in opcoes):
+        opcoes += queryset.filter(pk=selecionado).values('id', 'nome')
+    return opcoes
+
+
+def _data_ou_none(valor):
+    try:
+        return parse_date(valor or '')
+    except ValueError:
+        return None
+
+
+def filtrar_entregas(request, entregas):
+    """
+    Aplica os filtros da querystring (status, motorista, cliente, rota,
+    data_inicio e data_fim) e retorna (queryset, filtros aplicados).
+    rota=sem filtra as entregas sem rota.
+    """
+    filtros = {}
+    status_validos = dict(Entrega.STATUS_ENTREGA)
+
+    status = request.GET.get('status')
+    if status in status_validos:
+        entregas = entregas.filter(status=status)
+        filtros['status'] = status
+
+    # Motorista só enxerga as próprias entregas; o filtro é para o admin
+    motorista_id = _id_ou_none(request.GET.get('motorista'))
+    if motorista_id and request.user.is_staff:
+        entregas = entregas.filter(motorista_id=motorista_id)
+        filtros['motorista'] = motorista_id
+
+    cliente_id = _id_ou_none(request.GET.get('cliente'))
+    if cliente_id:
+        entregas = entregas.filter(cliente_id=cliente_id)
+        filtros['cliente'] = cliente_id
+
+    rota = request.GET.get('rota')
+    if rota == 'sem':
+        entregas = entregas.filter(rota__isnull=True)
+        filtros['rota'] = rota
+    elif _id_ou_none(rota):
+        filtros['rota'] = _id_ou_none(rota)
+        entregas = entregas.filter(rota_id=filtros['rota'])
+
+    data_inicio = _data_ou_none(request.GET.get('data_inicio'))
+    if data_inicio:
+        entregas = entregas.filter(data_solicitacao__gte=data_inicio)
+        filtros['data_inicio'] = data_inicio
+
+    data_fim = _data_ou_none(request.GET.get('data_fim'))
+    if data_fim:
+        entregas = entregas.filter(data_solicitacao__lte=data_fim)
+        filtros['data_fim'] = data_fim
+
+    return entregas, filtros
+
+
 @login_required
 @user_passes_test(lambda u: is_admin_or_motorista(u))
 def list_entrega(request):
     """Lista todas as entregas - Administradores ou Motoristas"""
-    print(f"🔍 DEBUG list_entrega: Usuário {request.user.username}")
-    print(f"🔍 DEBUG list_entrega: is_staff: {request.user.is_staff}")
-    print(f"🔍 DEBUG list_entrega: is_motorista: {is_motorista(request.user)}")
-    print(f"🔍 DEBUG list_entrega: is_admin_or_motorista: {is_admin_or_motorista(request.user)}")
-
     # Obter motorista CORRETAMENTE
     motorista = get_motorista_from_user(request.user)
-    if motorista:
-        print(f"✅ Motorista obtido: {motorista.nome}")
 
     # Se for admin, mostra todas as entregas
     if request.user.is_staff:
-        entregas = Entrega.objects.all().select_related('cliente', 'motorista', 'rota').order_by('-data_solicitacao')
-        print(f"👑 Admin vendo TODAS as entregas: {entregas.count()}")
+        entregas = Entrega.objects.all().select_related('cliente', 'motorista', 'rota')
+        stats = estatisticas_admin()
 
     # Se for motorista, mostra apenas suas entregas
     elif motorista:
-        entregas = Entrega.objects.filter(motorista=motorista).select_related('cliente', 'motorista', 'rota').order_by(
-            '-data_solicitacao')
-        print(f"🚚 Motorista {motorista.nome} vendo SUAS entregas: {entregas.count()}")
+        entregas = Entrega.objects.filter(motorista=motorista).select_related('cliente', 'motorista', 'rota')
+        stats = estatisticas_motorista(motorista)
 
     # Não deveria chegar aqui por causa do decorator
     else:
-        print(f"❌ ERRO: Usuário não é admin nem motorista, mas passou no decorator!")
+        logger.warning("list_entrega: usuário %s não é admin nem motorista", request.user.username)
         messages.error(request, 'Acesso negado. Você precisa ser motorista ou administrador.')
         return redirect('home')
 
+    # Opções dos filtros: o motorista só vê as próprias rotas e os clientes das suas entregas
+    clientes = Cliente.objects.all()
+    rotas = Rota.objects.exclude(status='concluida')
+    if not request.user.is_staff:
+        clientes = clientes.filter(pk__in=entregas.values('cliente_id'))
+        rotas = rotas.filter(motorista=motorista)
+
+    entregas, filtros = filtrar_entregas(request, entregas)
+    pagina = paginar_keyset(request, entregas, ('-data_solicitacao', '-id'))
+
     context = {
-        'entregas': entregas,
-        'total': entregas.count(),
-        'sem_rota': entregas.filter(rota__isnull=True).count(),
+        'entregas': pagina,
+        'pagina': pagina,
+        'filtros': filtros,
+        'status_choices': Entrega.STATUS_ENTREGA,
+        'clientes': _opcoes_filtro(clientes.order_by('nome', 'id'), filtros.get('cliente')),
+        'rotas': _opcoes_filtro(rotas.order_by('-data_rota', '-id'), filtros.get('rota')),
+        'limite_opcoes': LIMITE_OPCOES_FILTRO,
+        'total': stats['total_entregas'],
+        'sem_rota': stats['entregas_sem_rota'],
         'motorista_atual': motorista,
     }
+    if request.user.is_staff:
+        context['motoristas'] = _opcoes_filtro(Motorista.objects.order_by('nome', 'id'), filtros.get('motorista'))
     return render(request, 'log/list_entrega.html', context)
 
 
@@ -898,8 +1006,17 @@ def criar_entrega(request):
             motorista = get_motorista_from_user(request.user)
             if motorista and not entrega.motorista:
                 entrega.motorista = motorista
+
+            # A rota é atribuída pela reserva, que revalida a capacidade com lock
+            rota = entrega.rota
+            entrega.rota = None
             entrega.save()
             messages.success(request, f'Entrega "{entrega.codigo_rastreio}" registrada com sucesso!')
+
+            if rota:
+                resultado = rota.reservar_entrega(entrega)
+                if not resultado['reservada']:
+                    messages.warning(request, f'Entrega registrada sem rota: {resultado["mensagem"]}')
             return redirect('list_entrega')
         else:
             messages.error(request, 'Erro ao registrar entrega. Verifique os dados.')
@@ -922,6 +1039,7 @@ def atualizar_entrega(request, id):
         return redirect('list_entrega')
 
     if request.method == 'POST':
+        rota_anterior = entrega.rota
         form = EntregaForm(request.POST, instance=entrega)
         if form.is_valid():
             # Se for motorista, garantir que a entrega continue sendo dele
@@ -929,15 +1047,18 @@ def atualizar_entrega(request, id):
             if motorista and not request.user.is_staff:
                 form.instance.motorista = motorista
 
-            # Verificar mudança de rota
+            # Mudança de rota passa pela reserva atômica de capacidade
             nova_rota = form.cleaned_data.get('rota')
-            if nova_rota and entrega.rota != nova_rota:
-                if not entrega.pode_ser_adicionada_na_rota(nova_rota):
-                    messages.warning(request, 'Capacidade da rota excedida! Rota não foi alterada.')
-                    form.instance.rota = entrega.rota  # Manter rota anterior
+            if nova_rota and nova_rota != rota_anterior:
+                form.instance.rota = rota_anterior
 
             form.save()
             messages.success(request, 'Dados da entrega atualizados com sucesso!')
+
+            if nova_rota and nova_rota != rota_anterior:
+                resultado = nova_rota.reservar_entrega(form.instance, mover=True)
+                if not resultado['reservada']:
+                    messages.warning(request, f'Rota não foi alterada: {resultado["mensagem"]}')
             return redirect('list_entrega')
         else:
             messages.error(request, 'Erro ao atualizar entrega.')
@@ -974,29 +1095,24 @@ def deletar_entrega(request, id):
 @user_passes_test(lambda u: is_admin_or_motorista(u))
 def list_rota(request):
     """Lista todas as rotas - Administradores ou Motoristas"""
-    print(f"🔍 DEBUG list_rota: Usuário {request.user.username}")
-    print(f"🔍 DEBUG list_rota: is_staff: {request.user.is_staff}")
-    print(f"🔍 DEBUG list_rota: is_motorista: {is_motorista(request.user)}")
-
+    total = 0
     if request.user.is_staff:
-        rotas = Rota.objects.all().select_related('motorista', 'veiculo').prefetch_related('entregas').order_by(
-            '-data_rota')
-        print(f"👑 Admin vendo TODAS as rotas: {rotas.count()}")
+        rotas = Rota.objects.all().select_related('motorista', 'veiculo')
+        total = estatisticas_admin()['total_rotas']
     else:
         motorista = get_motorista_from_user(request.user)
         if motorista:
             # Motorista vê apenas suas rotas
-            rotas = Rota.objects.filter(motorista=motorista).select_related('motorista',
-                                                                            'veiculo').prefetch_related(
-                'entregas').order_by('-data_rota')
-            print(f"🚚 Motorista {motorista.nome} vendo SUAS rotas: {rotas.count()}")
+            rotas = Rota.objects.filter(motorista=motorista).select_related('motorista', 'veiculo')
+            total = estatisticas_motorista(motorista)['total_rotas']
         else:
             rotas = Rota.objects.none()
-            print(f"❌ Usuário sem perfil de motorista")
 
+    pagina = paginar_keyset(request, rotas, ('-data_rota', '-id'))
     context = {
-        'rotas': rotas,
-        'total': rotas.count(),
+        'rotas': pagina,
+        'pagina': pagina,
+        'total': total,
     }
     return render(request, 'log/list_rota.html', context)
 
@@ -1005,14 +1121,15 @@ def list_rota(request):
 @user_passes_test(lambda u: is_admin_or_motorista(u))
 def lista_entregas(request, rota_id):
     """Lista entregas de uma rota específica - Administradores ou Motoristas (apenas suas)"""
-    rota = get_object_or_404(Rota, id=rota_id)
+    rota = get_object_or_404(Rota.objects.select_related('motorista', 'veiculo'), id=rota_id)
 
     # Verificar permissão usando as funções de permissão existentes
     if not can_view_rota(request.user, rota):
         messages.error(request, 'Acesso negado. Você só pode ver suas próprias rotas.')
         return redirect('list_rota')
 
-    entregas = rota.entregas.all().select_related('cliente', 'motorista')
+    entregas = rota.entregas.all().select_related('cliente', 'motorista').order_by(
+        F('ordem_parada').asc(nulls_last=True), 'id')
 
     # Filtrar entregas disponíveis conforme permissão
     if request.user.is_staff:
@@ -1032,10 +1149,10 @@ def lista_entregas(request, rota_id):
         'rota': rota,
         'entregas': entregas,
         'entregas_disponiveis': entregas_disponiveis,
-        'capacidade_utilizada': rota.capacidade_total_utilizada(),
-        'capacidade_disponivel': rota.veiculo.capacidade_maxima - rota.capacidade_total_utilizada(),
-        'total_entregas': rota.total_entregas(),
-        'valor_total': rota.valor_total_entregas(),
+        'capacidade_utilizada': rota.capacidade_utilizada,
+        'capacidade_disponivel': rota.capacidade_disponivel(),
+        'total_entregas': rota.total_entregas,
+        'valor_total': rota.valor_total,
     }
     return render(request, 'log/lista_entregas.html', context)
 
@@ -1074,18 +1191,24 @@ def criar_rota(request):
 def atualizar_rota(request, id):
     """Atualizar rota existente - Apenas Administradores"""
     rota = get_object_or_404(Rota, id=id)
+    status_anterior = rota.status
 
     if request.method == 'POST':
         form = RotaForm(request.POST, instance=rota)
         if form.is_valid():
-            rota = form.save()
-
-            # Se rota foi concluída, liberar veículo e motorista
-            if rota.status == "concluida":
-                rota.veiculo.status = "disponivel"
-                rota.veiculo.save()
-                rota.motorista.status = "disponivel"
-                rota.motorista.save()
+            # A mudança de status passa pelo ciclo de vida (entregas, veículo e motorista)
+            novo_status = form.cleaned_data['status']
+            rota = form.save(commit=False)
+            rota.status = status_anterior
+            rota.save()
+
+            acao = next((acao for acao, destino in DESTINOS_ROTA.items() if destino == novo_status), None)
+            if novo_status == status_anterior:
+                messages.success(request, 'Dados da rota atualizados com sucesso!')
+            elif acao is None or not TRANSICOES[acao]([rota.id])['rotas']:
+                messages.warning(request, f'Dados salvos, mas a rota não pode passar de '
+                                          f'"{rota.get_status_display()}" para "{novo_status}".')
+            elif novo_status == "concluida":
                 messages.success(request, f'Rota "{rota.nome}" concluída! Veículo e motorista liberados.')
             else:
                 messages.success(request, 'Dados da rota atualizados com sucesso!')
@@ -1109,23 +1232,9 @@ def deletar_rota(request, id):
     """Deletar rota - Apenas Administradores"""
     rota = get_object_or_404(Rota, id=id)
 
-    # Remover entregas da rota antes de deletar
-    entregas = rota.entregas.all()
-    for entrega in entregas:
-        entrega.rota = None
-        entrega.save()
-
-    # Liberar veículo e motorista
-    if rota.veiculo:
-        rota.veiculo.status = "disponivel"
-        rota.veiculo.save()
-
-    if rota.motorista:
-        rota.motorista.status = "disponivel"
-        rota.motorista.save()
-
+    # Libera entregas, veículo e motorista e remove a rota
     nome = rota.nome
-    rota.delete()
+    deletar_rotas([rota.id])
     messages.success(request, f'Rota "{nome}" deletada com sucesso! Entregas foram liberadas.')
     return redirect('list_rota')
 
@@ -1134,31 +1243,68 @@ def deletar_rota(request, id):
 @user_passes_test(lambda u: is_admin(u))
 def adicionar_entrega_rota(request, rota_id):
     """Adicionar entrega a uma rota - Apenas Administradores"""
-    rota = get_object_or_404(Rota, id=rota_id)
+    rota = get_object_or_404(Rota.objects.select_related('veiculo'), id=rota_id)
 
     if request.method == 'POST':
-        entrega_id = request.POST.get('entrega_id')
+        entrega_ids = request.POST.getlist('entrega_id')
 
         try:
-            entrega = Entrega.objects.get(id=entrega_id)
-
-            # Validações
-            if entrega.rota is not None:
-                messages.error(request, f'A entrega "{entrega.codigo_rastreio}" já está em outra rota!')
-            elif not entrega.pode_ser_adicionada_na_rota(rota):
+            resultados = rota.reservar_entregas(entrega_ids)
+        except (TypeError, ValueError):
+            resultados = [{'reservada': False, 'motivo': 'nao_encontrada', 'codigo_rastreio': None}]
+
+        for resultado in resultados:
+            codigo = resultado['codigo_rastreio']
+            if resultado['reservada']:
+                messages.success(request, f'Entrega "{codigo}" adicionada à rota com sucesso!')
+            elif resultado['motivo'] == 'nao_encontrada':
+                messages.error(request, 'Entrega não encontrada!')
+            elif resultado['motivo'] == 'ja_em_rota':
+                messages.error(request, f'A entrega "{codigo}" já está em outra rota!')
+            elif resultado['motivo'] == 'capacidade_excedida':
                 messages.error(request,
-                               f'Capacidade excedida! A entrega "{entrega.codigo_rastreio}" precisa de {entrega.capacidade_necessaria}kg, mas só há {rota.veiculo.capacidade_maxima - rota.capacidade_total_utilizada()}kg disponíveis.')
+                               f'Capacidade excedida! A entrega "{codigo}" não cabe nos {rota.capacidade_disponivel()}kg disponíveis.')
             else:
-                entrega.rota = rota
-                entrega.save()
-                messages.success(request, f'Entrega "{entrega.codigo_rastreio}" adicionada à rota com sucesso!')
+                messages.error(request, f'Entrega "{codigo}": {resultado["mensagem"]}')
 
-        except Entrega.DoesNotExist:
-            messages.error(request, 'Entrega não encontrada!')
+        if any(resultado['reservada'] for resultado in resultados):
+            agendar_otimizacao(rota.id)
 
     return redirect('lista_entregas', rota_id=rota_id)
 
 
+@login_required
+@user_passes_test(lambda u: is_admin(u))
+def carregamento_automatico(request):
+    """Distribui entregas pendentes nas rotas planejadas de uma data - Apenas Administradores"""
+    try:
+        data_rota = parse_date(request.POST.get('data_rota') or request.GET.get('data_rota') or '') or date.today()
+    except ValueError:
+        data_rota = date.today()
+    estrategia = request.POST.get('estrategia') or request.GET.get('estrategia') or 'best_fit'
+    if estrategia not in ESTRATEGIAS:
+        estrategia = 'best_fit'
+
+    if request.method == 'POST':
+        plano = executar_carregamento(data_rota, estrategia)
+        messages.success(request, f'{plano["total_alocadas"]} entrega(s) distribuída(s) nas rotas de '
+                                  f'{data_rota.strftime("%d/%m/%Y")}.')
+        if plano['rejeitadas']:
+            messages.warning(request, f'{len(plano["rejeitadas"])} entrega(s) não puderam ser gravadas '
+                                      f'(alteradas por outro usuário durante o carregamento).')
+        if plano['nao_alocadas']:
+            messages.info(request, f'{len(plano["nao_alocadas"])} entrega(s) não couberam em nenhuma rota.')
+        return redirect('list_rota')
+
+    # GET: pré-visualização (dry-run)
+    context = {
+        'plano': executar_carregamento(data_rota, estrategia, dry_run=True),
+        'data_rota': data_rota,
+        'estrategia': estrategia,
+    }
+    return render(request, 'log/carregamento_automatico.html', context)
+
+
 @login_required
 @user_passes_test(lambda u: is_admin_or_motorista(u))
 def remover_entrega_rota(request, entrega_id):
@@ -1175,7 +1321,9 @@ def remover_entrega_rota(request, entrega_id):
     if entrega.rota:
         codigo = entrega.codigo_rastreio
         entrega.rota = None
+        entrega.ordem_parada = None
         entrega.save()
+        agendar_otimizacao(rota_id)
         messages.success(request, f'Entrega "{codigo}" removida da rota com sucesso!')
     else:
         messages.warning(request, 'Esta entrega não está em nenhuma rota.')
@@ -1190,4 +1338,4 @@ def remover_entrega_rota(request, entrega_id):
 
 def calcula_capacidade_total(rota):
     """Calcula capacidade total utilizada na rota"""
-    return sum([e.capacidade_necessaria for e in rota.entregas.all()])
\ No newline at end of file
+    return rota.capacidade_utilizada
\ No newline at end of file
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+import sys
 from pathlib import Path
 from django.contrib.messages import constants as messages
 
@@ -48,16 +49,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'logistica.telemetria.TelemetriaMiddleware',
+    # Antes de sessão e autenticação: o 429 sai sem nenhuma consulta ao banco
+    'logistica.limites.LimiteRequisicoesMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'logistica.middleware.IdentidadeMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    'logistica.middleware.ProfileRedirectMiddleware',
-    'logistica.middleware.VerificarGruposMiddleware',
-    'logistica.middleware.CriarPerfilMotoristaMiddleware',
+    'logistica.middleware.ConsistenciaPerfilMiddleware',
 ]
 
 ROOT_URLCONF = 'projeto_logistica.urls'
@@ -156,4 +159,59 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'logistica.paginacao.PaginacaoCursorApi',
+    'DEFAULT_FILTER_BACKENDS': [
+        'django_filters.rest_framework.DjangoFilterBackend',
+        'rest_framework.filters.OrderingFilter',
+    ],
+}
+
+# Logging estruturado (uma linha JSON por registro). Os níveis por módulo
+# podem ser ajustados em 'loggers'; registros até INFO são amostrados. O
+# console passa por uma fila (HandlerFila): a escrita fica na thread do
+# QueueListener, fora da requisição. Nos testes só saem erros graves, salvo
+# LOG_NIVEL_TESTES; assertLogs não depende do handler.
+TESTANDO = len(sys.argv) > 1 and sys.argv[1] == 'test'
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'amostragem': {
+            '()': 'logistica.telemetria.FiltroAmostragem',
+            'taxa': float(os.environ.get('LOG_AMOSTRAGEM', '1.0')),
+        },
+    },
+    'formatters': {
+        'json': {'()': 'logistica.telemetria.FormatadorJson'},
+    },
+    'handlers': {
+        'console': {
+            '()': 'logistica.telemetria.HandlerFila',
+            'formatter': 'json',
+            'filters': ['amostragem'],
+            'level': os.environ.get('LOG_NIVEL_TESTES', 'CRITICAL') if TESTANDO else 'NOTSET',
+        },
+    },
+    'loggers': {
+        'logistica': {'handlers': ['console'], 'level': os.environ.get('LOG_NIVEL', 'INFO'), 'propagate': False},
+        'logistica.views_html': {'level': os.environ.get('LOG_NIVEL_VIEWS', 'INFO')},
+        'logistica.telemetria': {'level': os.environ.get('LOG_NIVEL_TELEMETRIA', 'INFO')},
+    },
+}
+
+# Spans por requisição (view, consultas, tempo de banco e de template).
+# EXPORTADOR: None, 'arquivo' (NDJSON em ARQUIVO) ou 'otlp' (coletor OTLP/HTTP)
+TELEMETRIA = {
+    'AMOSTRAGEM': float(os.environ.get('TELEMETRIA_AMOSTRAGEM', '0')),
+    'EXPORTADOR': os.environ.get('TELEMETRIA_EXPORTADOR') or None,
+    'ARQUIVO': os.environ.get('TELEMETRIA_ARQUIVO', os.path.join(BASE_DIR, 'telemetria.ndjson')),
+    'OTLP_URL': os.environ.get('TELEMETRIA_OTLP_URL', 'http://localhost:4318/v1/traces'),
+}
+
+# Limite de requisições (token bucket) do rastreamento público e da API.
+# Com um cache compartilhado (redis/memcached) os baldes valem para todos os
+# processos; sem ele cada processo mantém os seus em memória.
+LIMITES_REQUISICOES = {
+    'ATIVO': os.environ.get('LIMITES_ATIVO', '1') == '1',
+    'CONFIAR_X_FORWARDED_FOR': os.environ.get('LIMITES_CONFIAR_X_FORWARDED_FOR', '0') == '1',
 }